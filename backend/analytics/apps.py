@@ -2,4 +2,8 @@ from django.apps import AppConfig
  
 class AnalyticsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'analytics' 
\ No newline at end of file
+    name = 'analytics'
+
+    def ready(self):
+        # Keep precomputed analytics in sync with ticket/equipment writes
+        from . import signals  # noqa: F401
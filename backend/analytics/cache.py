@@ -0,0 +1,148 @@
+# Result cache for the analytics and report endpoints
+# Entries are keyed on the data version so a write never serves stale payloads
+
+import functools
+import hashlib
+import math
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db.models import F
+from django.utils import timezone
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from rest_framework.response import Response
+from silsp.metrics import registry
+from .models import DataVersion
+
+# Tables whose writes invalidate cached results
+TRACKED_TABLES = ('ticket', 'equipment', 'comment')
+
+def get_cache():
+    return caches[getattr(settings, 'ANALYTICS_CACHE_ALIAS', 'analytics')]
+
+def bump_data_version(*tables):
+    """
+    Increment the change counter of the given tables
+    Runs inside the writer's transaction so a rolled back write does not bump
+    """
+    now = timezone.now()
+    for table in tables:
+        updated = DataVersion.objects.filter(name=table).update(version=F('version') + 1, updated_at=now)
+        if not updated:
+            DataVersion.objects.get_or_create(name=table, defaults={'version': 1, 'updated_at': now})
+
+def request_data_versions(request):
+    """
+    {table: (version, updated_at)} of every counter, read once per request
+    and shared by the cache, the validators and the snapshot
+    """
+    request = getattr(request, '_request', request)
+    versions = getattr(request, '_data_versions', None)
+    if versions is None:
+        versions = request._data_versions = {
+            name: (version, updated_at)
+            for name, version, updated_at in DataVersion.objects.values_list('name', 'version', 'updated_at')
+        }
+    return versions
+
+def get_data_version(request=None):
+    """
+    Global data version combining the counters of all tracked tables
+    Read from the request's counters when given
+    """
+    if request is not None:
+        versions = request_data_versions(request)
+        versions = [(name, versions[name][0]) for name in sorted(TRACKED_TABLES) if name in versions]
+    else:
+        versions = DataVersion.objects.filter(name__in=TRACKED_TABLES).order_by('name').values_list('name', 'version')
+    return '-'.join(f'{name}{version}' for name, version in versions) or '0'
+
+def make_cache_key(prefix, request, version=None):
+    if version is None:
+        version = get_data_version(request)
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'analytics:{prefix}:{version}:{path}'
+
+def record(result):
+    # Served with the other metrics by GET /api/_metrics
+    registry.increment('silsp_analytics_cache_total', result=result)
+
+def cached_response(timeout=DEFAULT_TIMEOUT, key_prefix=None):
+    """
+    Decorator for APIView.get methods caching the response data
+    Entries are keyed on the data version and the full request path
+    Only successful responses are cached
+    """
+    def decorator(method):
+        prefix = key_prefix or f'{method.__module__}.{method.__qualname__}'
+
+        @functools.wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            cache = get_cache()
+            key = make_cache_key(prefix, request)
+            data = cache.get(key)
+            if data is not None:
+                record('hit')
+                response = Response(data)
+                response['X-Cache'] = 'HIT'
+                return response
+
+            record('miss')
+            response = method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, timeout)
+            response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+def conditional_get(*tables, max_age=None):
+    """
+    Decorator for GET handlers adding a strong ETag and Last-Modified
+    derived from the DataVersion counters of the given tables
+    A matching If-None-Match (or If-Modified-Since) gets a 304 before the
+    handler runs, so nothing is queried or serialized
+    max_age makes the validators change at least every max_age seconds,
+    for responses that also depend on the time (e.g. health scores)
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            counters = request_data_versions(request)
+            versions = [(name, *counters[name]) for name in sorted(tables) if name in counters]
+            parts = [request.get_full_path()] + [f'{name}{version}' for name, version, _ in versions]
+            modified = [updated_at.timestamp() for _, _, updated_at in versions]
+            if max_age:
+                bucket = int(time.time() // max_age)
+                parts.append(str(bucket))
+                modified.append(bucket * max_age)
+            etag = quote_etag(hashlib.md5('|'.join(parts).encode()).hexdigest())
+            last_modified = math.ceil(max(modified)) if modified else None
+            if last_modified is not None and last_modified > time.time():
+                # A later write in this same second would get the same Last-Modified,
+                # until the second is over clients revalidate with the ETag only
+                last_modified = None
+
+            if_none_match = request.headers.get('If-None-Match')
+            if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+            if if_none_match:
+                not_modified = etag in parse_etags(if_none_match) or if_none_match.strip() == '*'
+            else:
+                not_modified = (
+                    if_modified_since is not None and last_modified is not None
+                    and last_modified <= if_modified_since
+                )
+
+            if not_modified:
+                response = Response(status=304)
+            else:
+                response = method(self, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            return response
+        return wrapper
+    return decorator
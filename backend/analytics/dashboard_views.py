@@ -0,0 +1,121 @@
+import asyncio
+import logging
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import HttpResponse, JsonResponse
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from tickets.report_views import most_frequent_issues, equipment_status
+from tickets.stream_views import authenticate
+from .filters import AnalyticsFilters
+from .snapshot import get_snapshot
+from .turnaround import turnaround_summary
+
+# Combined dashboard endpoint
+# The sections of the analytics and reports pages are computed concurrently,
+# each in its own thread with its own DB connection, and returned in one
+# response, so a page load costs the slowest section instead of the sum of
+# one request per section
+
+logger = logging.getLogger(__name__)
+
+# Section name: (task, snapshot part)
+# Sections of the same task run one after the other in one thread, the
+# snapshot parts built on the equipment features share them this way
+SNAPSHOT_SECTIONS = {
+    'failure_patterns': ('failure_patterns', 'failure_patterns'),
+    'school_issues': ('school_issues', 'school_issues'),
+    'issue_patterns': ('issue_patterns', 'issue_patterns'),
+    'maintenance_schedule': ('equipment', 'schedule'),
+    'equipment_health': ('equipment', 'health_report'),
+    'preventive_maintenance': ('equipment', 'predictions'),
+    'maintenance_budget': ('equipment', 'budget'),
+}
+# Section name: (task, computation from the filters)
+REPORT_SECTIONS = {
+    'frequent_issues': ('frequent_issues', most_frequent_issues),
+    'turnaround_time': ('turnaround_time', turnaround_summary),
+    'equipment_status': ('equipment_status', equipment_status),
+}
+SECTIONS = {**SNAPSHOT_SECTIONS, **REPORT_SECTIONS}
+# What the analytics and reports pages show
+DEFAULT_SECTIONS = (
+    'failure_patterns', 'school_issues', 'maintenance_schedule',
+    'frequent_issues', 'turnaround_time', 'equipment_status',
+)
+
+# Placeholder for a section that raised
+FAILED = object()
+
+def parse_sections(value):
+    if not value:
+        return list(DEFAULT_SECTIONS)
+    sections = list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in sections if name not in SECTIONS]
+    if unknown:
+        raise ValidationError({
+            'sections': f'Unknown sections: {", ".join(unknown)}. Use any of: {", ".join(SECTIONS)}.'
+        })
+    return sections
+
+def compute_sections(names, filters, snapshot):
+    """
+    Compute sections in the calling (worker) thread, {name: data or FAILED}
+    Snapshot sections are read from the request's snapshot
+    """
+    close_old_connections()
+    results = {}
+    try:
+        for name in names:
+            try:
+                if name in SNAPSHOT_SECTIONS:
+                    results[name] = getattr(snapshot, SNAPSHOT_SECTIONS[name][1])
+                else:
+                    results[name] = REPORT_SECTIONS[name][1](filters)
+            except Exception:
+                logger.exception('Dashboard section %s failed', name)
+                results[name] = FAILED
+    finally:
+        # The thread is reused by other requests, don't keep its connection past CONN_MAX_AGE
+        close_old_connections()
+    return results
+
+async def dashboard(request):
+    """
+    GET /api/dashboard/?sections=failure_patterns,frequent_issues&since=...
+    The selected sections (default: DEFAULT_SECTIONS) in one response
+    Accepts the since/until/school/type/granularity analytics parameters
+    """
+    user = await authenticate(request, query_token=False)
+    if user is None or not user.is_authenticated:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    try:
+        sections = parse_sections(request.GET.get('sections'))
+        filters = AnalyticsFilters.from_params(request.GET)
+    except ValidationError as error:
+        return JsonResponse(error.detail, status=400)
+
+    tasks = {}
+    for name in sections:
+        tasks.setdefault(SECTIONS[name][0], []).append(name)
+    # One snapshot for the whole request, its parts are shared by the sections
+    snapshot = None
+    if any(name in SNAPSHOT_SECTIONS for name in sections):
+        snapshot = await sync_to_async(get_snapshot)(filters)
+    # Not thread sensitive: every task gets a thread of its own instead of
+    # queueing on the single thread shared by sync code
+    results = await asyncio.gather(*(
+        sync_to_async(compute_sections, thread_sensitive=False)(names, filters, snapshot)
+        for names in tasks.values()
+    ))
+
+    data = {}
+    for result in results:
+        data.update(result)
+    failed = [name for name in sections if data[name] is FAILED]
+    payload = {name: data[name] for name in sections if name not in failed}
+    if failed:
+        payload['errors'] = {name: 'This section could not be computed, try again later.' for name in failed}
+    # Rendered as the separate endpoints render them (durations, dates, decimals)
+    return HttpResponse(JSONRenderer().render(payload), content_type='application/json')
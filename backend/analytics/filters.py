@@ -0,0 +1,140 @@
+# Query parameters shared by the analytics, report and export endpoints
+# The filters are applied inside the database queries so a request only
+# reads the slice of tickets/equipment it covers
+
+from datetime import datetime, time
+from django.db.models import DateField
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from equipment.models import Equipment
+from tickets.models import Ticket
+
+GRANULARITIES = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+# Query parameters read by AnalyticsFilters
+PARAMS = ('since', 'until', 'school', 'type', 'granularity')
+
+def parse_datetime_param(params, name, end_of_day=False):
+    """
+    Parse an ISO date or datetime query parameter, None when absent
+    A bare date means the start of that day (or its end with end_of_day)
+    """
+    value = params.get(name)
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValidationError({name: 'Expected an ISO date or datetime.'})
+        parsed = datetime.combine(day, time.max if end_of_day else time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+class AnalyticsFilters:
+    """
+    Slice of the data a request covers:
+    tickets created between since and until (both inclusive), equipment of
+    one school and/or type, and the bucket size of time series
+    """
+
+    def __init__(self, since=None, until=None, school=None, equipment_type=None, granularity='month'):
+        self.since = since
+        self.until = until
+        self.school = school
+        self.equipment_type = equipment_type
+        self.granularity = granularity
+
+    @classmethod
+    def from_request(cls, request):
+        return cls.from_params(request.query_params)
+
+    @classmethod
+    def from_params(cls, params):
+        """
+        Filters from a mapping of query parameters (raises ValidationError)
+        """
+        since = parse_datetime_param(params, 'since')
+        until = parse_datetime_param(params, 'until', end_of_day=True)
+        if since and until and since > until:
+            raise ValidationError({'until': 'Must not be before since.'})
+
+        equipment_type = params.get('type') or None
+        if equipment_type and equipment_type not in dict(Equipment.EQUIPMENT_TYPE_CHOICES):
+            raise ValidationError({'type': f'Unknown equipment type "{equipment_type}".'})
+
+        granularity = params.get('granularity') or 'month'
+        if granularity not in GRANULARITIES:
+            raise ValidationError({'granularity': f'Use one of: {", ".join(GRANULARITIES)}.'})
+
+        return cls(since, until, params.get('school') or None, equipment_type, granularity)
+
+    def replace(self, **changes):
+        values = {
+            'since': self.since, 'until': self.until, 'school': self.school,
+            'equipment_type': self.equipment_type, 'granularity': self.granularity,
+        }
+        values.update(changes)
+        return type(self)(**values)
+
+    def to_params(self):
+        """
+        Query parameters rebuilding these filters with from_params
+        """
+        params = {
+            'since': self.since.isoformat() if self.since else None,
+            'until': self.until.isoformat() if self.until else None,
+            'school': self.school,
+            'type': self.equipment_type,
+            'granularity': self.granularity,
+        }
+        return {name: value for name, value in params.items() if value}
+
+    @property
+    def key(self):
+        return (self.since, self.until, self.school, self.equipment_type, self.granularity)
+
+    @property
+    def scopes_equipment(self):
+        return bool(self.school or self.equipment_type)
+
+    def equipment(self, queryset=None):
+        """
+        Equipment of the selected school/type
+        """
+        if queryset is None:
+            queryset = Equipment.objects.all()
+        if self.school:
+            queryset = queryset.filter(school=self.school)
+        if self.equipment_type:
+            queryset = queryset.filter(type=self.equipment_type)
+        return queryset
+
+    def tickets(self, queryset=None):
+        """
+        Tickets created in the window on equipment of the selected school/type
+        """
+        if queryset is None:
+            queryset = Ticket.objects.all()
+        if self.since:
+            queryset = queryset.filter(created_at__gte=self.since)
+        if self.until:
+            queryset = queryset.filter(created_at__lte=self.until)
+        if self.school:
+            queryset = queryset.filter(equipment__school=self.school)
+        if self.equipment_type:
+            queryset = queryset.filter(equipment__type=self.equipment_type)
+        return queryset
+
+    def period(self, field):
+        """
+        Expression truncating a date/datetime field to the start of its period
+        """
+        return GRANULARITIES[self.granularity](field, output_field=DateField())
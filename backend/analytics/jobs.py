@@ -0,0 +1,150 @@
+# Database backed queue for slow analytics
+# ?async=1 requests enqueue an AnalyticsJob and return at once, a separate
+# `manage.py analytics_worker` process computes it, so request workers are
+# never tied up by large inventories. No broker is needed.
+
+import hashlib
+import json
+import logging
+import os
+import socket
+import traceback
+from datetime import timedelta
+from functools import wraps
+from django.conf import settings
+from django.db.models import F, Q
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from .cache import get_data_version
+from .filters import AnalyticsFilters, PARAMS
+from .models import AnalyticsJob
+from .snapshot import get_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Job kinds and the snapshot part they compute
+JOB_KINDS = {
+    'failure_patterns': 'failure_patterns',
+    'school_issues': 'school_issues',
+    'predictions': 'predictions',
+    'health_report': 'health_report',
+    'issue_patterns': 'issue_patterns',
+    'schedule': 'schedule',
+    'budget': 'budget',
+}
+MAX_ATTEMPTS = 3
+
+def job_key(kind, params):
+    return hashlib.md5(json.dumps([kind, params], sort_keys=True).encode()).hexdigest()
+
+def enqueue_job(kind, params, user=None):
+    """
+    Queue a job computing `kind` for the filter params
+    An identical job still queued or running, or finished on the current data,
+    is returned instead of queuing a new one
+    """
+    key = job_key(kind, params)
+    version = get_data_version()
+    reusable = Q(status__in=['queued', 'running']) | Q(
+        status='done', data_version=version, expires_at__gt=timezone.now()
+    )
+    existing = AnalyticsJob.objects.filter(reusable, key=key).order_by('-created_at').first()
+    if existing is not None:
+        return existing
+    return AnalyticsJob.objects.create(kind=kind, params=params, key=key, data_version=version, created_by=user)
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+def claim_job(worker=None):
+    """
+    Atomically take the oldest queued job, None when the queue is empty
+    The conditional update makes sure two workers never run the same job
+    """
+    while True:
+        candidate = (
+            AnalyticsJob.objects.filter(status='queued')
+            .order_by('created_at').values_list('id', flat=True).first()
+        )
+        if candidate is None:
+            return None
+        claimed = AnalyticsJob.objects.filter(id=candidate, status='queued').update(
+            status='running', started_at=timezone.now(), worker=worker or worker_name(),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return AnalyticsJob.objects.get(id=candidate)
+
+def run_job(job):
+    """
+    Compute the job and store its result, rendered as the synchronous endpoint would
+    """
+    try:
+        filters = AnalyticsFilters.from_params(job.params)
+        data = getattr(get_snapshot(filters), JOB_KINDS[job.kind])
+        job.result = json.loads(JSONRenderer().render(data))
+        job.status = 'done'
+    except Exception:
+        logger.exception('Analytics job %s failed', job.id)
+        job.error = traceback.format_exc()
+        job.status = 'failed'
+    job.finished_at = timezone.now()
+    job.expires_at = job.finished_at + timedelta(seconds=settings.ANALYTICS_JOB_RESULT_TTL)
+    job.save(update_fields=['result', 'error', 'status', 'finished_at', 'expires_at'])
+    return job
+
+def recover_lost_jobs():
+    """
+    Requeue jobs whose worker died mid-run, giving up after MAX_ATTEMPTS
+    """
+    now = timezone.now()
+    lost = AnalyticsJob.objects.filter(
+        status='running', started_at__lt=now - timedelta(seconds=settings.ANALYTICS_JOB_TIMEOUT)
+    )
+    failed = lost.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status='failed', error='Worker lost', finished_at=now,
+        expires_at=now + timedelta(seconds=settings.ANALYTICS_JOB_RESULT_TTL),
+    )
+    requeued = lost.filter(attempts__lt=MAX_ATTEMPTS).update(status='queued', worker='')
+    return requeued, failed
+
+def purge_expired_jobs():
+    return AnalyticsJob.objects.filter(expires_at__lt=timezone.now()).delete()[0]
+
+def offload_to_worker(kind):
+    """
+    View decorator: with ?async=1 the request queues a `kind` job and gets
+    202 with the job id instead of computing the response itself
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.query_params.get('async') not in ('1', 'true'):
+                return view_method(self, request, *args, **kwargs)
+            params = {name: request.query_params[name] for name in PARAMS if request.query_params.get(name)}
+            # Invalid parameters fail now rather than in the worker
+            AnalyticsFilters.from_params(params)
+            job = enqueue_job(kind, params, request.user)
+            return Response(job_status(job, request), status=status.HTTP_202_ACCEPTED)
+        return wrapper
+    return decorator
+
+def job_status(job, request=None):
+    url = reverse('analytics_job', args=[job.id])
+    data = {
+        'job_id': str(job.id),
+        'kind': job.kind,
+        'status': job.status,
+        'status_url': request.build_absolute_uri(url) if request is not None else url,
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+        'expires_at': job.expires_at,
+    }
+    if job.status == 'done':
+        data['result'] = job.result
+    elif job.status == 'failed':
+        data['error'] = 'The analytics job failed, try again later.'
+    return data
@@ -0,0 +1,39 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from analytics.jobs import claim_job, run_job, recover_lost_jobs, purge_expired_jobs, worker_name
+
+class Command(BaseCommand):
+    help = 'Run queued analytics jobs (?async=1 requests) until stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty instead of waiting for more jobs')
+        parser.add_argument('--max-jobs', type=int, default=0,
+                            help='Exit after this many jobs (0 = no limit), e.g. to recycle the process')
+
+    def handle(self, *args, **options):
+        name = worker_name()
+        processed = 0
+        self.stdout.write(f'Analytics worker {name} started')
+        try:
+            while not options['max_jobs'] or processed < options['max_jobs']:
+                close_old_connections()
+                recover_lost_jobs()
+                job = claim_job(name)
+                if job is None:
+                    purge_expired_jobs()
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                started = time.monotonic()
+                run_job(job)
+                processed += 1
+                self.stdout.write(f'{job.kind} job {job.id} {job.status} in {time.monotonic() - started:.2f}s')
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Analytics worker {name} stopped after {processed} jobs'))
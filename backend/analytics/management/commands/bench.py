@@ -0,0 +1,88 @@
+import json
+import os
+import tempfile
+import time
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from silsp.benchmark import SKIPPED_ROUTES, find_regressions, run_benchmark, uncovered_routes
+from silsp.seeding import SCALES, seed_dataset
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark every API route on seeded datasets of each scale, in a separate test database. '
+        'Writes p50/p95 latency and query counts to JSON and fails on regressions against a baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='1k,10k,100k',
+                            help='Comma separated dataset scales: ' + ', '.join(SCALES))
+        parser.add_argument('--repeat', type=int, default=20, help='Runs of each request')
+        parser.add_argument('--warm', action='store_true',
+                            help="Keep the analytics caches between runs (default: measure the computation)")
+        parser.add_argument('--schools', type=int, default=10)
+        parser.add_argument('--output', default='bench_results.json', help='JSON results file')
+        parser.add_argument('--baseline', help='Results of an earlier run to compare against')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Allowed p95 slowdown against the baseline, as a fraction')
+        parser.add_argument('--min-delta-ms', type=float, default=5.0,
+                            help='Slowdowns smaller than this are never regressions (timer noise)')
+        parser.add_argument('--database-file', default=os.path.join(tempfile.gettempdir(), 'silsp_bench.sqlite3'),
+                            help='SQLite file of the benchmark database (recreated, deleted afterwards)')
+
+    def handle(self, *args, **options):
+        scales = [scale.strip() for scale in options['scales'].split(',') if scale.strip()]
+        unknown = [scale for scale in scales if scale not in SCALES]
+        if unknown:
+            raise CommandError(f'Unknown scales: {", ".join(unknown)}')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)['scales']
+
+        # Never seed the real database: benchmark in a test database like the test runner does
+        if connection.vendor == 'sqlite':
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = options['database_file']
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        results = {}
+        try:
+            for scale in scales:
+                call_command('flush', interactive=False, verbosity=0)
+                start = time.perf_counter()
+                seeded = seed_dataset(SCALES[scale], schools=options['schools'])
+                self.stdout.write(f'{scale}: seeded {seeded["tickets"]} tickets in {time.perf_counter() - start:.1f}s')
+                if not results:
+                    missing = uncovered_routes()
+                    if missing:
+                        self.stderr.write(f'Routes not benchmarked: {", ".join(missing)}')
+                results[scale] = run_benchmark(repeat=options['repeat'], warm=options['warm'])
+                self.write_table(scale, results[scale])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        with open(options['output'], 'w') as f:
+            json.dump({
+                'created_at': timezone.now().isoformat(),
+                'repeat': options['repeat'],
+                'warm': options['warm'],
+                'skipped': SKIPPED_ROUTES,
+                'scales': results,
+            }, f, indent=2)
+        self.stdout.write(f'Results written to {options["output"]}')
+
+        if baseline is not None:
+            regressions = find_regressions(results, baseline, options['threshold'], options['min_delta_ms'])
+            if regressions:
+                for regression in regressions:
+                    self.stderr.write(regression)
+                raise CommandError(f'{len(regressions)} regressions against {options["baseline"]}')
+            self.stdout.write(self.style.SUCCESS(f'No regressions against {options["baseline"]}'))
+
+    def write_table(self, scale, results):
+        self.stdout.write(f'{"request":<45} {"status":>8} {"p50 ms":>9} {"p95 ms":>9} {"queries":>8}')
+        for name, result in results.items():
+            status = ','.join(str(code) for code in result['status'])
+            self.stdout.write(
+                f'{name:<45} {status:>8} {result["p50_ms"]:>9.1f} {result["p95_ms"]:>9.1f} {result["queries"]:>8}'
+            )
@@ -0,0 +1,181 @@
+import importlib.util
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from equipment.models import Equipment
+from silsp.loadtest import LoadConfig, count_lock_errors, loadtest_users, run_load
+from silsp.seeding import DEFAULT_PASSWORD
+from tickets.models import Ticket
+
+# Server commands, run from the backend directory
+SERVERS = {
+    'runserver': lambda host, port, options: [
+        sys.executable, 'manage.py', 'runserver', '--noreload', f'{host}:{port}',
+    ],
+    'uvicorn': lambda host, port, options: [
+        sys.executable, '-m', 'uvicorn', 'silsp.asgi:application', '--host', host, '--port', str(port),
+        '--workers', str(options['workers']), '--no-access-log',
+    ],
+    'gunicorn': lambda host, port, options: [
+        sys.executable, '-m', 'gunicorn', 'silsp.wsgi:application', '--bind', f'{host}:{port}',
+        '--workers', str(options['workers']), '--threads', str(options['threads']),
+    ],
+}
+
+class Command(BaseCommand):
+    help = (
+        'Simulate students and technicians using the app over HTTP: they log in through /api/token/, '
+        'poll the equipment list, load the dashboards, create tickets and post comments. '
+        'Reports throughput, latency percentiles, error and database lock rates.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=20)
+        parser.add_argument('--technicians', type=int, default=5)
+        parser.add_argument('--duration', type=float, default=60, help='Seconds of full load, after the ramp-up')
+        parser.add_argument('--ramp-up', type=float, default=10, help='Seconds over which the users arrive')
+        parser.add_argument('--think-time', type=float, default=2,
+                            help='Mean seconds between two actions of a user')
+        parser.add_argument('--poll-interval', type=float, default=5, help='Equipment list polling (EquipmentList.js)')
+        parser.add_argument('--timeout', type=float, default=30, help='Seconds before a request counts as failed')
+        parser.add_argument('--url', help='Load an already running server (using this database) instead of starting one')
+        parser.add_argument('--server', choices=sorted(SERVERS), default='runserver',
+                            help='Server started for the run (uvicorn and gunicorn must be installed)')
+        parser.add_argument('--workers', type=int, default=1, help='Worker processes of uvicorn/gunicorn')
+        parser.add_argument('--threads', type=int, default=1, help='Threads per gunicorn worker')
+        parser.add_argument('--port', type=int, default=0, help='Port of the started server (default: a free one)')
+        parser.add_argument('--schools', help='Comma separated schools of the users (default: those with equipment)')
+        parser.add_argument('--password', default=DEFAULT_PASSWORD)
+        parser.add_argument('--no-register', action='store_true',
+                            help='The loadtest_* users already exist, only log them in')
+        parser.add_argument('--no-etags', action='store_true', help="Don't revalidate GETs with If-None-Match")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='JSON results file')
+
+    def handle(self, *args, **options):
+        if options['students'] < 0 or options['technicians'] < 0 or not options['students'] + options['technicians']:
+            raise CommandError('Nothing to simulate, give --students and/or --technicians')
+        if options['schools']:
+            schools = [school.strip() for school in options['schools'].split(',') if school.strip()]
+        else:
+            schools = sorted(Equipment.objects.values_list('school', flat=True).distinct())
+        if not schools:
+            raise CommandError('No equipment to report issues on, seed the database first (manage.py seed_bench)')
+        equipment = {}
+        for equipment_id, school in Equipment.objects.filter(school__in=schools).values_list('id', 'school'):
+            equipment.setdefault(school, []).append(equipment_id)
+
+        config = LoadConfig(
+            url=options['url'] or '',
+            users=loadtest_users(options['students'], options['technicians'], schools, options['password']),
+            duration=options['duration'], ramp_up=options['ramp_up'], think_time=options['think_time'],
+            poll_interval=options['poll_interval'], timeout=options['timeout'], equipment=equipment,
+            ticket_ids=list(Ticket.objects.order_by('-id').values_list('id', flat=True)[:1000]),
+            register=not options['no_register'], etags=not options['no_etags'], seed=options['seed'],
+        )
+
+        server_log = None
+        if options['url']:
+            server = None
+        else:
+            server, config.url, server_log = self.start_server(options)
+        try:
+            self.stdout.write(
+                f'{options["students"]} students and {options["technicians"]} technicians against {config.url} '
+                f'for {options["ramp_up"]:g}s ramp-up + {options["duration"]:g}s'
+            )
+            results = run_load(config)
+        finally:
+            if server is not None:
+                self.stop_server(server)
+        logged_lock_errors = None
+        if server_log is not None:
+            with open(server_log, errors='replace') as f:
+                logged_lock_errors = count_lock_errors(f.read())
+            os.unlink(server_log)
+        results['server_log_lock_errors'] = logged_lock_errors
+
+        self.write_table(results)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({
+                    'created_at': timezone.now().isoformat(),
+                    'server': None if options['url'] else options['server'],
+                    'workers': options['workers'],
+                    'threads': options['threads'],
+                    'sqlite_tuned': os.environ.get('SILSP_SQLITE_TUNED') == '1',
+                    'students': options['students'],
+                    'technicians': options['technicians'],
+                    **results,
+                }, f, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+    def start_server(self, options):
+        """
+        Start the server on localhost, returns the process, its URL and log file
+        """
+        module = {'runserver': None, 'uvicorn': 'uvicorn', 'gunicorn': 'gunicorn'}[options['server']]
+        if module and importlib.util.find_spec(module) is None:
+            raise CommandError(f'{module} is not installed (pip install {module})')
+        host = '127.0.0.1'
+        port = options['port'] or free_port(host)
+        log = tempfile.NamedTemporaryFile(prefix='silsp_loadtest_', suffix='.log', delete=False)
+        # Settings such as SILSP_SQLITE_TUNED come from the environment
+        process = subprocess.Popen(
+            SERVERS[options['server']](host, port, options), cwd=settings.BASE_DIR,
+            stdout=log, stderr=subprocess.STDOUT,
+        )
+        log.close()
+        deadline = time.monotonic() + 60
+        while True:
+            if process.poll() is not None:
+                with open(log.name, errors='replace') as f:
+                    output = f.read()
+                os.unlink(log.name)
+                raise CommandError(f'The server exited with code {process.returncode}:\n{output}')
+            try:
+                socket.create_connection((host, port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    self.stop_server(process)
+                    raise CommandError(f'The server did not listen on {host}:{port} within 60s')
+                time.sleep(0.2)
+        return process, f'http://{host}:{port}', log.name
+
+    def stop_server(self, process):
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    def write_table(self, results):
+        self.stdout.write(
+            f'{"action":<22} {"requests":>9} {"req/s":>8} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} '
+            f'{"errors":>8} {"locks":>6}'
+        )
+        rows = list(results['actions'].items()) + [('total', results['total'])]
+        for name, row in rows:
+            if not row['requests']:
+                continue
+            self.stdout.write(
+                f'{name:<22} {row["requests"]:>9} {row["throughput_rps"]:>8.1f} {row["p50_ms"]:>9.1f} '
+                f'{row["p95_ms"]:>9.1f} {row["p99_ms"]:>9.1f} {row["error_rate"]:>8.1%} {row["lock_errors"]:>6}'
+            )
+        self.stdout.write(f'Elapsed {results["elapsed_s"]}s, statuses {results["total"]["statuses"]}')
+        if results['server_log_lock_errors'] is not None:
+            self.stdout.write(f'Database lock errors in the server log: {results["server_log_lock_errors"]}')
+
+def free_port(host):
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from equipment.models import Equipment
+from analytics.models import EquipmentHealth
+from analytics.utils import refresh_equipment_health, stale_equipment_health
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the precomputed EquipmentHealth table from the ticket history. '
+        'Run with --stale periodically (e.g. daily) to refresh the rows whose time windows moved on.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of equipment refreshed per query')
+        parser.add_argument('--stale', action='store_true',
+                            help='Only refresh missing and expired rows, keep the others')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        now = timezone.now()
+        equipment = stale_equipment_health(now=now) if options['stale'] else Equipment.objects.all()
+        ids = list(equipment.order_by('id').values_list('id', flat=True))
+        refreshed = 0
+
+        if options['stale']:
+            # Short transactions, reads go on meanwhile
+            for start in range(0, len(ids), batch_size):
+                with transaction.atomic():
+                    refreshed += refresh_equipment_health(
+                        Equipment.objects.filter(id__in=ids[start:start + batch_size]), now
+                    )
+            self.stdout.write(self.style.SUCCESS(f'Refreshed health for {refreshed} stale equipment'))
+            return
+
+        with transaction.atomic():
+            EquipmentHealth.objects.all().delete()
+            for start in range(0, len(ids), batch_size):
+                batch = ids[start:start + batch_size]
+                refreshed += refresh_equipment_health(
+                    Equipment.objects.filter(id__gte=batch[0], id__lte=batch[-1]), now
+                )
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt health for {refreshed} equipment'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from analytics.rollups import rebuild_rollups
+
+class Command(BaseCommand):
+    help = 'Rebuild the DailyTicketRollup table from the ticket history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of rollup rows inserted per query')
+
+    def handle(self, *args, **options):
+        created = rebuild_rollups(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {created} daily ticket rollups'))
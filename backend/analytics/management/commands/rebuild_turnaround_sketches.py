@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from analytics.turnaround import rebuild_turnaround_sketches
+
+class Command(BaseCommand):
+    help = 'Rebuild the TurnaroundSketch table from the resolved tickets'
+
+    def handle(self, *args, **options):
+        created = rebuild_turnaround_sketches()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {created} turnaround sketches'))
@@ -0,0 +1,38 @@
+import time
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from silsp.seeding import DEFAULT_PASSWORD, SCALES, seed_dataset
+from tickets.models import Ticket
+
+class Command(BaseCommand):
+    help = 'Fill the database with a synthetic school district for benchmarks and load tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='1k',
+                            help='Number of tickets: ' + ', '.join(SCALES))
+        parser.add_argument('--tickets', type=int, help='Number of tickets, overrides --scale')
+        parser.add_argument('--schools', type=int, default=10)
+        parser.add_argument('--equipment', type=int, help='Number of equipment (default: tickets / 4)')
+        parser.add_argument('--students', type=int, default=5, help='Students per school')
+        parser.add_argument('--comments', type=float, default=0.5, help='Average comments per ticket')
+        parser.add_argument('--days', type=int, default=365, help='Tickets are spread over this many days')
+        parser.add_argument('--password', default=DEFAULT_PASSWORD, help='Password of the seeded users')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed')
+        parser.add_argument('--flush', action='store_true',
+                            help='Delete ALL data of the database first (manage.py flush)')
+
+    def handle(self, *args, **options):
+        if options['flush']:
+            call_command('flush', interactive=False, verbosity=0)
+        elif Ticket.objects.exists():
+            raise CommandError('The database already has tickets, use a fresh database or --flush.')
+
+        start = time.perf_counter()
+        created = seed_dataset(
+            options['tickets'] or SCALES[options['scale']],
+            schools=options['schools'], equipment=options['equipment'],
+            students_per_school=options['students'], comments_per_ticket=options['comments'],
+            days=options['days'], password=options['password'], seed=options['seed'],
+        )
+        summary = ', '.join(f'{count} {name}' for name, count in created.items())
+        self.stdout.write(self.style.SUCCESS(f'Seeded {summary} in {time.perf_counter() - start:.1f}s'))
@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from silsp.sqlite import enable_incremental_auto_vacuum, run_maintenance
+
+class Command(BaseCommand):
+    help = 'Refresh SQLite planner statistics, reclaim free pages and checkpoint the WAL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Repeat every INTERVAL seconds instead of running once')
+        parser.add_argument('--analyze', action='store_true',
+                            help='Run a full ANALYZE instead of the incremental PRAGMA optimize')
+        parser.add_argument('--vacuum-pages', type=int, default=1000,
+                            help='Maximum number of free pages reclaimed per run')
+        parser.add_argument('--enable-auto-vacuum', action='store_true',
+                            help='Switch the database to incremental auto vacuum (rewrites the file once)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('sqlite_maintenance only applies to SQLite databases')
+
+        if options['enable_auto_vacuum'] and enable_incremental_auto_vacuum():
+            self.stdout.write('Enabled incremental auto vacuum')
+
+        while True:
+            result = run_maintenance(analyze=options['analyze'], vacuum_pages=options['vacuum_pages'])
+            self.stdout.write(self.style.SUCCESS(
+                f'SQLite maintenance done in {result.seconds:.2f}s, '
+                f'{result.free_pages} free pages, {result.reclaimed} reclaimed'
+            ))
+            if not options['interval']:
+                break
+            close_old_connections()
+            time.sleep(options['interval'])
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('equipment', '0003_remove_equipment_description'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EquipmentHealth',
+            fields=[
+                ('equipment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='health', serialize=False, to='equipment.equipment')),
+                ('tickets_180d', models.PositiveIntegerField(default=0)),
+                ('resolved_180d', models.PositiveIntegerField(default=0)),
+                ('tickets_90d', models.PositiveIntegerField(default=0)),
+                ('avg_resolution_90d', models.DurationField(blank=True, null=True)),
+                ('last_issue_at', models.DateTimeField(blank=True, null=True)),
+                ('health_score', models.FloatField(default=100)),
+                ('computed_at', models.DateTimeField()),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:20
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def populate_rollups(apps, schema_editor):
+    Ticket = apps.get_model('tickets', 'Ticket')
+    DailyTicketRollup = apps.get_model('analytics', 'DailyTicketRollup')
+    rows = (
+        Ticket.objects.annotate(date=TruncDate('created_at'))
+        .values('date', 'equipment__type', 'equipment__school', 'equipment__location', 'issue_category', 'status')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    DailyTicketRollup.objects.bulk_create(
+        [
+            DailyTicketRollup(
+                date=row['date'],
+                equipment_type=row['equipment__type'],
+                school=row['equipment__school'],
+                location=row['equipment__location'],
+                issue_category=row['issue_category'],
+                status=row['status'],
+                count=row['count'],
+            )
+            for row in rows.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_dataversion'),
+        ('tickets', '0003_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyTicketRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('equipment_type', models.CharField(max_length=20)),
+                ('school', models.CharField(max_length=100)),
+                ('location', models.CharField(max_length=100)),
+                ('issue_category', models.CharField(max_length=100)),
+                ('status', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'equipment_type', 'school', 'location', 'issue_category', 'status'), name='daily_ticket_rollup_key')],
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
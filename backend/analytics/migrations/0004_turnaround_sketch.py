@@ -0,0 +1,53 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:26
+
+from collections import defaultdict
+from django.db import migrations, models
+
+
+def populate_sketches(apps, schema_editor):
+    from analytics.sketch import QuantileSketch
+
+    Ticket = apps.get_model('tickets', 'Ticket')
+    TurnaroundSketch = apps.get_model('analytics', 'TurnaroundSketch')
+    sketches = defaultdict(QuantileSketch)
+    resolved = Ticket.objects.filter(resolved_at__isnull=False).values_list(
+        'equipment__type', 'equipment__school', 'created_at', 'resolved_at'
+    )
+    for equipment_type, school, created_at, resolved_at in resolved.iterator():
+        sketches[(equipment_type, school)].add(max((resolved_at - created_at).total_seconds(), 0))
+    TurnaroundSketch.objects.bulk_create([
+        TurnaroundSketch(equipment_type=equipment_type, school=school, sketch=sketch.to_dict())
+        for (equipment_type, school), sketch in sketches.items()
+    ])
+
+
+def clear_equipment_health(apps, schema_editor):
+    # Average resolution times now come from resolved_at. Reads never write the rows,
+    # run `manage.py rebuild_equipment_health` once migrated (see the README upgrade notes)
+    apps.get_model('analytics', 'EquipmentHealth').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_daily_ticket_rollup'),
+        ('tickets', '0004_status_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TurnaroundSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('equipment_type', models.CharField(max_length=20)),
+                ('school', models.CharField(max_length=100)),
+                ('sketch', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('equipment_type', 'school'), name='turnaround_sketch_key')],
+            },
+        ),
+        migrations.RunPython(populate_sketches, migrations.RunPython.noop),
+        migrations.RunPython(clear_equipment_health, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 05:07
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0005_analytics_job'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='equipmenthealth',
+            name='health_score',
+        ),
+    ]
@@ -1,4 +1,123 @@
+import uuid
 from django.db import models
+from equipment.models import Equipment
+from users.models import User
  
 # Analytics models for AI-powered insights
-# This file can be used for storing analytics results or ML model metadata 
\ No newline at end of file
+# This file can be used for storing analytics results or ML model metadata 
+
+class EquipmentHealth(models.Model):
+    """
+    Precomputed ticket features for one equipment, the health score is
+    derived from them as of the request time (see AnalyticsSnapshot)
+    Kept up to date from ticket/equipment writes (see signals.py)
+    """
+    equipment = models.OneToOneField(Equipment, related_name='health', on_delete=models.CASCADE, primary_key=True)
+    tickets_180d = models.PositiveIntegerField(default=0)
+    resolved_180d = models.PositiveIntegerField(default=0)
+    tickets_90d = models.PositiveIntegerField(default=0)
+    avg_resolution_90d = models.DurationField(null=True, blank=True)
+    last_issue_at = models.DateTimeField(null=True, blank=True)
+    computed_at = models.DateTimeField()
+    # When the oldest counted ticket leaves its window and the counts must be recomputed
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.equipment} health features"
+
+class DataVersion(models.Model):
+    """
+    Change counter per tracked table, bumped on every write (see signals.py)
+    Cached analytics results are keyed on these versions
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+
+class DailyTicketRollup(models.Model):
+    """
+    Number of tickets created on one day per equipment type, school, location,
+    issue category and current status
+    Kept up to date from ticket/equipment writes (see signals.py) and rebuilt
+    with `manage.py rebuild_ticket_rollups`
+    """
+    date = models.DateField()
+    equipment_type = models.CharField(max_length=20)
+    school = models.CharField(max_length=100)
+    location = models.CharField(max_length=100)
+    issue_category = models.CharField(max_length=100)
+    status = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'equipment_type', 'school', 'location', 'issue_category', 'status'],
+                name='daily_ticket_rollup_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.equipment_type}/{self.school}/{self.issue_category}: {self.count}"
+
+class TurnaroundSketch(models.Model):
+    """
+    Quantile sketch (see sketch.py) of the turnaround, creation to resolution,
+    of the resolved tickets of one equipment type at one school
+    Kept up to date from ticket/equipment writes (see signals.py)
+    """
+    equipment_type = models.CharField(max_length=20)
+    school = models.CharField(max_length=100)
+    sketch = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['equipment_type', 'school'], name='turnaround_sketch_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.equipment_type}/{self.school} turnaround ({self.sketch.get('count', 0)} tickets)"
+
+class AnalyticsJob(models.Model):
+    """
+    Analytics computation queued by an ?async=1 request and run by
+    `manage.py analytics_worker` (see jobs.py)
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict)
+    # Identical requests share one job, see jobs.enqueue_job
+    key = models.CharField(max_length=32)
+    data_version = models.CharField(max_length=200, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+    created_by = models.ForeignKey(User, related_name='analytics_jobs', on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Claiming the oldest queued job
+            models.Index(fields=['status', 'created_at'], name='analytics_job_queue_idx'),
+            # Reusing a job for an identical request
+            models.Index(fields=['key', 'status'], name='analytics_job_key_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} job {self.id} ({self.status})"
@@ -0,0 +1,92 @@
+# Parallel analytics for district-wide deployments
+# The equipment is split by school and every school is computed in a worker
+# process (its own interpreter and DB connection), then the per-school results
+# are merged into the usual response shapes.
+# Enabled with ANALYTICS_PARALLEL_WORKERS > 1, see AnalyticsSnapshot
+
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.db import connections
+
+# Snapshot parts computed per school
+SHARDED_PARTS = ('health_report', 'predictions', 'schedule')
+URGENCY_ORDER = {'high': 0, 'medium': 1, 'low': 2}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def parallel_workers():
+    return getattr(settings, 'ANALYTICS_PARALLEL_WORKERS', 0) or 0
+
+def _init_worker():
+    # Spawned workers start from a fresh interpreter
+    import django
+    django.setup()
+
+def get_pool():
+    """
+    Process pool shared by all requests of this process, started on first use
+    Workers are spawned rather than forked so they never inherit the DB
+    connections or threads of the web server
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=parallel_workers(),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+            )
+            atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+        return _pool
+
+def compute_school(school, params, as_of):
+    """
+    Worker side: the sharded snapshot parts for the equipment of one school
+    """
+    from .filters import AnalyticsFilters
+    from .snapshot import AnalyticsSnapshot
+
+    filters = AnalyticsFilters.from_params(params)
+    snapshot = AnalyticsSnapshot(as_of=as_of, queryset=filters.equipment().filter(school=school), filters=filters)
+    try:
+        return {part: getattr(snapshot, part) for part in SHARDED_PARTS}
+    finally:
+        # Don't hold a connection (and SQLite read snapshot) between tasks
+        connections.close_all()
+
+def merge_school_results(results):
+    """
+    Merge per-school parts into the shapes of a single snapshot
+    """
+    merged = {
+        'health_report': [],
+        'predictions': [],
+        'schedule': {'daily': [], 'weekly': [], 'monthly': [], 'quarterly': [], 'annually': []},
+    }
+    for result in results:
+        merged['health_report'].extend(result['health_report'])
+        merged['predictions'].extend(result['predictions'])
+        for frequency, entries in result['schedule'].items():
+            merged['schedule'][frequency].extend(entries)
+
+    merged['health_report'].sort(key=lambda entry: entry['equipment_id'])
+    merged['predictions'].sort(key=lambda entry: (URGENCY_ORDER[entry['urgency']], entry['equipment_id']))
+    for entries in merged['schedule'].values():
+        entries.sort(key=lambda entry: entry['equipment_id'])
+    return merged
+
+def compute_by_school(filters, as_of):
+    """
+    Compute the sharded parts for the equipment of the filters, one school per task
+    """
+    params = filters.to_params()
+    schools = list(
+        filters.equipment().order_by('school').values_list('school', flat=True).distinct()
+    )
+    pool = get_pool()
+    futures = [pool.submit(compute_school, school, params, as_of) for school in schools]
+    return merge_school_results(future.result() for future in futures)
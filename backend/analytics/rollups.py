@@ -0,0 +1,222 @@
+# Daily ticket rollups
+# Ticket statistics are summed from DailyTicketRollup (a few rows per day)
+# instead of grouping the whole ticket table on every request
+
+from collections import Counter
+from datetime import datetime, time, timedelta
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from tickets.models import Ticket
+from .filters import AnalyticsFilters
+from .models import DailyTicketRollup
+
+KEY_FIELDS = ('date', 'equipment_type', 'school', 'location', 'issue_category', 'status')
+
+# How each dimension is read from the rollup table and from the tickets
+# ('period' is the date truncated to the granularity of the filters)
+ROLLUP_DIMENSIONS = {
+    'equipment_type': 'equipment_type',
+    'school': 'school',
+    'location': 'location',
+    'issue_category': 'issue_category',
+    'status': 'status',
+}
+TICKET_DIMENSIONS = {
+    'equipment_type': 'equipment__type',
+    'school': 'equipment__school',
+    'location': 'equipment__location',
+    'issue_category': 'issue_category',
+    'status': 'status',
+}
+
+def rollup_key(created_at, equipment, issue_category, status):
+    """
+    Rollup row a ticket is counted in, equipment is an Equipment or a dict of its values
+    """
+    if not isinstance(equipment, dict):
+        equipment = {'type': equipment.type, 'school': equipment.school, 'location': equipment.location}
+    return (
+        timezone.localdate(created_at), equipment['type'], equipment['school'], equipment['location'],
+        issue_category, status,
+    )
+
+def ticket_rollup_key(ticket):
+    return rollup_key(ticket.created_at, ticket.equipment, ticket.issue_category, ticket.status)
+
+def apply_rollup_deltas(deltas):
+    """
+    Add {rollup key: count change} to the rollup table
+    Existing rows are incremented in the database, missing ones created
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    with transaction.atomic():
+        # Superset of the wanted rows, narrowed down below
+        candidates = DailyTicketRollup.objects.filter(**{
+            f'{field}__in': {key[position] for key in deltas}
+            for position, field in enumerate(KEY_FIELDS)
+        })
+        existing = []
+        for row in candidates:
+            key = tuple(getattr(row, field) for field in KEY_FIELDS)
+            if key in deltas:
+                row.count = F('count') + deltas.pop(key)
+                existing.append(row)
+        DailyTicketRollup.objects.bulk_update(existing, ['count'])
+        DailyTicketRollup.objects.bulk_create([
+            DailyTicketRollup(**dict(zip(KEY_FIELDS, key)), count=delta)
+            for key, delta in deltas.items() if delta > 0
+        ])
+
+def equipment_ticket_deltas(equipment_id, old_values, new_values):
+    """
+    Rollup changes moving the tickets of one equipment from its old
+    type/school/location to the new ones (new_values None when it's deleted)
+    """
+    deltas = Counter()
+    rows = (
+        Ticket.objects.filter(equipment_id=equipment_id)
+        .values('issue_category', 'status', day=TruncDate('created_at'))
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    for row in rows:
+        old_key = (row['day'], old_values['type'], old_values['school'], old_values['location'],
+                   row['issue_category'], row['status'])
+        deltas[old_key] -= row['count']
+        if new_values is not None:
+            deltas[(row['day'], new_values['type'], new_values['school'], new_values['location'],
+                    row['issue_category'], row['status'])] += row['count']
+    return deltas
+
+def _grouped_counts(queryset, mapping, dimensions, count):
+    fields = [mapping[name] for name in dimensions if isinstance(mapping[name], str)]
+    expressions = {name: mapping[name] for name in dimensions if not isinstance(mapping[name], str)}
+    rows = (
+        queryset.values(*fields, **expressions)
+        .annotate(total=count(), resolved=count(filter=Q(status='resolved')))
+        .order_by()
+    )
+    for row in rows:
+        key = tuple(
+            row[mapping[name]] if isinstance(mapping[name], str) else row[name]
+            for name in dimensions
+        )
+        yield key, row['total'] or 0, row['resolved'] or 0
+
+def _local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+def split_window(since, until):
+    """
+    Split the [since, until] window into the whole local days it covers and
+    the partial days at either end
+    Returns (first_day, last_day, partial) where the days are None when the
+    window is open on that side or covers no whole day (then first_day > last_day)
+    and partial is a Q on created_at for the tickets outside the whole days
+    """
+    first_day = last_day = None
+    partial = []
+    if since is not None:
+        local_since = timezone.localtime(since)
+        first_day = local_since.date()
+        if local_since.time() != time.min:
+            first_day += timedelta(days=1)
+            partial.append(Q(created_at__gte=since, created_at__lt=_local_midnight(first_day)))
+    if until is not None:
+        local_until = timezone.localtime(until)
+        last_day = local_until.date()
+        if local_until.time() != time.max:
+            last_day -= timedelta(days=1)
+            partial.append(Q(created_at__gte=_local_midnight(last_day + timedelta(days=1)), created_at__lte=until))
+
+    if first_day is not None and last_day is not None and first_day > last_day:
+        # No whole day in the window, all of it is counted from the tickets
+        return first_day, last_day, Q(created_at__gte=since, created_at__lte=until)
+    if not partial:
+        return first_day, last_day, None
+    window = partial[0]
+    for part in partial[1:]:
+        window |= part
+    return first_day, last_day, window
+
+def ticket_counts(*dimensions, filters=None):
+    """
+    Number of tickets (total and resolved) grouped by the given dimensions,
+    restricted to the window/school/type of the filters
+    Returns a list of dicts with the dimensions plus 'total' and 'resolved'
+
+    Whole days are summed from the rollup table, the partial days at the
+    ends of the window are counted from the tickets themselves so results are exact
+    """
+    if filters is None:
+        filters = AnalyticsFilters()
+    rollup_dimensions = {**ROLLUP_DIMENSIONS, 'period': filters.period('date')}
+    ticket_dimensions = {**TICKET_DIMENSIONS, 'period': filters.period('created_at')}
+
+    first_day, last_day, partial = split_window(filters.since, filters.until)
+    whole_days = first_day is None or last_day is None or first_day <= last_day
+
+    totals = Counter()
+    resolved = Counter()
+    if whole_days:
+        rollups = DailyTicketRollup.objects.all()
+        if first_day is not None:
+            rollups = rollups.filter(date__gte=first_day)
+        if last_day is not None:
+            rollups = rollups.filter(date__lte=last_day)
+        if filters.school:
+            rollups = rollups.filter(school=filters.school)
+        if filters.equipment_type:
+            rollups = rollups.filter(equipment_type=filters.equipment_type)
+        for key, total, resolved_count in _grouped_counts(
+            rollups, rollup_dimensions, dimensions, lambda **kwargs: Sum('count', **kwargs)
+        ):
+            totals[key] += total
+            resolved[key] += resolved_count
+    if partial is not None:
+        tickets = filters.replace(since=None, until=None).tickets().filter(partial)
+        for key, total, resolved_count in _grouped_counts(
+            tickets, ticket_dimensions, dimensions, lambda **kwargs: Count('id', **kwargs)
+        ):
+            totals[key] += total
+            resolved[key] += resolved_count
+
+    return [
+        {**dict(zip(dimensions, key)), 'total': total, 'resolved': resolved[key]}
+        for key, total in totals.items() if total > 0
+    ]
+
+def rebuild_rollups(batch_size=1000):
+    """
+    Recompute the whole rollup table from the tickets
+    """
+    rows = (
+        Ticket.objects.values(
+            'issue_category', 'status', 'equipment__type', 'equipment__school', 'equipment__location',
+            day=TruncDate('created_at'),
+        )
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    with transaction.atomic():
+        DailyTicketRollup.objects.all().delete()
+        created = DailyTicketRollup.objects.bulk_create(
+            [
+                DailyTicketRollup(
+                    date=row['day'],
+                    equipment_type=row['equipment__type'],
+                    school=row['equipment__school'],
+                    location=row['equipment__location'],
+                    issue_category=row['issue_category'],
+                    status=row['status'],
+                    count=row['count'],
+                )
+                for row in rows.iterator()
+            ],
+            batch_size=batch_size,
+        )
+    return len(created)
@@ -0,0 +1,164 @@
+from collections import Counter
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from tickets.models import Ticket, Comment
+from equipment.models import Equipment
+from .utils import refresh_equipment_health
+from .cache import bump_data_version
+from .rollups import rollup_key, ticket_rollup_key, apply_rollup_deltas, equipment_ticket_deltas
+from .turnaround import turnaround_seconds, apply_turnaround_changes, ticket_turnaround_changes
+
+ROLLUP_EQUIPMENT_FIELDS = ('type', 'school', 'location')
+
+# Signal handlers keeping the precomputed analytics tables in sync
+
+def schedule_health_refresh(*equipment_ids):
+    """
+    Refresh the EquipmentHealth rows once the current transaction commits
+    Equipment deleted in the same transaction is simply skipped
+    """
+    ids = {equipment_id for equipment_id in equipment_ids if equipment_id is not None}
+    if ids:
+        transaction.on_commit(
+            lambda: refresh_equipment_health(Equipment.objects.filter(id__in=ids))
+        )
+
+@receiver(post_save, sender=Ticket)
+def ticket_saved(sender, instance, **kwargs):
+    # A ticket moved to other equipment changes the health of both
+    loaded = getattr(instance, '_loaded_values', {})
+    schedule_health_refresh(instance.equipment_id, loaded.get('equipment_id'))
+
+@receiver(post_delete, sender=Ticket)
+def ticket_deleted(sender, instance, **kwargs):
+    schedule_health_refresh(instance.equipment_id)
+
+@receiver(post_save, sender=Equipment)
+def equipment_saved(sender, instance, created, **kwargs):
+    # Deleted equipment loses its row through the cascade
+    if created:
+        schedule_health_refresh(instance.id)
+
+# Daily rollups and turnaround sketches, updated in the transaction of the write
+
+def equipment_values(equipment_id):
+    return Equipment.objects.filter(id=equipment_id).values(*ROLLUP_EQUIPMENT_FIELDS).first()
+
+def sketch_key(equipment):
+    if isinstance(equipment, dict):
+        return equipment['type'], equipment['school']
+    return equipment.type, equipment.school
+
+@receiver(post_save, sender=Ticket)
+def ticket_statistics_saved(sender, instance, created, **kwargs):
+    deltas = Counter({ticket_rollup_key(instance): 1})
+    turnaround = []
+    if instance.resolved_at:
+        turnaround.append((sketch_key(instance.equipment),
+                           turnaround_seconds(instance.created_at, instance.resolved_at), 1))
+
+    loaded = getattr(instance, '_loaded_values', {})
+    if not created and loaded:
+        if loaded.get('equipment_id', instance.equipment_id) == instance.equipment_id:
+            old_equipment = instance.equipment
+        else:
+            old_equipment = equipment_values(loaded['equipment_id'])
+        if old_equipment is not None:
+            old_created_at = loaded.get('created_at', instance.created_at)
+            deltas[rollup_key(
+                old_created_at, old_equipment,
+                loaded.get('issue_category', instance.issue_category), loaded.get('status', instance.status),
+            )] -= 1
+            old_resolved_at = loaded.get('resolved_at', instance.resolved_at)
+            if old_resolved_at:
+                turnaround.append((sketch_key(old_equipment), turnaround_seconds(old_created_at, old_resolved_at), -1))
+
+    apply_rollup_deltas(deltas)
+    # An unchanged turnaround cancels out
+    if len(turnaround) == 2 and turnaround[0][:2] == turnaround[1][:2]:
+        turnaround = []
+    apply_turnaround_changes(turnaround)
+
+@receiver(post_delete, sender=Ticket)
+def ticket_statistics_deleted(sender, instance, origin=None, **kwargs):
+    # Tickets deleted along with their equipment are subtracted in one go below
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin_model is Equipment:
+        return
+    equipment = equipment_values(instance.equipment_id)
+    if equipment is None:
+        return
+    apply_rollup_deltas({rollup_key(instance.created_at, equipment, instance.issue_category, instance.status): -1})
+    if instance.resolved_at:
+        apply_turnaround_changes([
+            (sketch_key(equipment), turnaround_seconds(instance.created_at, instance.resolved_at), -1)
+        ])
+
+@receiver(pre_delete, sender=Equipment)
+def equipment_statistics_deleted(sender, instance, **kwargs):
+    old_values = {field: getattr(instance, field) for field in ROLLUP_EQUIPMENT_FIELDS}
+    apply_rollup_deltas(equipment_ticket_deltas(instance.id, old_values, None))
+    apply_turnaround_changes(ticket_turnaround_changes(instance.id, old_values, None))
+
+@receiver(post_save, sender=Equipment)
+def equipment_statistics_saved(sender, instance, created, **kwargs):
+    # Moving equipment to another school/location moves its ticket statistics
+    loaded = getattr(instance, '_loaded_values', {})
+    if created or not loaded:
+        return
+    old_values = {field: loaded.get(field, getattr(instance, field)) for field in ROLLUP_EQUIPMENT_FIELDS}
+    new_values = {field: getattr(instance, field) for field in ROLLUP_EQUIPMENT_FIELDS}
+    if old_values != new_values:
+        apply_rollup_deltas(equipment_ticket_deltas(instance.id, old_values, new_values))
+    if sketch_key(old_values) != sketch_key(new_values):
+        apply_turnaround_changes(ticket_turnaround_changes(instance.id, old_values, new_values))
+
+@receiver(post_save, sender=Ticket)
+@receiver(post_delete, sender=Ticket)
+def ticket_changed(sender, instance, **kwargs):
+    bump_data_version('ticket')
+
+@receiver(post_save, sender=Equipment)
+@receiver(post_delete, sender=Equipment)
+def equipment_changed(sender, instance, **kwargs):
+    bump_data_version('equipment')
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    bump_data_version('comment')
+
+# bulk_create skips the hooks above, bulk writers call these instead
+
+def tickets_bulk_written(tickets):
+    # Created tickets, with their equipment loaded
+    apply_rollup_deltas(Counter(ticket_rollup_key(ticket) for ticket in tickets))
+    apply_turnaround_changes([
+        (sketch_key(ticket.equipment), turnaround_seconds(ticket.created_at, ticket.resolved_at), 1)
+        for ticket in tickets if ticket.resolved_at
+    ])
+    bump_data_version('ticket')
+    schedule_health_refresh(*{ticket.equipment_id for ticket in tickets})
+
+def equipment_bulk_written(created_ids=(), old_values=None):
+    """
+    New equipment gets its health row once the write commits, equipment updated
+    in place moves its ticket statistics when type/school/location changed
+    old_values maps the ids of updated equipment to their values before the write
+    """
+    if old_values:
+        deltas = Counter()
+        turnaround = []
+        current = Equipment.objects.filter(id__in=old_values).values('id', *ROLLUP_EQUIPMENT_FIELDS)
+        for new_values in current:
+            equipment_id = new_values.pop('id')
+            if new_values != old_values[equipment_id]:
+                deltas.update(equipment_ticket_deltas(equipment_id, old_values[equipment_id], new_values))
+            if sketch_key(new_values) != sketch_key(old_values[equipment_id]):
+                turnaround.extend(ticket_turnaround_changes(equipment_id, old_values[equipment_id], new_values))
+        apply_rollup_deltas(deltas)
+        apply_turnaround_changes(turnaround)
+    bump_data_version('equipment')
+    schedule_health_refresh(*created_ids)
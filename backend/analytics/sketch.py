@@ -0,0 +1,91 @@
+# Mergeable quantile sketch for turnaround percentiles
+# A DDSketch: values are counted in logarithmic bins, so every quantile is
+# within a fixed relative error of the true value. Unlike a t-digest a value
+# can be removed again exactly, which reopened or deleted tickets need.
+
+import math
+
+class QuantileSketch:
+    """
+    Quantiles of positive values with a relative error of `relative_accuracy`
+    Sketches merge by adding their bins, add/remove are O(1)
+    Values below `min_value` (e.g. sub-second turnarounds) share one zero bin
+    """
+
+    def __init__(self, relative_accuracy=0.01, min_value=1.0, bins=None, zero_count=0, count=0, total=0.0):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.bins = dict(bins or {})
+        self.zero_count = zero_count
+        self.count = count
+        self.total = total
+
+    def _index(self, value):
+        return math.ceil(math.log(value) / self.log_gamma)
+
+    def _value(self, index):
+        # Midpoint of the bin, within relative_accuracy of any value in it
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def add(self, value, weight=1):
+        value = max(value, 0)
+        if value < self.min_value:
+            self.zero_count += weight
+        else:
+            index = self._index(value)
+            self.bins[index] = self.bins.get(index, 0) + weight
+            if self.bins[index] == 0:
+                del self.bins[index]
+        self.count += weight
+        self.total += value * weight
+
+    def remove(self, value):
+        self.add(value, -1)
+
+    def merge(self, other):
+        for index, weight in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + weight
+            if self.bins[index] == 0:
+                del self.bins[index]
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def quantile(self, q):
+        """
+        Estimated q-quantile (0 <= q <= 1), None for an empty sketch
+        """
+        if self.count <= 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                return self._value(index)
+        return self._value(max(self.bins))
+
+    def to_dict(self):
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'min_value': self.min_value,
+            # JSON object keys are strings
+            'bins': {str(index): weight for index, weight in self.bins.items()},
+            'zero_count': self.zero_count,
+            'count': self.count,
+            'total': self.total,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        data['bins'] = {int(index): weight for index, weight in data.get('bins', {}).items()}
+        return cls(**data)
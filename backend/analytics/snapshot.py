@@ -0,0 +1,175 @@
+# Shared analytics snapshot
+# Health scores, predictions and issue patterns are computed once per
+# "as of" time and every analytics endpoint derives its response from them
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from django.utils.functional import cached_property
+from .cache import get_data_version
+from .filters import AnalyticsFilters
+from .rollups import ticket_counts
+from .utils import (
+    equipment_health_features, score_from_ticket_features, health_status, top_issue_categories,
+    predict_maintenance_needs, get_preventive_maintenance_schedule, calculate_maintenance_budget,
+    analyze_issue_patterns,
+)
+from .parallel import parallel_workers, compute_by_school
+
+class locked_property(cached_property):
+    """
+    cached_property computed by one thread at a time: threads reading the
+    part while it's computed wait for that result instead of computing it again
+    """
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        with instance.locks[self.name]:
+            if self.name in instance.__dict__:
+                return instance.__dict__[self.name]
+            return super().__get__(instance, cls)
+
+class AnalyticsSnapshot:
+    """
+    Analytics for all equipment as of a given time
+    Each part is computed on first access and memoized, so the schedule,
+    budget, predictions and health endpoints share one set of queries
+    Snapshots are shared by concurrent requests and dashboard sections,
+    so every part is computed once under its own lock
+    """
+
+    def __init__(self, as_of=None, queryset=None, data_version=None, filters=None):
+        self.as_of = as_of or timezone.now()
+        self.filters = filters or AnalyticsFilters()
+        # District-wide health, predictions and schedules are split by school
+        # over the process pool when ANALYTICS_PARALLEL_WORKERS > 1
+        self.by_school = queryset is None and not self.filters.school and parallel_workers() > 1
+        # Health, predictions and schedules cover the equipment of the selected school/type
+        if queryset is None and self.filters.scopes_equipment:
+            queryset = self.filters.equipment()
+        self.queryset = queryset
+        self.data_version = data_version
+        self.created = time.monotonic()
+        # One lock per part, a part being computed doesn't block the others
+        self.locks = {
+            name: threading.Lock() for name, attribute in vars(type(self)).items()
+            if isinstance(attribute, locked_property)
+        }
+
+    def age(self):
+        return time.monotonic() - self.created
+
+    @locked_property
+    def equipment_features(self):
+        return equipment_health_features(self.queryset, self.as_of)
+
+    @locked_property
+    def health_scores(self):
+        return {
+            equipment['id']: score_from_ticket_features(
+                equipment['total_tickets'], equipment['resolved_tickets'], equipment['last_issue_at'], self.as_of
+            )
+            for equipment in self.equipment_features
+        }
+
+    @locked_property
+    def school_results(self):
+        return compute_by_school(self.filters, self.as_of)
+
+    @locked_property
+    def health_report(self):
+        if self.by_school:
+            return self.school_results['health_report']
+        report = []
+        for equipment in self.equipment_features:
+            health_score = self.health_scores[equipment['id']]
+            report.append({
+                'equipment_id': equipment['id'],
+                'equipment_type': equipment['type'],
+                'location': equipment['location'],
+                'serial_number': equipment['serial_number'],
+                'health_score': round(health_score, 1),
+                'status': health_status(health_score)
+            })
+        return report
+
+    @locked_property
+    def common_issues(self):
+        return top_issue_categories(self.queryset, since=self.as_of - timedelta(days=90), until=self.as_of)
+
+    @locked_property
+    def predictions(self):
+        if self.by_school:
+            return self.school_results['predictions']
+        return predict_maintenance_needs(
+            self.queryset, now=self.as_of, features=self.equipment_features, common_issues=self.common_issues
+        )
+
+    @locked_property
+    def schedule(self):
+        if self.by_school:
+            return self.school_results['schedule']
+        return get_preventive_maintenance_schedule(self.queryset, now=self.as_of, features=self.equipment_features)
+
+    @locked_property
+    def budget(self):
+        return calculate_maintenance_budget(self.predictions)
+
+    @locked_property
+    def issue_patterns(self):
+        return analyze_issue_patterns(now=self.as_of, filters=self.filters)
+
+    @locked_property
+    def failure_patterns(self):
+        # Count number of tickets per equipment type
+        return sorted(
+            (
+                {'equipment__type': row['equipment_type'], 'failure_count': row['total']}
+                for row in ticket_counts('equipment_type', filters=self.filters)
+            ),
+            key=lambda row: -row['failure_count'],
+        )
+
+    @locked_property
+    def school_issues(self):
+        return sorted(
+            (
+                {'equipment__school': row['school'], 'issue_count': row['total']}
+                for row in ticket_counts('school', filters=self.filters)
+            ),
+            key=lambda row: -row['issue_count'],
+        )
+
+# Snapshots are shared per filter combination, the least recently used are dropped
+MAX_SNAPSHOTS = 32
+_snapshots = OrderedDict()
+_snapshots_lock = threading.Lock()
+
+def get_snapshot(filters=None, version=None):
+    """
+    Get the shared snapshot for the filters, reused across requests for
+    ANALYTICS_SNAPSHOT_TTL seconds as long as no ticket/equipment/comment
+    was written in between
+    Pass the data version already read by the request to save a query
+    """
+    filters = filters or AnalyticsFilters()
+    ttl = getattr(settings, 'ANALYTICS_SNAPSHOT_TTL', 60)
+    if version is None:
+        version = get_data_version()
+    with _snapshots_lock:
+        snapshot = _snapshots.get(filters.key)
+        if snapshot is None or snapshot.data_version != version or snapshot.age() >= ttl:
+            snapshot = AnalyticsSnapshot(data_version=version, filters=filters)
+            _snapshots[filters.key] = snapshot
+        _snapshots.move_to_end(filters.key)
+        while len(_snapshots) > MAX_SNAPSHOTS:
+            _snapshots.popitem(last=False)
+        return snapshot
+
+def clear_snapshots():
+    with _snapshots_lock:
+        _snapshots.clear()
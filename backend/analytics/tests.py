@@ -0,0 +1,635 @@
+import io
+import threading
+import time
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.test import APIClient
+from equipment.models import Equipment
+from tickets.models import Ticket
+from users.models import User
+from users.authentication import user_cache
+from users.serializers import ClaimsTokenObtainPairSerializer
+from silsp.metrics import registry
+from silsp.seeding import school_name, seed_dataset, technician_username
+from .cache import get_cache
+from .dashboard_views import DEFAULT_SECTIONS
+from .filters import AnalyticsFilters
+from .jobs import claim_job, enqueue_job, recover_lost_jobs, run_job
+from .models import AnalyticsJob, DailyTicketRollup, DataVersion, EquipmentHealth
+from .parallel import SHARDED_PARTS, compute_school, merge_school_results
+from .rollups import rebuild_rollups, ticket_counts
+from .sketch import QuantileSketch
+from .snapshot import AnalyticsSnapshot, clear_snapshots, get_snapshot
+from .utils import (
+    analyze_issue_patterns, calculate_equipment_health_score, calculate_health_scores, calculate_maintenance_budget,
+    equipment_health_features, equipment_ticket_features, predict_maintenance_needs,
+)
+
+class DailyTicketRollupTests(TestCase):
+    """
+    Incremental rollup updates must match a rebuild from the tickets
+    """
+
+    def assertRollupsConsistent(self):
+        def counts():
+            return {
+                (row.date, row.equipment_type, row.school, row.location, row.issue_category, row.status): row.count
+                for row in DailyTicketRollup.objects.exclude(count=0)
+            }
+        incremental = counts()
+        rebuild_rollups()
+        self.assertEqual(incremental, counts())
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='tech', password='pw', role='technician')
+        self.pc = Equipment.objects.create(type='pc', serial_number='PC1', location='Lab', school='North')
+        self.printer = Equipment.objects.create(type='printer', serial_number='PR1', location='Office', school='South')
+
+    def test_ticket_writes(self):
+        ticket = Ticket.objects.create(equipment=self.pc, created_by=self.user, issue_category='Power', description='')
+        Ticket.objects.create(equipment=self.pc, created_by=self.user, issue_category='Network', description='')
+        self.assertRollupsConsistent()
+
+        ticket.status = 'resolved'
+        ticket.save()
+        self.assertRollupsConsistent()
+
+        ticket.equipment = self.printer
+        ticket.save()
+        self.assertRollupsConsistent()
+
+        ticket.delete()
+        self.assertRollupsConsistent()
+
+    def test_equipment_writes(self):
+        Ticket.objects.create(equipment=self.pc, created_by=self.user, issue_category='Power', description='')
+        Ticket.objects.create(equipment=self.printer, created_by=self.user, issue_category='Paper', description='')
+
+        self.pc.school = 'South'
+        self.pc.save()
+        self.assertRollupsConsistent()
+
+        self.printer.delete()
+        self.assertRollupsConsistent()
+
+class RollupWindowTests(TestCase):
+    """
+    Counts over a window (whole days from the rollups, partial days from the
+    tickets) must equal counting the tickets created in it
+    """
+
+    def setUp(self):
+        user = User.objects.create_user(username='tech', password='pw', role='technician')
+        pc = Equipment.objects.create(type='pc', serial_number='PC1', location='Lab', school='North')
+        # One ticket every 5 hours from Dec 27th to Jan 4th
+        start = timezone.make_aware(datetime(2025, 12, 27, 1, 30))
+        for i in range(40):
+            ticket = Ticket.objects.create(equipment=pc, created_by=user, issue_category='Power', description='Dead')
+            Ticket.objects.filter(pk=ticket.pk).update(created_at=start + timedelta(hours=5 * i))
+        rebuild_rollups()
+
+    def raw_count(self, since, until):
+        return Ticket.objects.filter(created_at__range=(since, until)).count()
+
+    def test_year_boundary(self):
+        since = timezone.make_aware(datetime(2025, 12, 29))
+        until = timezone.make_aware(datetime(2026, 1, 2, 23, 59, 59, 999999))
+        filters = AnalyticsFilters(since=since, until=until)
+        trends = analyze_issue_patterns(filters=filters)['trends']
+        new_year = timezone.make_aware(datetime(2026, 1, 1))
+        self.assertEqual(trends, [
+            {'period': date(2025, 12, 1), 'issue_count': self.raw_count(since, new_year - timedelta(microseconds=1))},
+            {'period': date(2026, 1, 1), 'issue_count': self.raw_count(new_year, until)},
+        ])
+        self.assertEqual(sum(row['issue_count'] for row in trends), self.raw_count(since, until))
+
+    def test_partial_days(self):
+        since = timezone.make_aware(datetime(2025, 12, 28, 13, 15))
+        until = timezone.make_aware(datetime(2026, 1, 3, 9, 45))
+        filters = AnalyticsFilters(since=since, until=until, granularity='day')
+        [row] = ticket_counts(filters=filters)
+        self.assertEqual(row['total'], self.raw_count(since, until))
+        trends = analyze_issue_patterns(filters=filters)['trends']
+        self.assertEqual(sum(row['issue_count'] for row in trends), self.raw_count(since, until))
+        self.assertEqual(trends[0]['period'], date(2025, 12, 28))
+        self.assertEqual(trends[-1]['period'], date(2026, 1, 3))
+
+        # Within a single day, no whole day is read from the rollups
+        since = timezone.make_aware(datetime(2025, 12, 30, 2))
+        until = timezone.make_aware(datetime(2025, 12, 30, 20))
+        [row] = ticket_counts(filters=AnalyticsFilters(since=since, until=until))
+        self.assertEqual(row['total'], self.raw_count(since, until))
+
+class QuantileSketchTests(TestCase):
+
+    def test_relative_accuracy(self):
+        values = [float(value) for value in range(1, 10001)]
+        sketch = QuantileSketch(relative_accuracy=0.01)
+        for value in values:
+            sketch.add(value)
+        for q in (0.5, 0.9, 0.99):
+            exact = values[int(q * (len(values) - 1))]
+            self.assertLessEqual(abs(sketch.quantile(q) - exact) / exact, 0.01)
+
+    def test_merge_and_remove(self):
+        left, right = QuantileSketch(), QuantileSketch()
+        for value in (10, 20, 30):
+            left.add(value)
+        for value in (40, 50):
+            right.add(value)
+        left.merge(right)
+        left.remove(50)
+        left.remove(40)
+        self.assertEqual(left.count, 3)
+        self.assertEqual(left.to_dict(), QuantileSketch.from_dict(left.to_dict()).to_dict())
+        self.assertAlmostEqual(left.quantile(1), 30, delta=0.3)
+
+class ParallelAnalyticsTests(TestCase):
+    """
+    Per-school results merged together must equal the district-wide computation
+    """
+
+    def test_merge_matches_serial(self):
+        seed_dataset(300, schools=3, students_per_school=1, days=120)
+        as_of = timezone.now()
+        serial = AnalyticsSnapshot(as_of=as_of)
+        expected = {part: getattr(serial, part) for part in SHARDED_PARTS}
+        self.assertTrue(expected['predictions'])
+
+        schools = Equipment.objects.order_by('school').values_list('school', flat=True).distinct()
+        params = AnalyticsFilters().to_params()
+        # Workers close their connection after each task, the test transaction must stay open
+        with patch('analytics.parallel.connections'):
+            results = [compute_school(school, params, as_of) for school in reversed(schools)]
+        self.assertEqual(merge_school_results(results), expected)
+
+class HealthScoreTests(TestCase):
+    """
+    Scores and ticket features pinned to the values of the original
+    per-equipment formula on a small fixture
+    """
+
+    def setUp(self):
+        self.now = timezone.make_aware(datetime(2026, 6, 1, 12, 0))
+        user = User.objects.create_user(username='tech', password='pw', role='technician')
+
+        def equipment(kind, serial, *tickets):
+            item = Equipment.objects.create(type=kind, serial_number=serial, location='Lab', school='North')
+            for days_ago, resolved_after in tickets:
+                ticket = Ticket.objects.create(equipment=item, created_by=user, issue_category='Power',
+                                               description='No power')
+                created_at = self.now - timedelta(days=days_ago)
+                Ticket.objects.filter(pk=ticket.pk).update(
+                    created_at=created_at,
+                    status='resolved' if resolved_after is not None else 'open',
+                    resolved_at=created_at + resolved_after if resolved_after is not None else None,
+                )
+            return item
+
+        # Ticket 200 days ago is outside the 6 month window
+        self.pc = equipment('pc', 'PC1', (3, None), (10, timedelta(days=2)), (40, timedelta(hours=36)),
+                            (200, timedelta(days=1)))
+        self.printer = equipment('printer', 'PR1', (100, timedelta(hours=5)))
+        self.projector = equipment('projector', 'PJ1', *[(days_ago, None) for days_ago in range(1, 6)])
+        self.router = equipment('router', 'RT1', (15, None), (100, None), (120, None))
+        self.ups = equipment('ups', 'UPS1')
+
+    def test_scores(self):
+        expected = {
+            # 100 - 3 tickets * 15 + 2/3 resolved * 20 - 10 (last issue 3 days ago)
+            self.pc.id: 100 - 45 + 40 / 3 - 10,
+            # 100 - 15 + 20 + 15 (last issue 100 days ago), capped at 100
+            self.printer.id: 100,
+            # Penalty capped at 60, nothing resolved, last issue yesterday
+            self.projector.id: 30,
+            # 100 - 45 + 0 + 0 (last issue 15 days ago)
+            self.router.id: 55,
+            self.ups.id: 100,
+        }
+        scores = calculate_health_scores(now=self.now)
+        self.assertEqual(scores.keys(), expected.keys())
+        for equipment_id, score in expected.items():
+            self.assertAlmostEqual(scores[equipment_id], score)
+        with patch('analytics.utils.timezone.now', return_value=self.now):
+            self.assertAlmostEqual(calculate_equipment_health_score(self.pc.id), expected[self.pc.id])
+
+    def test_features(self):
+        features = {
+            row['id']: row for row in equipment_ticket_features(now=self.now).values(
+                'id', 'total_tickets', 'resolved_tickets', 'last_issue_at', 'recent_tickets', 'avg_resolution'
+            )
+        }
+        pc = features[self.pc.id]
+        self.assertEqual((pc['total_tickets'], pc['resolved_tickets'], pc['recent_tickets']), (3, 2, 3))
+        self.assertEqual(pc['last_issue_at'], self.now - timedelta(days=3))
+        self.assertEqual(pc['avg_resolution'], timedelta(hours=42))
+        printer = features[self.printer.id]
+        self.assertEqual((printer['total_tickets'], printer['resolved_tickets'], printer['recent_tickets']), (1, 1, 0))
+        # Resolved before the 90 day window
+        self.assertIsNone(printer['avg_resolution'])
+        router = features[self.router.id]
+        self.assertEqual((router['total_tickets'], router['recent_tickets']), (3, 1))
+        ups = features[self.ups.id]
+        self.assertEqual((ups['total_tickets'], ups['last_issue_at'], ups['avg_resolution']), (0, None, None))
+
+    def test_predictions_and_budget(self):
+        features = list(equipment_ticket_features(now=self.now).values(
+            'id', 'type', 'location', 'total_tickets', 'resolved_tickets', 'last_issue_at', 'recent_tickets',
+            'avg_resolution',
+        ))
+        predictions = predict_maintenance_needs(now=self.now, features=features)
+        self.assertEqual(
+            [(row['equipment_id'], row['urgency'], row['estimated_cost'], row['recent_tickets'], row['health_score'])
+             for row in predictions],
+            [
+                # 3 issues in the last 90 days
+                (self.pc.id, 'medium', 200, 3, 58.3),
+                (self.projector.id, 'medium', 200, 5, 30),
+                # Health below 60
+                (self.router.id, 'low', 100, 1, 55),
+            ],
+        )
+        # Resolved after 48h and 36h: 1.75 days, whole days per ticket gave (2 + 1) / 2 = 1.5
+        self.assertEqual(predictions[0]['avg_resolution_time'], 1.8)
+        self.assertEqual(predictions[0]['common_issues'], [{'issue_category': 'Power', 'count': 3}])
+        self.assertEqual(predictions[2]['avg_resolution_time'], 0)
+
+        budget = calculate_maintenance_budget(predictions)
+        self.assertEqual(
+            {name: value for name, value in budget.items() if name != 'recommendations'},
+            {
+                'total_estimated_cost': 500, 'high_urgency_cost': 0, 'medium_urgency_cost': 400,
+                'low_urgency_cost': 100, 'equipment_count': 3,
+            },
+        )
+
+class SnapshotTests(TestCase):
+
+    def test_parts_computed_once_across_threads(self):
+        snapshot = AnalyticsSnapshot()
+        started = threading.Barrier(4)
+
+        def slow_patterns(**kwargs):
+            time.sleep(0.05)
+            return {'trends': []}
+
+        def read():
+            started.wait()
+            results.append(snapshot.issue_patterns)
+
+        results = []
+        with patch('analytics.snapshot.analyze_issue_patterns', side_effect=slow_patterns) as compute:
+            threads = [threading.Thread(target=read) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(compute.call_count, 1)
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(result is results[0] for result in results))
+
+class EquipmentHealthTests(TestCase):
+    """
+    EquipmentHealth rows are refreshed by writes only; reads compute the
+    features of stale rows without writing
+    """
+    FEATURES = ('total_tickets', 'resolved_tickets', 'last_issue_at', 'recent_tickets', 'avg_resolution')
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='tech', password='pw', role='technician')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pc = Equipment.objects.create(type='pc', serial_number='PC1', location='Lab', school='North')
+
+    def expected_features(self, now):
+        return [
+            {name: row[name] for name in ('id',) + self.FEATURES}
+            for row in equipment_ticket_features(now=now).order_by('id').values('id', *self.FEATURES)
+        ]
+
+    def features(self, now):
+        return [{name: row[name] for name in ('id',) + self.FEATURES} for row in equipment_health_features(now=now)]
+
+    def test_refreshed_on_commit(self):
+        self.assertEqual(EquipmentHealth.objects.get(equipment=self.pc).tickets_180d, 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            ticket = Ticket.objects.create(equipment=self.pc, created_by=self.user, issue_category='Power',
+                                           description='No power')
+        health = EquipmentHealth.objects.get(equipment=self.pc)
+        self.assertEqual((health.tickets_180d, health.resolved_180d, health.tickets_90d), (1, 0, 1))
+        self.assertEqual(health.expires_at, ticket.created_at + timedelta(days=90))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ticket.status = 'resolved'
+            ticket.save()
+        self.assertEqual(EquipmentHealth.objects.get(equipment=self.pc).resolved_180d, 1)
+
+    def test_stale_rows_computed_without_writing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Ticket.objects.create(equipment=self.pc, created_by=self.user, issue_category='Power',
+                                  description='No power')
+        # Created without signals: no row at all
+        Equipment.objects.bulk_create([Equipment(type='ups', serial_number='UPS1', location='Lab', school='North')])
+        now = timezone.now() + timedelta(days=100)
+
+        with CaptureQueriesContext(connection) as queries:
+            features = self.features(now)
+        self.assertFalse([query['sql'] for query in queries if not query['sql'].startswith('SELECT')])
+        self.assertEqual(features, self.expected_features(now))
+        self.assertEqual(features[0]['recent_tickets'], 0)
+        self.assertEqual(EquipmentHealth.objects.get(equipment=self.pc).tickets_90d, 1)
+
+        EquipmentHealth.objects.filter(equipment=self.pc).update(
+            tickets_180d=99, expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        call_command('rebuild_equipment_health', '--stale', stdout=io.StringIO())
+        self.assertEqual(EquipmentHealth.objects.count(), 2)
+        self.assertEqual(EquipmentHealth.objects.get(equipment=self.pc).tickets_180d, 1)
+        now = timezone.now()
+        expected = self.expected_features(now)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.features(now), expected)
+        # Fresh rows: nothing computed from the tickets
+        self.assertEqual(len(queries), 1)
+
+class ConditionalGetTests(TestCase):
+    """
+    Polled endpoints answer 304 until a write changes their data version
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='tech', password='pw', role='technician'))
+        Equipment.objects.create(type='pc', serial_number='PC1', location='Lab', school='North')
+
+    def test_etag(self):
+        response = self.client.get('/api/equipment/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        response = self.client.get('/api/equipment/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        Equipment.objects.create(type='ups', serial_number='UPS1', location='Lab', school='North')
+        response = self.client.get('/api/equipment/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 2)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_if_modified_since(self):
+        written = timezone.now() - timedelta(minutes=5)
+        DataVersion.objects.filter(name='equipment').update(updated_at=written)
+        response = self.client.get('/api/equipment/')
+        last_modified = response['Last-Modified']
+        self.assertEqual(last_modified, http_date(written.timestamp() + 1))
+        self.assertEqual(self.client.get('/api/equipment/', HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        # Written less than a second ago: no Last-Modified, If-Modified-Since is ignored
+        Equipment.objects.create(type='ups', serial_number='UPS1', location='Lab', school='North')
+        response = self.client.get('/api/equipment/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+
+class ResponseCacheTests(TestCase):
+    """
+    Cached responses are served until a tracked write bumps the data version,
+    which every request reads once
+    """
+
+    def setUp(self):
+        get_cache().clear()
+        clear_snapshots()
+        self.user = User.objects.create_user(username='tech', password='pw', role='technician')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.pc = Equipment.objects.create(type='pc', serial_number='PC1', location='Lab', school='North')
+        self.create_ticket('Power')
+
+    def create_ticket(self, category):
+        return Ticket.objects.create(equipment=self.pc, created_by=self.user, issue_category=category,
+                                     description='Broken')
+
+    def lookups(self, result):
+        return registry.counters.get(('silsp_analytics_cache_total', (('result', result),)), 0)
+
+    def test_hit_and_miss(self):
+        hits, misses = self.lookups('hit'), self.lookups('miss')
+        response = self.client.get('/api/reports/frequent-issues/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/reports/frequent-issues/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.data, [{'issue_category': 'Power', 'count': 1}])
+        # Only the data version is read
+        self.assertEqual(len(queries), 1)
+        self.assertEqual((self.lookups('hit') - hits, self.lookups('miss') - misses), (1, 1))
+
+        # Another query string is another entry
+        self.assertEqual(self.client.get('/api/reports/frequent-issues/?school=North')['X-Cache'], 'MISS')
+
+    def test_invalidated_by_writes(self):
+        self.client.get('/api/reports/frequent-issues/')
+        self.create_ticket('Network')
+        response = self.client.get('/api/reports/frequent-issues/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.data), 2)
+
+        self.client.get('/api/reports/equipment-status/')
+        self.pc.is_working = False
+        self.pc.save()
+        response = self.client.get('/api/reports/equipment-status/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data, [{'is_working': False, 'count': 1}])
+
+    def test_data_version_read_once(self):
+        for expected in ('MISS', 'HIT'):
+            with self.subTest(cache=expected), CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/analytics/maintenance-budget/')
+            self.assertEqual(response['X-Cache'], expected)
+            reads = [query for query in queries if DataVersion._meta.db_table in query['sql']]
+            self.assertEqual(len(reads), 1)
+
+    def test_exposed_as_metrics(self):
+        self.client.get('/api/reports/frequent-issues/')
+        self.client.get('/api/reports/frequent-issues/')
+        with override_settings(METRICS_TOKEN='secret'):
+            lines = APIClient().get('/api/_metrics', HTTP_AUTHORIZATION='Bearer secret').content.decode().splitlines()
+        self.assertIn('# TYPE silsp_analytics_cache_total counter', lines)
+        self.assertIn(f'silsp_analytics_cache_total{{result="hit"}} {self.lookups("hit")}', lines)
+        self.assertIn(f'silsp_analytics_cache_total{{result="miss"}} {self.lookups("miss")}', lines)
+
+class AnalyticsJobTests(TestCase):
+    """
+    ?async=1 requests queue a job that exactly one worker runs, its result
+    is then served by the job endpoint
+    """
+
+    def setUp(self):
+        get_cache().clear()
+        clear_snapshots()
+        self.user = User.objects.create_user(username='tech', password='pw', role='technician')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        pc = Equipment.objects.create(type='pc', serial_number='PC1', location='Lab', school='North')
+        Ticket.objects.create(equipment=pc, created_by=self.user, issue_category='Power', description='No power')
+
+    def test_async_request_enqueues(self):
+        response = self.client.get('/api/analytics/maintenance-budget/?async=1&school=North')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'queued')
+        job = AnalyticsJob.objects.get(id=response.data['job_id'])
+        self.assertEqual((job.kind, job.params, job.created_by), ('budget', {'school': 'North'}, self.user))
+
+        # The same request shares the queued job
+        again = self.client.get('/api/analytics/maintenance-budget/?async=1&school=North')
+        self.assertEqual(again.data['job_id'], response.data['job_id'])
+        self.assertEqual(AnalyticsJob.objects.count(), 1)
+
+        # Invalid filters are rejected before queuing
+        response = self.client.get('/api/analytics/maintenance-budget/?async=1&granularity=year')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(AnalyticsJob.objects.count(), 1)
+
+    def test_concurrent_claims(self):
+        first = enqueue_job('budget', {})
+        second = enqueue_job('schedule', {})
+        AnalyticsJob.objects.filter(id=first.id).update(created_at=second.created_at - timedelta(seconds=1))
+        claimed = {}
+        update = QuerySet.update
+
+        def racing_update(queryset, **kwargs):
+            # Worker B claims the job worker A selected before A's UPDATE runs
+            if 'worker-b' not in claimed:
+                claimed['worker-b'] = None
+                claimed['worker-b'] = claim_job('worker-b')
+            return update(queryset, **kwargs)
+
+        with patch.object(QuerySet, 'update', racing_update):
+            claimed['worker-a'] = claim_job('worker-a')
+        # A's conditional UPDATE matched nothing, so it moved on to the next job
+        self.assertEqual((claimed['worker-b'].id, claimed['worker-a'].id), (first.id, second.id))
+        self.assertEqual(
+            dict(AnalyticsJob.objects.values_list('worker', 'attempts')), {'worker-a': 1, 'worker-b': 1}
+        )
+        self.assertIsNone(claim_job('worker-c'))
+
+    def test_result_stored(self):
+        job_id = self.client.get('/api/analytics/maintenance-budget/?async=1').data['job_id']
+        job = run_job(claim_job('worker'))
+        self.assertEqual(job.status, 'done')
+
+        response = self.client.get(f'/api/analytics/jobs/{job_id}/')
+        self.assertEqual(response.data['status'], 'done')
+        self.assertEqual(response.data['result'], self.client.get('/api/analytics/maintenance-budget/').json())
+
+        # A finished job on the current data is reused
+        self.assertEqual(self.client.get('/api/analytics/maintenance-budget/?async=1').data['job_id'], job_id)
+
+    def test_failed_job(self):
+        job_id = self.client.get('/api/analytics/maintenance-budget/?async=1').data['job_id']
+        with patch('analytics.jobs.get_snapshot', side_effect=RuntimeError('boom')), self.assertLogs('analytics.jobs'):
+            job = run_job(claim_job('worker'))
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('RuntimeError: boom', job.error)
+        response = self.client.get(f'/api/analytics/jobs/{job_id}/')
+        self.assertEqual(response.data['status'], 'failed')
+        self.assertNotIn('boom', response.data['error'])
+
+    @override_settings(ANALYTICS_JOB_TIMEOUT=60)
+    def test_recover_stale_running_jobs(self):
+        stale = timezone.now() - timedelta(seconds=61)
+        retried = enqueue_job('budget', {})
+        given_up = enqueue_job('schedule', {})
+        running = enqueue_job('predictions', {})
+        AnalyticsJob.objects.filter(id=retried.id).update(status='running', started_at=stale, attempts=1,
+                                                          worker='lost')
+        AnalyticsJob.objects.filter(id=given_up.id).update(status='running', started_at=stale, attempts=3,
+                                                           worker='lost')
+        AnalyticsJob.objects.filter(id=running.id).update(status='running', started_at=timezone.now(), attempts=1,
+                                                          worker='alive')
+
+        self.assertEqual(recover_lost_jobs(), (1, 1))
+        statuses = dict(AnalyticsJob.objects.values_list('id', 'status'))
+        self.assertEqual(
+            [statuses[retried.id], statuses[given_up.id], statuses[running.id]], ['queued', 'failed', 'running']
+        )
+        self.assertEqual(AnalyticsJob.objects.get(id=given_up.id).error, 'Worker lost')
+
+        # The requeued job is claimed again
+        job = claim_job('worker')
+        self.assertEqual((job.id, job.attempts), (retried.id, 2))
+
+class DashboardTests(TransactionTestCase):
+    """
+    The dashboard returns the selected sections as their own endpoints do,
+    from one snapshot per request
+    Sections are computed on connections of their own, so the data is committed
+    """
+    ENDPOINTS = {
+        'failure_patterns': '/api/analytics/equipment-failure-patterns/',
+        'school_issues': '/api/analytics/school-issues/',
+        'issue_patterns': '/api/analytics/issue-patterns/',
+        'maintenance_schedule': '/api/analytics/maintenance-schedule/',
+        'equipment_health': '/api/analytics/equipment-health/',
+        'preventive_maintenance': '/api/analytics/preventive-maintenance/',
+        'maintenance_budget': '/api/analytics/maintenance-budget/',
+        'frequent_issues': '/api/reports/frequent-issues/',
+        'turnaround_time': '/api/reports/turnaround-time/',
+        'equipment_status': '/api/reports/equipment-status/',
+    }
+
+    def setUp(self):
+        get_cache().clear()
+        clear_snapshots()
+        user_cache.clear()
+        seed_dataset(60, schools=2, students_per_school=1, days=120)
+        self.user = User.objects.get(username=technician_username(0))
+        self.token = str(ClaimsTokenObtainPairSerializer.get_token(self.user).access_token)
+
+    def dashboard(self, query=''):
+        return self.client.get(f'/api/dashboard/{query}', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_default_sections(self):
+        response = self.dashboard()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.json()), list(DEFAULT_SECTIONS))
+
+    def test_matches_endpoints(self):
+        query = f'?school={school_name(0)}&sections=' + ','.join(self.ENDPOINTS)
+        data = self.dashboard(query).json()
+        self.assertNotIn('errors', data)
+        self.assertEqual(list(data), list(self.ENDPOINTS))
+        for name, url in self.ENDPOINTS.items():
+            with self.subTest(section=name):
+                response = self.client.get(f'{url}?school={school_name(0)}', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+                self.assertEqual(data[name], response.json())
+
+    def test_one_snapshot_per_request(self):
+        with patch('analytics.dashboard_views.get_snapshot', wraps=get_snapshot) as snapshot:
+            self.assertEqual(self.dashboard('?sections=failure_patterns,school_issues,maintenance_budget').status_code,
+                             200)
+        self.assertEqual(snapshot.call_count, 1)
+        with patch('analytics.dashboard_views.get_snapshot', wraps=get_snapshot) as snapshot:
+            self.assertEqual(list(self.dashboard('?sections=frequent_issues').json()), ['frequent_issues'])
+        snapshot.assert_not_called()
+
+    def test_invalid_sections(self):
+        response = self.dashboard('?sections=frequent_issues,budget')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('budget', response.json()['sections'])
+        self.assertEqual(self.dashboard('?granularity=year').status_code, 400)
+
+    def test_requires_token(self):
+        self.assertEqual(self.client.get('/api/dashboard/').status_code, 401)
+        response = self.client.get('/api/dashboard/', HTTP_AUTHORIZATION='Bearer invalid')
+        self.assertEqual(response.status_code, 401)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.dashboard().status_code, 401)
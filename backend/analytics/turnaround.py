@@ -0,0 +1,101 @@
+# Ticket turnaround (creation to resolution) percentiles
+# Each equipment type/school keeps a mergeable quantile sketch of the
+# turnaround of its resolved tickets, so p50/p90/p99 are served by merging a
+# few sketches instead of sorting every resolved ticket
+
+from collections import defaultdict
+from datetime import timedelta
+from django.db import transaction
+from tickets.models import Ticket
+from .models import TurnaroundSketch
+from .sketch import QuantileSketch
+
+PERCENTILES = {'p50': 0.5, 'p90': 0.9, 'p99': 0.99}
+
+def turnaround_seconds(created_at, resolved_at):
+    return max((resolved_at - created_at).total_seconds(), 0)
+
+def apply_turnaround_changes(changes):
+    """
+    Apply ((equipment_type, school), turnaround seconds, +1/-1) changes to the sketches
+    """
+    grouped = defaultdict(list)
+    for key, seconds, weight in changes:
+        grouped[key].append((seconds, weight))
+    if not grouped:
+        return
+    with transaction.atomic():
+        rows = {
+            (row.equipment_type, row.school): row
+            for row in TurnaroundSketch.objects.select_for_update().filter(
+                equipment_type__in={key[0] for key in grouped}, school__in={key[1] for key in grouped}
+            )
+        }
+        for key, values in grouped.items():
+            row = rows.get(key) or TurnaroundSketch(equipment_type=key[0], school=key[1])
+            sketch = QuantileSketch.from_dict(row.sketch) if row.sketch else QuantileSketch()
+            for seconds, weight in values:
+                sketch.add(seconds, weight)
+            row.sketch = sketch.to_dict()
+            row.save()
+
+def ticket_turnaround_changes(equipment_id, old_values, new_values):
+    """
+    Changes moving the resolved tickets of one equipment from its old
+    type/school to the new ones (new_values None when it's deleted)
+    """
+    changes = []
+    resolved = Ticket.objects.filter(equipment_id=equipment_id, resolved_at__isnull=False)
+    for created_at, resolved_at in resolved.values_list('created_at', 'resolved_at').iterator():
+        seconds = turnaround_seconds(created_at, resolved_at)
+        changes.append(((old_values['type'], old_values['school']), seconds, -1))
+        if new_values is not None:
+            changes.append(((new_values['type'], new_values['school']), seconds, 1))
+    return changes
+
+def turnaround_summary(filters):
+    """
+    Count, mean and percentiles of the turnaround of resolved tickets
+    Without a time window the stored sketches of the selected school/type are
+    merged; a window is sketched on the fly from the tickets it covers
+    """
+    merged = QuantileSketch()
+    if filters.since is None and filters.until is None:
+        sketches = TurnaroundSketch.objects.all()
+        if filters.school:
+            sketches = sketches.filter(school=filters.school)
+        if filters.equipment_type:
+            sketches = sketches.filter(equipment_type=filters.equipment_type)
+        for data in sketches.values_list('sketch', flat=True):
+            merged.merge(QuantileSketch.from_dict(data))
+    else:
+        resolved = filters.tickets(Ticket.objects.filter(resolved_at__isnull=False))
+        for created_at, resolved_at in resolved.values_list('created_at', 'resolved_at').iterator():
+            merged.add(turnaround_seconds(created_at, resolved_at))
+
+    def duration(seconds):
+        return timedelta(seconds=round(seconds)) if seconds is not None else None
+
+    return {
+        'average_turnaround_time': duration(merged.mean),
+        'resolved_tickets': merged.count,
+        'percentiles': {name: duration(merged.quantile(q)) for name, q in PERCENTILES.items()},
+    }
+
+def rebuild_turnaround_sketches():
+    """
+    Recompute every sketch from the resolved tickets
+    """
+    sketches = defaultdict(QuantileSketch)
+    resolved = Ticket.objects.filter(resolved_at__isnull=False).values_list(
+        'equipment__type', 'equipment__school', 'created_at', 'resolved_at'
+    )
+    for equipment_type, school, created_at, resolved_at in resolved.iterator():
+        sketches[(equipment_type, school)].add(turnaround_seconds(created_at, resolved_at))
+    with transaction.atomic():
+        TurnaroundSketch.objects.all().delete()
+        TurnaroundSketch.objects.bulk_create([
+            TurnaroundSketch(equipment_type=equipment_type, school=school, sketch=sketch.to_dict())
+            for (equipment_type, school), sketch in sketches.items()
+        ])
+    return len(sketches)
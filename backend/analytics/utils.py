@@ -1,102 +1,280 @@
 # Analytics utility functions for data analysis and ML predictions
 # This file will contain the core AI/ML logic for maintenance insights 
 
-from django.db.models import Count, Avg, Q, F, ExpressionWrapper, fields
+from django.db.models import Count, Avg, Max, Min, Q, F, ExpressionWrapper, fields
 from django.utils import timezone
 from datetime import timedelta
+from collections import defaultdict
 from tickets.models import Ticket
 from equipment.models import Equipment
+from .models import EquipmentHealth
+from .filters import AnalyticsFilters
+from .rollups import ticket_counts
+
+def score_from_ticket_features(total_tickets, resolved_tickets, last_issue_at, now=None):
+    """
+    Apply the health scoring formula to pre-computed ticket features
+    (counts over the last 6 months and the time of the most recent ticket)
+    Returns a score from 0-100 (100 = excellent health)
+    """
+    if now is None:
+        now = timezone.now()
+
+    # Calculate health score based on:
+    # 1. Number of issues (fewer is better)
+    # 2. Resolution rate (higher is better)
+    # 3. Time since last issue (longer is better)
+
+    if total_tickets == 0:
+        return 100  # No issues = perfect health
+
+    resolution_rate = (resolved_tickets / total_tickets) * 100 if total_tickets > 0 else 0
+
+    # Penalty for number of issues (more sensitive to recent activity)
+    issue_penalty = min(total_tickets * 15, 60)  # Increased penalty for recent issues
+
+    # Bonus for resolution rate
+    resolution_bonus = resolution_rate * 0.2  # Reduced bonus to make recent issues more impactful
+
+    # Time since last issue bonus (more sensitive to recent activity)
+    if last_issue_at:
+        days_since_issue = (now - last_issue_at).days
+        # More aggressive time penalty for very recent issues
+        if days_since_issue <= 7:
+            time_bonus = -10  # Penalty for very recent issues
+        elif days_since_issue <= 30:
+            time_bonus = 0    # No bonus for recent issues
+        else:
+            time_bonus = min((days_since_issue - 30) * 0.3, 15)  # Gradual bonus for older issues
+    else:
+        time_bonus = 15
+
+    health_score = 100 - issue_penalty + resolution_bonus + time_bonus
+    return max(0, min(100, health_score))
+
+def equipment_ticket_features(queryset=None, now=None):
+    """
+    Annotate equipment with the ticket features used by the health score
+    (last 6 months) and the maintenance predictions (last 90 days)
+    All features are computed in one grouped aggregate query
+    """
+    if queryset is None:
+        queryset = Equipment.objects.all()
+    if now is None:
+        now = timezone.now()
+
+    six_months_ago = now - timedelta(days=180)
+    three_months_ago = now - timedelta(days=90)
+    in_window = Q(ticket__created_at__gte=six_months_ago)
+    recent = Q(ticket__created_at__gte=three_months_ago)
+    resolved = Q(ticket__status='resolved')
+    # Time from creation to the last move to resolved, later edits don't count
+    resolution_time = ExpressionWrapper(
+        F('ticket__resolved_at') - F('ticket__created_at'),
+        output_field=fields.DurationField()
+    )
+    return queryset.order_by().annotate(
+        total_tickets=Count('ticket', filter=in_window),
+        resolved_tickets=Count('ticket', filter=in_window & resolved),
+        last_issue_at=Max('ticket__created_at', filter=in_window),
+        recent_tickets=Count('ticket', filter=recent),
+        avg_resolution=Avg(resolution_time, filter=recent & resolved),
+    )
+
+def calculate_health_scores(queryset=None, now=None):
+    """
+    Calculate health scores for every equipment in the queryset at once
+    Ticket features are computed with a single grouped aggregate query
+    Returns a dict of {equipment_id: score}
+    """
+    if now is None:
+        now = timezone.now()
+
+    rows = equipment_ticket_features(queryset, now).values_list(
+        'id', 'total_tickets', 'resolved_tickets', 'last_issue_at'
+    )
+    return {
+        equipment_id: score_from_ticket_features(total, resolved, last_issue_at, now)
+        for equipment_id, total, resolved, last_issue_at in rows
+    }
+
+def health_status(health_score):
+    """
+    Human readable label for a health score
+    """
+    if health_score >= 80:
+        return 'Excellent'
+    if health_score >= 60:
+        return 'Good'
+    if health_score >= 40:
+        return 'Fair'
+    return 'Poor'
+
+def top_issue_categories(queryset=None, since=None, until=None, limit=3):
+    """
+    Get the most common issue categories per equipment in one grouped pass
+    Returns a dict of {equipment_id: [{'issue_category': ..., 'count': ...}]}
+    """
+    tickets = Ticket.objects.all()
+    if queryset is not None:
+        tickets = tickets.filter(equipment__in=queryset)
+    if since is not None:
+        tickets = tickets.filter(created_at__gte=since)
+    if until is not None:
+        # A window closed on both sides is searched on the created_at index,
+        # since alone makes SQLite scan the whole equipment/created_at index
+        tickets = tickets.filter(created_at__lte=until)
+
+    rows = (
+        tickets.values('equipment_id', 'issue_category')
+        .annotate(count=Count('id'))
+        .order_by('equipment_id', '-count', 'issue_category')
+    )
+    categories = defaultdict(list)
+    for row in rows:
+        top = categories[row['equipment_id']]
+        if len(top) < limit:
+            top.append({'issue_category': row['issue_category'], 'count': row['count']})
+    return categories
 
 def calculate_equipment_health_score(equipment_id):
     """
     Calculate a health score for equipment based on ticket history
     Returns a score from 0-100 (100 = excellent health)
     """
-    try:
-        equipment = Equipment.objects.get(id=equipment_id)
-        
-        # Get tickets in the last 6 months
-        six_months_ago = timezone.now() - timedelta(days=180)
-        recent_tickets = Ticket.objects.filter(
-            equipment=equipment,
-            created_at__gte=six_months_ago
-        )
-        
-        total_tickets = recent_tickets.count()
-        resolved_tickets = recent_tickets.filter(status='resolved').count()
-        
-        # Calculate health score based on:
-        # 1. Number of issues (fewer is better)
-        # 2. Resolution rate (higher is better)
-        # 3. Time since last issue (longer is better)
-        
-        if total_tickets == 0:
-            return 100  # No issues = perfect health
-        
-        resolution_rate = (resolved_tickets / total_tickets) * 100 if total_tickets > 0 else 0
-        
-        # Penalty for number of issues (more sensitive to recent activity)
-        issue_penalty = min(total_tickets * 15, 60)  # Increased penalty for recent issues
-        
-        # Bonus for resolution rate
-        resolution_bonus = resolution_rate * 0.2  # Reduced bonus to make recent issues more impactful
-        
-        # Time since last issue bonus (more sensitive to recent activity)
-        last_issue = recent_tickets.order_by('-created_at').first()
-        if last_issue:
-            days_since_issue = (timezone.now() - last_issue.created_at).days
-            # More aggressive time penalty for very recent issues
-            if days_since_issue <= 7:
-                time_bonus = -10  # Penalty for very recent issues
-            elif days_since_issue <= 30:
-                time_bonus = 0    # No bonus for recent issues
-            else:
-                time_bonus = min((days_since_issue - 30) * 0.3, 15)  # Gradual bonus for older issues
-        else:
-            time_bonus = 15
-        
-        health_score = 100 - issue_penalty + resolution_bonus + time_bonus
-        return max(0, min(100, health_score))
-        
-    except Equipment.DoesNotExist:
-        return 0
+    scores = calculate_health_scores(Equipment.objects.filter(id=equipment_id))
+    # Unknown equipment has no score row
+    return next(iter(scores.values()), 0)
+
+def refresh_equipment_health(queryset=None, now=None):
+    """
+    Recompute the materialized EquipmentHealth rows for the given equipment
+    Uses one grouped aggregate query and one bulk upsert
+    Only called from writes: the ticket/equipment signals (on commit) and
+    `manage.py rebuild_equipment_health`, reads never write
+    Returns the number of refreshed rows
+    """
+    if now is None:
+        now = timezone.now()
+
+    six_months_ago = now - timedelta(days=180)
+    three_months_ago = now - timedelta(days=90)
+    rows = equipment_ticket_features(queryset, now).annotate(
+        first_issue_at=Min('ticket__created_at', filter=Q(ticket__created_at__gte=six_months_ago)),
+        first_recent_issue_at=Min('ticket__created_at', filter=Q(ticket__created_at__gte=three_months_ago)),
+    ).values(
+        'id', 'total_tickets', 'resolved_tickets', 'last_issue_at', 'recent_tickets',
+        'avg_resolution', 'first_issue_at', 'first_recent_issue_at'
+    )
+
+    snapshots = []
+    for row in rows:
+        # The counts stay valid until the oldest ticket in a window ages out of it
+        expiries = []
+        if row['first_issue_at']:
+            expiries.append(row['first_issue_at'] + timedelta(days=180))
+        if row['first_recent_issue_at']:
+            expiries.append(row['first_recent_issue_at'] + timedelta(days=90))
+        snapshots.append(EquipmentHealth(
+            equipment_id=row['id'],
+            tickets_180d=row['total_tickets'],
+            resolved_180d=row['resolved_tickets'],
+            tickets_90d=row['recent_tickets'],
+            avg_resolution_90d=row['avg_resolution'],
+            last_issue_at=row['last_issue_at'],
+            computed_at=now,
+            expires_at=min(expiries) if expiries else None,
+        ))
+
+    EquipmentHealth.objects.bulk_create(
+        snapshots,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['equipment'],
+        update_fields=[
+            'tickets_180d', 'resolved_180d', 'tickets_90d', 'avg_resolution_90d',
+            'last_issue_at', 'computed_at', 'expires_at'
+        ],
+    )
+    return len(snapshots)
+
+def stale_equipment_health(queryset=None, now=None):
+    """
+    The equipment without an EquipmentHealth row or whose time windows have moved on
+    """
+    if queryset is None:
+        queryset = Equipment.objects.all()
+    if now is None:
+        now = timezone.now()
+    return queryset.filter(Q(health__isnull=True) | Q(health__expires_at__lt=now))
 
-def predict_maintenance_needs():
+def equipment_health_features(queryset=None, now=None):
+    """
+    Read ticket features for the equipment from the materialized EquipmentHealth rows
+    Features of missing rows and rows whose time windows have moved on are
+    computed from the tickets instead, without writing (the rows are refreshed
+    by `manage.py rebuild_equipment_health --stale`)
+    Returns dicts with the same keys as equipment_ticket_features
+    """
+    if queryset is None:
+        queryset = Equipment.objects.all()
+    if now is None:
+        now = timezone.now()
+
+    rows = list(queryset.order_by('id').values(
+        'id', 'type', 'location', 'serial_number',
+        total_tickets=F('health__tickets_180d'),
+        resolved_tickets=F('health__resolved_180d'),
+        last_issue_at=F('health__last_issue_at'),
+        recent_tickets=F('health__tickets_90d'),
+        avg_resolution=F('health__avg_resolution_90d'),
+        computed_at=F('health__computed_at'),
+        expires_at=F('health__expires_at'),
+    ))
+    stale = any(row['computed_at'] is None or (row['expires_at'] and row['expires_at'] < now) for row in rows)
+    if stale:
+        features = {
+            row['id']: row for row in equipment_ticket_features(stale_equipment_health(queryset, now), now).values(
+                'id', 'total_tickets', 'resolved_tickets', 'last_issue_at', 'recent_tickets', 'avg_resolution'
+            )
+        }
+        for row in rows:
+            row.update(features.get(row['id'], {}))
+    for row in rows:
+        del row['computed_at'], row['expires_at']
+    return rows
+
+def predict_maintenance_needs(queryset=None, now=None, features=None, common_issues=None):
     """
     AI-powered prediction for equipment that needs maintenance
     Returns list of equipment with predicted maintenance needs and preventive measures
+    Runs a fixed number of queries regardless of the number of equipment
+    Already loaded features/common issues (see snapshot.py) are reused when given
     """
     predictions = []
+    if now is None:
+        now = timezone.now()
+    three_months_ago = now - timedelta(days=90)
+    
+    # Precomputed ticket features for all equipment
+    all_equipment = features if features is not None else equipment_health_features(queryset, now)
     
-    # Get all equipment
-    all_equipment = Equipment.objects.all()
+    # Top issue categories for all equipment in one grouped pass
+    if common_issues is None:
+        common_issues = top_issue_categories(queryset, since=three_months_ago, until=now)
     
     for equipment in all_equipment:
-        health_score = calculate_equipment_health_score(equipment.id)
-        
-        # Get recent ticket patterns
-        three_months_ago = timezone.now() - timedelta(days=90)
-        recent_tickets = Ticket.objects.filter(
-            equipment=equipment,
-            created_at__gte=three_months_ago
+        health_score = score_from_ticket_features(
+            equipment['total_tickets'], equipment['resolved_tickets'], equipment['last_issue_at'], now
         )
+        ticket_count = equipment['recent_tickets']
+        issue_categories = common_issues.get(equipment['id'], [])
         
-        ticket_count = recent_tickets.count()
-        
-        # Analyze issue categories for this equipment
-        issue_categories = recent_tickets.values('issue_category').annotate(
-            count=Count('id')
-        ).order_by('-count')
-        
-        # Calculate average resolution time for resolved tickets
-        resolved_tickets = recent_tickets.filter(status='resolved')
-        if resolved_tickets.exists():
-            resolution_times = []
-            for ticket in resolved_tickets:
-                if ticket.updated_at and ticket.created_at:
-                    time_diff = (ticket.updated_at - ticket.created_at).days
-                    resolution_times.append(time_diff)
-            avg_resolution_time = sum(resolution_times) / len(resolution_times) if resolution_times else 0
+        # Average resolution time for resolved tickets, computed in SQL
+        # In fractional days: the per-ticket loop this replaced truncated
+        # every ticket to whole days first (36h counted as 1 day)
+        if equipment['avg_resolution'] is not None:
+            avg_resolution_time = equipment['avg_resolution'].total_seconds() / 86400
         else:
             avg_resolution_time = 0
         
@@ -111,34 +289,34 @@ def predict_maintenance_needs():
             maintenance_needed = True
             urgency = 'high'
             reason = f"Critical health score ({health_score:.1f}/100)"
-            preventive_measures = generate_preventive_measures(equipment.type, 'critical', issue_categories)
+            preventive_measures = generate_preventive_measures(equipment['type'], 'critical', issue_categories)
             estimated_cost = 500  # High cost for critical maintenance
         elif ticket_count >= 3:
             maintenance_needed = True
             urgency = 'medium'
             reason = f"{ticket_count} issues in last 90 days"
-            preventive_measures = generate_preventive_measures(equipment.type, 'frequent_issues', issue_categories)
+            preventive_measures = generate_preventive_measures(equipment['type'], 'frequent_issues', issue_categories)
             estimated_cost = 200  # Medium cost for preventive maintenance
         elif health_score < 60:
             maintenance_needed = True
             urgency = 'low'
             reason = f"Declining health score ({health_score:.1f}/100)"
-            preventive_measures = generate_preventive_measures(equipment.type, 'declining', issue_categories)
+            preventive_measures = generate_preventive_measures(equipment['type'], 'declining', issue_categories)
             estimated_cost = 100  # Low cost for routine maintenance
         
         if maintenance_needed:
             predictions.append({
-                'equipment_id': equipment.id,
-                'equipment_type': equipment.type,
-                'location': equipment.location,
+                'equipment_id': equipment['id'],
+                'equipment_type': equipment['type'],
+                'location': equipment['location'],
                 'health_score': round(health_score, 1),
                 'urgency': urgency,
                 'reason': reason,
                 'recent_tickets': ticket_count,
-                'predicted_maintenance_date': timezone.now() + timedelta(days=30 if urgency == 'high' else 60),
+                'predicted_maintenance_date': now + timedelta(days=30 if urgency == 'high' else 60),
                 'preventive_measures': preventive_measures,
                 'estimated_cost': estimated_cost,
-                'common_issues': list(issue_categories[:3]),  # Top 3 most common issues
+                'common_issues': issue_categories,  # Top 3 most common issues
                 'avg_resolution_time': round(avg_resolution_time, 1)
             })
     
@@ -217,11 +395,13 @@ def generate_preventive_measures(equipment_type, issue_type, issue_categories):
     
     return measures
 
-def get_preventive_maintenance_schedule():
+def get_preventive_maintenance_schedule(queryset=None, now=None, features=None):
     """
     Generate a comprehensive preventive maintenance schedule
     Only includes equipment that actually needs maintenance
     """
+    if now is None:
+        now = timezone.now()
     schedule = {
         'daily': [],
         'weekly': [],
@@ -230,44 +410,48 @@ def get_preventive_maintenance_schedule():
         'annually': []
     }
     
-    # Get all equipment
-    all_equipment = Equipment.objects.all()
+    # Precomputed ticket features for all equipment
+    all_equipment = features if features is not None else equipment_health_features(queryset, now)
     
     for equipment in all_equipment:
-        health_score = calculate_equipment_health_score(equipment.id)
+        health_score = score_from_ticket_features(
+            equipment['total_tickets'], equipment['resolved_tickets'], equipment['last_issue_at'], now
+        )
         
         # Only add equipment that actually needs maintenance (health score < 98)
         # Equipment with health score 98+ is considered in excellent condition
         if health_score < 40:
             schedule['weekly'].append({
-                'equipment_id': equipment.id,
-                'equipment_type': equipment.type,
-                'location': equipment.location,
-                'tasks': generate_preventive_measures(equipment.type, 'critical', [])
+                'equipment_id': equipment['id'],
+                'equipment_type': equipment['type'],
+                'location': equipment['location'],
+                'tasks': generate_preventive_measures(equipment['type'], 'critical', [])
             })
         elif health_score < 70:
             schedule['monthly'].append({
-                'equipment_id': equipment.id,
-                'equipment_type': equipment.type,
-                'location': equipment.location,
-                'tasks': generate_preventive_measures(equipment.type, 'declining', [])
+                'equipment_id': equipment['id'],
+                'equipment_type': equipment['type'],
+                'location': equipment['location'],
+                'tasks': generate_preventive_measures(equipment['type'], 'declining', [])
             })
         elif health_score < 98:
             schedule['quarterly'].append({
-                'equipment_id': equipment.id,
-                'equipment_type': equipment.type,
-                'location': equipment.location,
-                'tasks': generate_preventive_measures(equipment.type, 'routine', [])
+                'equipment_id': equipment['id'],
+                'equipment_type': equipment['type'],
+                'location': equipment['location'],
+                'tasks': generate_preventive_measures(equipment['type'], 'routine', [])
             })
         # Equipment with health score 98+ is not included in any schedule (excellent condition)
     
     return schedule
 
-def calculate_maintenance_budget():
+def calculate_maintenance_budget(predictions=None):
     """
     Calculate estimated maintenance budget for the next quarter
+    Pass already computed predictions to avoid running them again
     """
-    predictions = predict_maintenance_needs()
+    if predictions is None:
+        predictions = predict_maintenance_needs()
     
     total_estimated_cost = sum(pred['estimated_cost'] for pred in predictions)
     
@@ -289,43 +473,44 @@ def calculate_maintenance_budget():
         ]
     }
 
-def analyze_issue_patterns():
+def analyze_issue_patterns(now=None, filters=None):
     """
     Analyze patterns in ticket data to identify trends
+    Counts are summed from the daily ticket rollups, over the last 6 months
+    unless the filters give a window
     """
-    # Get data from last 6 months
-    six_months_ago = timezone.now() - timedelta(days=180)
-    
+    if now is None:
+        now = timezone.now()
+    if filters is None:
+        filters = AnalyticsFilters()
+    if filters.since is None:
+        # Get data from last 6 months
+        filters = filters.replace(since=now - timedelta(days=180))
+
     # Equipment type failure patterns
-    equipment_patterns = (
-        Ticket.objects.filter(created_at__gte=six_months_ago)
-        .values('equipment__type')
-        .annotate(
-            total_issues=Count('id'),
-            resolved_issues=Count('id', filter=Q(status='resolved'))
-        )
-    )
-    
+    equipment_patterns = [
+        {'equipment__type': row['equipment_type'], 'total_issues': row['total'], 'resolved_issues': row['resolved']}
+        for row in ticket_counts('equipment_type', filters=filters)
+    ]
+
     # Location-based patterns
-    location_patterns = (
-        Ticket.objects.filter(created_at__gte=six_months_ago)
-        .values('equipment__location')
-        .annotate(
-            total_issues=Count('id'),
-            resolved_issues=Count('id', filter=Q(status='resolved'))
-        )
-    )
-    
-    # Time-based patterns (monthly trends) - simplified for SQLite compatibility
-    monthly_trends = (
-        Ticket.objects.filter(created_at__gte=six_months_ago)
-        .values('created_at__month')
-        .annotate(issue_count=Count('id'))
-        .order_by('created_at__month')
+    location_patterns = [
+        {'equipment__location': row['location'], 'total_issues': row['total'], 'resolved_issues': row['resolved']}
+        for row in ticket_counts('location', filters=filters)
+    ]
+
+    # Time-based patterns, one entry per day/week/month (keyed by its first day)
+    trends = sorted(
+        (
+            {'period': row['period'], 'issue_count': row['total']}
+            for row in ticket_counts('period', filters=filters)
+        ),
+        key=lambda row: row['period'],
     )
-    
+
     return {
-        'equipment_patterns': list(equipment_patterns),
-        'location_patterns': list(location_patterns),
-        'monthly_trends': list(monthly_trends)
-    } 
\ No newline at end of file
+        'equipment_patterns': equipment_patterns,
+        'location_patterns': location_patterns,
+        'granularity': filters.granularity,
+        'trends': trends
+    }
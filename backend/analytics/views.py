@@ -1,80 +1,97 @@
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from tickets.models import Ticket
-from equipment.models import Equipment
-from django.db.models import Count
-from django.utils import timezone
-from .utils import calculate_equipment_health_score, predict_maintenance_needs, analyze_issue_patterns, get_preventive_maintenance_schedule, calculate_maintenance_budget
+from .cache import cached_response, conditional_get, get_data_version, TRACKED_TABLES
+from .filters import AnalyticsFilters
+from .jobs import offload_to_worker, job_status
+from .models import AnalyticsJob
+from .snapshot import get_snapshot
 
 # Analytics API views for AI-powered insights
-# This file will contain endpoints for predictions and analysis 
+# Every view derives its response from the shared analytics snapshot
+# for its since/until/school/type/granularity query parameters
+# With ?async=1 the computation is queued for the analytics worker instead
+
+# Health scores decay with time, so validators change at least this often (seconds)
+ANALYTICS_MAX_AGE = 300
+
+def request_snapshot(request):
+    """
+    Shared snapshot for the request's filters, at the data version the
+    cache and validators already read for this request
+    """
+    return get_snapshot(AnalyticsFilters.from_request(request), get_data_version(request))
 
 class EquipmentFailurePatternsView(APIView):
     permission_classes = [IsAuthenticated]
+    @offload_to_worker('failure_patterns')
+    @conditional_get(*TRACKED_TABLES, max_age=ANALYTICS_MAX_AGE)
+    @cached_response()
     def get(self, request):
         # Count number of tickets per equipment type
-        data = (
-            Ticket.objects.values('equipment__type')
-            .annotate(failure_count=Count('id'))
-            .order_by('-failure_count')
-        )
-        return Response(list(data)) 
+        return Response(request_snapshot(request).failure_patterns)
 
 class SchoolIssueAnalyticsView(APIView):
     permission_classes = [IsAuthenticated]
+    @offload_to_worker('school_issues')
+    @conditional_get(*TRACKED_TABLES, max_age=ANALYTICS_MAX_AGE)
+    @cached_response()
     def get(self, request):
-        data = (
-            Ticket.objects.values('equipment__school')
-            .annotate(issue_count=Count('id'))
-            .order_by('-issue_count')
-        )
-        return Response(list(data)) 
+        return Response(request_snapshot(request).school_issues)
 
 class PreventiveMaintenanceView(APIView):
     permission_classes = [IsAuthenticated]
+    @offload_to_worker('predictions')
+    @conditional_get(*TRACKED_TABLES, max_age=ANALYTICS_MAX_AGE)
+    @cached_response()
     def get(self, request):
         # Use AI-powered prediction instead of simple counting
-        predictions = predict_maintenance_needs()
-        return Response(predictions)
+        return Response(request_snapshot(request).predictions)
 
 class EquipmentHealthView(APIView):
     permission_classes = [IsAuthenticated]
+    @offload_to_worker('health_report')
+    @conditional_get(*TRACKED_TABLES, max_age=ANALYTICS_MAX_AGE)
+    @cached_response()
     def get(self, request):
         """Get health scores for all equipment"""
-        equipment_list = Equipment.objects.all()
-        health_data = []
-        
-        for equipment in equipment_list:
-            health_score = calculate_equipment_health_score(equipment.id)
-            health_data.append({
-                'equipment_id': equipment.id,
-                'equipment_type': equipment.type,
-                'location': equipment.location,
-                'serial_number': equipment.serial_number,
-                'health_score': round(health_score, 1),
-                'status': 'Excellent' if health_score >= 80 else 'Good' if health_score >= 60 else 'Fair' if health_score >= 40 else 'Poor'
-            })
-        
-        return Response(health_data)
+        return Response(request_snapshot(request).health_report)
 
 class IssuePatternsView(APIView):
     permission_classes = [IsAuthenticated]
+    @offload_to_worker('issue_patterns')
+    @conditional_get(*TRACKED_TABLES, max_age=ANALYTICS_MAX_AGE)
+    @cached_response()
     def get(self, request):
         """Get comprehensive issue pattern analysis"""
-        patterns = analyze_issue_patterns()
-        return Response(patterns)
+        return Response(request_snapshot(request).issue_patterns)
 
 class PreventiveMaintenanceScheduleView(APIView):
     permission_classes = [IsAuthenticated]
+    @offload_to_worker('schedule')
+    @conditional_get(*TRACKED_TABLES, max_age=ANALYTICS_MAX_AGE)
+    @cached_response()
     def get(self, request):
         """Get preventive maintenance schedule"""
-        schedule = get_preventive_maintenance_schedule()
-        return Response(schedule)
+        return Response(request_snapshot(request).schedule)
 
 class MaintenanceBudgetView(APIView):
     permission_classes = [IsAuthenticated]
+    @offload_to_worker('budget')
+    @conditional_get(*TRACKED_TABLES, max_age=ANALYTICS_MAX_AGE)
+    @cached_response()
     def get(self, request):
         """Get maintenance budget estimates"""
-        budget = calculate_maintenance_budget()
-        return Response(budget) 
\ No newline at end of file
+        return Response(request_snapshot(request).budget)
+
+class AnalyticsJobView(APIView):
+    permission_classes = [IsAuthenticated]
+    def get(self, request, job_id):
+        """Poll a queued analytics job, the result is included once it's done"""
+        # Results are only kept until the job expires
+        job = get_object_or_404(
+            AnalyticsJob.objects.exclude(expires_at__lt=timezone.now()), id=job_id
+        )
+        return Response(job_status(job, request))
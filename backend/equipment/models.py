@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 
 # Create your models here.
 
@@ -16,5 +16,33 @@ class Equipment(models.Model):
     school = models.CharField(max_length=100, default='')
     is_working = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            # Grouping and filtering by school/location/type in analytics
+            models.Index(fields=['school', 'type'], name='equipment_school_type_idx'),
+            models.Index(fields=['location'], name='equipment_location_idx'),
+            models.Index(fields=['type'], name='equipment_type_idx'),
+            # Equipment status report
+            models.Index(fields=['is_working'], name='equipment_working_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded values so save hooks can see what changed
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Atomic so the post_save hooks (analytics rollups) commit with the equipment
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        # The saved values are the new baseline for the next save hooks
+        self._loaded_values = {
+            field.attname: self.__dict__[field.attname]
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+        }
+
     def __str__(self):
         return f"{self.get_type_display()} ({self.serial_number})"
@@ -1,7 +1,25 @@
 from rest_framework import serializers
 from .models import Equipment
+from silsp.metrics import TimedSerializerMixin
+from silsp.mixins import SparseFieldsMixin
  
-class EquipmentSerializer(serializers.ModelSerializer):
+class EquipmentSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Equipment
-        fields = ['id', 'type', 'serial_number', 'location', 'school', 'is_working'] 
\ No newline at end of file
+        fields = ['id', 'type', 'serial_number', 'location', 'school', 'is_working'] 
+
+class EquipmentBulkSerializer(EquipmentSerializer):
+    """
+    Validates one row of a bulk import
+    Existing serial numbers are updated (upsert), so they are not checked for
+    uniqueness, only for duplicates within the upload
+    """
+    class Meta(EquipmentSerializer.Meta):
+        extra_kwargs = {'serial_number': {'validators': []}}
+
+    def validate_serial_number(self, value):
+        seen = self.context['seen_serial_numbers']
+        if value in seen:
+            raise serializers.ValidationError("Duplicate serial number in this upload.")
+        seen.add(value)
+        return value
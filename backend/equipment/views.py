@@ -1,19 +1,67 @@
 from django.shortcuts import render
 from rest_framework import viewsets, status
 from rest_framework.response import Response
+from silsp.mixins import OptimizedQuerysetMixin, BulkImportMixin
+from analytics.cache import conditional_get
+from analytics.signals import equipment_bulk_written
+from tickets.signals import publish_bulk_change
 from .models import Equipment
-from .serializers import EquipmentSerializer
+from .serializers import EquipmentSerializer, EquipmentBulkSerializer
 
 # Create your views here.
 
-class EquipmentViewSet(viewsets.ModelViewSet):
+class EquipmentViewSet(OptimizedQuerysetMixin, BulkImportMixin, viewsets.ModelViewSet):
     queryset = Equipment.objects.all()
     serializer_class = EquipmentSerializer
-    
-    def create(self, request, *args, **kwargs):
-        print("Received data:", request.data)
-        serializer = self.get_serializer(data=request.data)
-        if not serializer.is_valid():
-            print("Validation errors:", serializer.errors)
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-        return super().create(request, *args, **kwargs)
+    bulk_serializer_class = EquipmentBulkSerializer
+
+    # Polled by the frontend: answer 304 while the table is unchanged
+    @conditional_get('equipment')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get('equipment')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def get_bulk_context(self, rows):
+        context = super().get_bulk_context(rows)
+        # Shared by all batches of the request
+        if not hasattr(self, '_seen_serial_numbers'):
+            self._seen_serial_numbers = set()
+        context['seen_serial_numbers'] = self._seen_serial_numbers
+        return context
+
+    def perform_bulk_write(self, rows):
+        """
+        Upsert on serial_number; rows are grouped by the columns they provide
+        so a missing column never overwrites an existing value with its default
+        """
+        serial_numbers = [row['serial_number'] for row in rows]
+        existing = {
+            equipment.pop('id'): equipment
+            for equipment in Equipment.objects.filter(serial_number__in=serial_numbers)
+            .values('id', 'type', 'school', 'location')
+        }
+
+        groups = {}
+        for row in rows:
+            groups.setdefault(tuple(sorted(row)), []).append(row)
+        for columns, group in groups.items():
+            update_fields = [column for column in columns if column != 'serial_number']
+            Equipment.objects.bulk_create(
+                [Equipment(**row) for row in group],
+                update_conflicts=bool(update_fields),
+                ignore_conflicts=not update_fields,
+                unique_fields=['serial_number'] if update_fields else None,
+                update_fields=update_fields or None,
+            )
+
+        # bulk_create skips the save hooks, and returns no ids for upserted rows
+        created_ids = (
+            Equipment.objects.filter(serial_number__in=serial_numbers).exclude(id__in=existing)
+            .values_list('id', flat=True)
+        )
+        equipment_bulk_written(created_ids=created_ids, old_values=existing)
+        publish_bulk_change('equipment', len(rows))
+        return len(rows) - len(existing), len(existing)
@@ -3,6 +3,9 @@ ASGI config for silsp project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The server-sent events change feed (/api/events/) is only served through this
+application, e.g. ``uvicorn silsp.asgi:application``.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -0,0 +1,217 @@
+# Benchmark of every API route against a seeded dataset
+# Requests go through the whole middleware/view stack in process (django.test.Client),
+# latency and SQL query counts come from PerformanceMetricsMiddleware
+# Used by `manage.py bench`, the request list is shared with the query budget tests
+
+import json
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+from django.conf import settings
+from django.test import Client, override_settings
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+from analytics.cache import get_cache
+from analytics.jobs import enqueue_job
+from analytics.snapshot import clear_snapshots
+from tickets.models import Comment, Ticket
+from users.models import User
+from .seeding import DEFAULT_PASSWORD, technician_username
+
+# Routes that can't be benchmarked as a single request
+SKIPPED_ROUTES = {
+    'change_feed': 'streams events until the client disconnects (ASGI only)',
+}
+
+@dataclass
+class BenchRequest:
+    name: str
+    route: str
+    method: str
+    path: str
+    # Request body of the n-th run, None for no body
+    body: Optional[Callable[[int], object]] = None
+    authenticated: bool = True
+    tags: tuple = field(default=())
+
+def route_names(patterns=None):
+    """
+    Names of the routes of the URLconf, admin and DRF login views excluded
+    """
+    names = set()
+    for pattern in patterns if patterns is not None else get_resolver().url_patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace is None:
+                names |= route_names(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(pattern.name)
+    return names
+
+def bench_requests(tag=''):
+    """
+    The benchmarked requests, built from the rows of the seeded dataset
+    `tag` keeps the objects created by write requests unique across runs
+    """
+    technician = User.objects.get(username=technician_username(0))
+    ticket = Ticket.objects.filter(equipment__school=technician.school).order_by('id').first()
+    equipment = ticket.equipment
+    comment = Comment.objects.order_by('id').first()
+    refresh = str(RefreshToken.for_user(technician))
+    school = equipment.school
+    # Polled by the job status request
+    job = enqueue_job('failure_patterns', {}, technician)
+
+    def new_equipment(run, count=1):
+        return [
+            {'type': 'pc', 'serial_number': f'BENCH-NEW{tag}-{run}-{index}', 'location': 'Lab 1', 'school': school}
+            for index in range(count)
+        ]
+
+    def new_ticket(run):
+        return {'equipment': equipment.id, 'issue_category': 'Hardware Issue',
+                'description': f'Benchmark ticket {run}', 'status': 'open'}
+
+    requests = [
+        BenchRequest('api root', 'api-root', 'GET', reverse('api-root')),
+        BenchRequest('login', 'token_obtain_pair', 'POST', reverse('token_obtain_pair'),
+                     lambda run: {'username': technician.username, 'password': DEFAULT_PASSWORD}, authenticated=False),
+        BenchRequest('token refresh', 'token_refresh', 'POST', reverse('token_refresh'),
+                     lambda run: {'refresh': refresh}, authenticated=False),
+        BenchRequest('user list', 'user-list', 'GET', reverse('user-list'), tags=('list',)),
+        BenchRequest('user detail', 'user-detail', 'GET', reverse('user-detail', args=[technician.id]), tags=('detail',)),
+        BenchRequest('user register', 'user-list', 'POST', reverse('user-list'), lambda run: {
+            'username': f'bench{tag}_{run}', 'password': DEFAULT_PASSWORD, 'role': 'user', 'school': school,
+        }, authenticated=False),
+        BenchRequest('equipment list', 'equipment-list', 'GET', reverse('equipment-list'), tags=('list',)),
+        BenchRequest('equipment list (school)', 'equipment-list', 'GET',
+                     reverse('equipment-list') + f'?school={school}', tags=('list',)),
+        BenchRequest('equipment detail', 'equipment-detail', 'GET', reverse('equipment-detail', args=[equipment.id]),
+                     tags=('detail',)),
+        BenchRequest('equipment create', 'equipment-list', 'POST', reverse('equipment-list'),
+                     lambda run: new_equipment(run)[0]),
+        BenchRequest('equipment bulk import (50)', 'equipment-bulk', 'POST', reverse('equipment-bulk'),
+                     lambda run: new_equipment(run, 50)),
+        BenchRequest('ticket list', 'ticket-list', 'GET', reverse('ticket-list'), tags=('list',)),
+        BenchRequest('ticket list (with comments)', 'ticket-list', 'GET',
+                     reverse('ticket-list') + '?fields=id,status,created_by,assigned_to,comments', tags=('list',)),
+        BenchRequest('ticket detail', 'ticket-detail', 'GET', reverse('ticket-detail', args=[ticket.id]),
+                     tags=('detail',)),
+        BenchRequest('ticket create', 'ticket-list', 'POST', reverse('ticket-list'), new_ticket),
+        BenchRequest('ticket bulk import (50)', 'ticket-bulk', 'POST', reverse('ticket-bulk'),
+                     lambda run: [new_ticket(run) for _ in range(50)]),
+        BenchRequest('comment list', 'comment-list', 'GET', reverse('comment-list'), tags=('list',)),
+        BenchRequest('comment detail', 'comment-detail', 'GET', reverse('comment-detail', args=[comment.id]),
+                     tags=('detail',)),
+        BenchRequest('comment create', 'comment-list', 'POST', reverse('comment-list'),
+                     lambda run: {'ticket': ticket.id, 'text': f'Benchmark comment {run}'}),
+        BenchRequest('ticket export (csv)', 'export_tickets', 'GET', reverse('export_tickets', args=['csv']),
+                     tags=('list',)),
+        BenchRequest('equipment export (ndjson)', 'export_equipment', 'GET', reverse('export_equipment', args=['ndjson']),
+                     tags=('list',)),
+        # Its sections run on other DB connections, they are budgeted through their own endpoints
+        BenchRequest('dashboard', 'dashboard', 'GET', reverse('dashboard')),
+        BenchRequest('metrics', 'metrics', 'GET', reverse('metrics'), authenticated=False),
+    ]
+    for name in ('report_frequent_issues', 'report_turnaround_time', 'report_equipment_status'):
+        requests.append(BenchRequest(name.replace('_', ' '), name, 'GET', reverse(name), tags=('report',)))
+    for name in ('equipment_failure_patterns', 'school_issues_analytics', 'preventive_maintenance',
+                 'equipment_health', 'issue_patterns', 'maintenance_schedule', 'maintenance_budget'):
+        requests.append(BenchRequest(name.replace('_', ' '), name, 'GET', reverse(name), tags=('analytics',)))
+        requests.append(BenchRequest(f'{name.replace("_", " ")} (school)', name, 'GET',
+                                     reverse(name) + f'?school={school}', tags=('analytics',)))
+    requests.append(BenchRequest('analytics job status', 'analytics_job', 'GET', reverse('analytics_job', args=[job.id])))
+    return requests
+
+def clear_caches():
+    """
+    Drop the cached analytics so every run measures the computation
+    """
+    get_cache().clear()
+    clear_snapshots()
+
+def percentile(values, q):
+    # Nearest rank
+    ordered = sorted(values)
+    return ordered[max(math.ceil(q * len(ordered)) - 1, 0)]
+
+def run_request(client, request, run, headers):
+    """
+    Send the request, returns the response and the seconds until its body was read
+    """
+    kwargs = dict(headers if request.authenticated else {})
+    if request.body is not None:
+        kwargs.update(data=json.dumps(request.body(run)), content_type='application/json')
+    start = time.perf_counter()
+    response = client.generic(request.method, request.path, **kwargs)
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response, time.perf_counter() - start
+
+def run_benchmark(repeat=20, warm=False, tag=''):
+    """
+    Run every request `repeat` times, returns {request name: results}
+    Caches are cleared before each run unless `warm`
+    """
+    requests = bench_requests(tag)
+    technician = User.objects.get(username=technician_username(0))
+    client = Client(raise_request_exception=False)
+    results = {}
+    with override_settings(PERFORMANCE_METRICS_SAMPLE_RATE=1, METRICS_ALLOW_LOCALHOST=True,
+                           ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+        # Also loads the URLconf and middleware before the timed requests
+        login = client.post(reverse('token_obtain_pair'), {
+            'username': technician.username, 'password': DEFAULT_PASSWORD,
+        }, content_type='application/json')
+        headers = {'HTTP_AUTHORIZATION': f"Bearer {login.json()['access']}"}
+
+        for request in requests:
+            latencies, queries, db_times, statuses = [], [], [], set()
+            for run in range(repeat):
+                if not warm:
+                    clear_caches()
+                response, elapsed = run_request(client, request, run, headers)
+                metrics = getattr(response.wsgi_request, 'performance_metrics', None)
+                latencies.append(elapsed)
+                queries.append(metrics.queries if metrics else 0)
+                db_times.append(metrics.db_time if metrics else 0.0)
+                statuses.add(response.status_code)
+            results[request.name] = {
+                'route': request.route,
+                'method': request.method,
+                'path': request.path,
+                'status': sorted(statuses),
+                'p50_ms': round(percentile(latencies, 0.5) * 1000, 2),
+                'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+                'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+                'db_p50_ms': round(percentile(db_times, 0.5) * 1000, 2),
+                'queries': max(queries),
+            }
+    return results
+
+def uncovered_routes(requests=None):
+    """
+    Routes of the URLconf neither benchmarked nor in SKIPPED_ROUTES
+    """
+    covered = {request.route for request in (requests or bench_requests())}
+    return sorted(route_names() - covered - set(SKIPPED_ROUTES))
+
+def find_regressions(results, baseline, threshold, min_delta_ms):
+    """
+    Requests slower (p95) than the baseline by more than `threshold` (a
+    fraction) and `min_delta_ms`, or running more queries
+    Both arguments are {scale: {request name: results}}
+    """
+    regressions = []
+    for scale, requests in results.items():
+        for name, result in requests.items():
+            before = baseline.get(scale, {}).get(name)
+            if before is None:
+                continue
+            delta = result['p95_ms'] - before['p95_ms']
+            if delta > min_delta_ms and result['p95_ms'] > before['p95_ms'] * (1 + threshold):
+                regressions.append(f'{scale} {name}: p95 {before["p95_ms"]}ms -> {result["p95_ms"]}ms')
+            if result['queries'] > before['queries']:
+                regressions.append(f'{scale} {name}: {before["queries"]} -> {result["queries"]} queries')
+    return regressions
@@ -0,0 +1,372 @@
+# Load generator for sizing workers and comparing SQLite settings
+# Virtual students and technicians log in through /api/token/ and replay the
+# traffic of the frontend against a running server over HTTP:
+#   students    - EquipmentList polling, new tickets, comments
+#   technicians - the Analytics and Reports dashboards, the ticket list,
+#                 status updates, comments
+# The HTTP/1.1 client is plain asyncio (keep-alive connections, revalidated
+# with the ETags of earlier responses like a browser), so nothing needs installing
+# Used by `manage.py loadtest`
+
+import asyncio
+import json
+import random
+import re
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+from .benchmark import percentile
+
+LOCK_ERROR = b'database is locked'
+# Server log lines reporting a lock error, once per error: tracebacks also
+# show the sqlite3 exception the Django one was raised from
+LOCK_LOG_LINE = re.compile(r'^(?!sqlite3\.).*database is locked', re.MULTILINE)
+
+# Actions of each role with their relative weights, between think times
+STUDENT_ACTIONS = {'ticket create': 1, 'ticket list': 2, 'comment create': 2}
+TECHNICIAN_ACTIONS = {
+    'analytics dashboard': 2, 'reports dashboard': 2, 'ticket list': 3, 'ticket update': 2, 'comment create': 1,
+}
+# Sections loaded by the Analytics and Reports pages
+ANALYTICS_SECTIONS = 'failure_patterns,school_issues,maintenance_schedule'
+REPORTS_SECTIONS = 'frequent_issues,turnaround_time,equipment_status'
+TICKET_LIST_PATH = '/api/tickets/?fields=id,issue_category,description,status,comments'
+
+class HttpError(Exception):
+    pass
+
+@dataclass
+class HttpResponse:
+    status: int
+    headers: dict
+    body: bytes
+
+    def json(self):
+        return json.loads(self.body)
+
+class HttpConnection:
+    """
+    One keep-alive HTTP/1.1 connection
+    """
+
+    def __init__(self, host, port, timeout):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=None, headers=None):
+        reused = self.writer is not None
+        try:
+            return await asyncio.wait_for(self._request(method, path, body, headers or {}), self.timeout)
+        except (ConnectionError, asyncio.IncompleteReadError) as error:
+            self.close()
+            # The server may close an idle connection, retry once on a new one
+            if reused:
+                return await self.request(method, path, body, headers)
+            raise HttpError(f'{method} {path}: {error!r}') from error
+        except asyncio.TimeoutError as error:
+            self.close()
+            raise HttpError(f'{method} {path}: no response in {self.timeout}s') from error
+
+    async def _request(self, method, path, body, headers):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        payload = b'' if body is None else json.dumps(body).encode()
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}', 'Accept: application/json',
+                 f'Content-Length: {len(payload)}']
+        if body is not None:
+            lines.append('Content-Type: application/json')
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + payload)
+        await self.writer.drain()
+
+        head = await self.reader.readuntil(b'\r\n\r\n')
+        status_line, *header_lines = head.decode('latin-1').split('\r\n')
+        status = int(status_line.split()[1])
+        response_headers = {}
+        for line in header_lines:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                response_headers[name.strip().lower()] = value.strip()
+
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            content = b''
+        elif response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            content = await self._read_chunked()
+        elif 'content-length' in response_headers:
+            content = await self.reader.readexactly(int(response_headers['content-length']))
+        else:
+            # Delimited by the end of the connection
+            content = await self.reader.read()
+            response_headers['connection'] = 'close'
+        if response_headers.get('connection', '').lower() == 'close':
+            self.close()
+        return HttpResponse(status, response_headers, content)
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            if not size:
+                # Trailers end with an empty line
+                while await self.reader.readuntil(b'\r\n') != b'\r\n':
+                    pass
+                return b''.join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+@dataclass
+class ActionStats:
+    latencies: list = field(default_factory=list)
+    statuses: dict = field(default_factory=dict)
+    errors: int = 0
+    lock_errors: int = 0
+
+    def summary(self, elapsed):
+        count = len(self.latencies)
+        return {
+            'requests': count,
+            'throughput_rps': round(count / elapsed, 2) if elapsed else 0.0,
+            'p50_ms': round(percentile(self.latencies, 0.5) * 1000, 1) if count else None,
+            'p95_ms': round(percentile(self.latencies, 0.95) * 1000, 1) if count else None,
+            'p99_ms': round(percentile(self.latencies, 0.99) * 1000, 1) if count else None,
+            'max_ms': round(max(self.latencies) * 1000, 1) if count else None,
+            'errors': self.errors,
+            'error_rate': round(self.errors / count, 4) if count else 0.0,
+            'lock_errors': self.lock_errors,
+            'statuses': {str(status): number for status, number in sorted(self.statuses.items())},
+        }
+
+@dataclass
+class LoadConfig:
+    url: str
+    # [(username, password, role, school)]
+    users: list
+    duration: float = 60.0
+    ramp_up: float = 10.0
+    # Mean seconds between two actions of a user (exponentially distributed)
+    think_time: float = 2.0
+    poll_interval: float = 5.0
+    timeout: float = 30.0
+    # Equipment ids by school, for new tickets
+    equipment: dict = field(default_factory=dict)
+    # Existing tickets to comment on and update
+    ticket_ids: list = field(default_factory=list)
+    register: bool = True
+    etags: bool = True
+    seed: int = 0
+
+class LoadRun:
+    """
+    Shared state of a run: the clock, the random source and the statistics
+    """
+
+    def __init__(self, config):
+        self.config = config
+        parts = urlsplit(config.url)
+        self.host = parts.hostname or '127.0.0.1'
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.rng = random.Random(config.seed)
+        self.stats = {}
+        self.ticket_ids = list(config.ticket_ids)
+        self.started = self.deadline = None
+
+    def record(self, action, elapsed, response=None, expected=()):
+        stats = self.stats.setdefault(action, ActionStats())
+        stats.latencies.append(elapsed)
+        status = response.status if response is not None else 0
+        stats.statuses[status] = stats.statuses.get(status, 0) + 1
+        if response is None or (status >= 400 and status not in expected):
+            stats.errors += 1
+        if response is not None and LOCK_ERROR in response.body:
+            stats.lock_errors += 1
+
+    @property
+    def remaining(self):
+        return self.deadline - time.perf_counter()
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(max(min(seconds, self.remaining), 0))
+
+    def choose(self, actions):
+        return self.rng.choices(list(actions), weights=list(actions.values()))[0]
+
+class VirtualUser:
+    """
+    A logged in student or technician with its own connections, like a browser
+    """
+
+    def __init__(self, run, username, password, role, school):
+        self.run = run
+        self.username = username
+        self.password = password
+        self.role = role
+        self.school = school
+        self.access = None
+        self.etags = {}
+        self.idle = []
+
+    async def request(self, action, method, path, body=None, authenticated=True, expected=()):
+        """
+        Send a request and record it under `action`, returns None on a network error
+        `expected` error statuses aren't counted as errors
+        Requests in flight at the same time use separate connections
+        """
+        run = self.run
+        headers = {}
+        if authenticated:
+            headers['Authorization'] = f'Bearer {self.access}'
+        if method == 'GET' and run.config.etags and path in self.etags:
+            headers['If-None-Match'] = self.etags[path]
+        connection = self.idle.pop() if self.idle else HttpConnection(run.host, run.port, run.config.timeout)
+        start = time.perf_counter()
+        try:
+            response = await connection.request(method, run.prefix + path, body, headers)
+        except HttpError:
+            run.record(action, time.perf_counter() - start)
+            return None
+        run.record(action, time.perf_counter() - start, response, expected)
+        self.idle.append(connection)
+        if method == 'GET' and response.status == 200 and 'etag' in response.headers:
+            self.etags[path] = response.headers['etag']
+        if response.status == 401 and authenticated:
+            # Expired access token, log in again for the next requests
+            await self.login()
+        return response
+
+    async def login(self):
+        response = await self.request('login', 'POST', '/api/token/', {
+            'username': self.username, 'password': self.password,
+        }, authenticated=False)
+        if response is not None and response.status == 200:
+            self.access = response.json()['access']
+        return self.access is not None
+
+    async def register(self):
+        # 400 when the user exists from an earlier run
+        await self.request('register', 'POST', '/api/users/', {
+            'username': self.username, 'password': self.password, 'role': self.role, 'school': self.school,
+        }, authenticated=False, expected=(400,))
+
+    def close(self):
+        for connection in self.idle:
+            connection.close()
+        self.idle = []
+
+    async def run_session(self):
+        run = self.run
+        if run.config.register:
+            await self.register()
+        if not await self.login():
+            return
+        # EquipmentList stays open and polls, the user acts meanwhile
+        poller = asyncio.create_task(self.poll_equipment())
+        actions = STUDENT_ACTIONS if self.role == 'user' else TECHNICIAN_ACTIONS
+        try:
+            while True:
+                await run.sleep(run.rng.expovariate(1 / run.config.think_time) if run.config.think_time else 0)
+                if run.remaining <= 0:
+                    break
+                await getattr(self, run.choose(actions).replace(' ', '_'))()
+        finally:
+            poller.cancel()
+            await asyncio.gather(poller, return_exceptions=True)
+            self.close()
+
+    async def poll_equipment(self):
+        while self.run.remaining > 0:
+            await self.request('equipment poll', 'GET', '/api/equipment/')
+            await self.run.sleep(self.run.config.poll_interval)
+
+    async def analytics_dashboard(self):
+        await self.request('analytics dashboard', 'GET', f'/api/dashboard/?sections={ANALYTICS_SECTIONS}')
+
+    async def reports_dashboard(self):
+        await self.request('reports dashboard', 'GET', f'/api/dashboard/?sections={REPORTS_SECTIONS}')
+
+    async def ticket_list(self):
+        await self.request('ticket list', 'GET', TICKET_LIST_PATH)
+
+    async def ticket_create(self):
+        run = self.run
+        equipment = run.config.equipment.get(self.school)
+        if not equipment:
+            return
+        response = await self.request('ticket create', 'POST', '/api/tickets/', {
+            'equipment': run.rng.choice(equipment), 'issue_category': 'Hardware Issue',
+            'description': f'Load test ticket from {self.username}', 'status': 'open',
+        })
+        if response is not None and response.status == 201:
+            run.ticket_ids.append(response.json()['id'])
+
+    async def ticket_update(self):
+        run = self.run
+        if run.ticket_ids:
+            await self.request('ticket update', 'PATCH', f'/api/tickets/{run.rng.choice(run.ticket_ids)}/', {
+                'status': run.rng.choice(('in_progress', 'resolved')),
+            })
+
+    async def comment_create(self):
+        run = self.run
+        if run.ticket_ids:
+            await self.request('comment create', 'POST', '/api/comments/', {
+                'ticket': run.rng.choice(run.ticket_ids), 'text': f'Load test comment from {self.username}',
+            })
+
+async def _run_load(run):
+    users = [VirtualUser(run, *user) for user in run.config.users]
+    run.started = time.perf_counter()
+    run.deadline = run.started + run.config.ramp_up + run.config.duration
+
+    async def start(index, user):
+        # Users arrive evenly over the ramp-up
+        await asyncio.sleep(run.config.ramp_up * index / len(users))
+        await user.run_session()
+
+    await asyncio.gather(*(start(index, user) for index, user in enumerate(users)))
+    return time.perf_counter() - run.started
+
+def run_load(config):
+    """
+    Run the virtual users of `config` until ramp_up + duration seconds have
+    passed, returns the statistics by action and in total
+    """
+    run = LoadRun(config)
+    elapsed = asyncio.run(_run_load(run))
+    total = ActionStats()
+    for stats in run.stats.values():
+        total.latencies += stats.latencies
+        total.errors += stats.errors
+        total.lock_errors += stats.lock_errors
+        for status, count in stats.statuses.items():
+            total.statuses[status] = total.statuses.get(status, 0) + count
+    return {
+        'elapsed_s': round(elapsed, 1),
+        'actions': {action: stats.summary(elapsed) for action, stats in sorted(run.stats.items())},
+        'total': total.summary(elapsed),
+    }
+
+def count_lock_errors(log):
+    """
+    Lock errors in the output of the server
+    """
+    return len(LOCK_LOG_LINE.findall(log))
+
+def loadtest_users(students, technicians, schools, password):
+    """
+    (username, password, role, school) of the virtual users, spread over the schools
+    """
+    users = []
+    for index in range(technicians):
+        users.append(((index + 0.5) / technicians, f'loadtest_tech{index + 1}', 'technician', schools[index % len(schools)]))
+    for index in range(students):
+        users.append(((index + 0.5) / students, f'loadtest_student{index + 1}', 'user', schools[index % len(schools)]))
+    # Technicians and students arrive mixed
+    return [(username, password, role, school) for _, username, role, school in sorted(users)]
@@ -0,0 +1,302 @@
+# Request performance metrics
+# PerformanceMetricsMiddleware times a sample of the requests: SQL queries
+# (count and time, through connection.execute_wrapper so DEBUG isn't needed),
+# serializers, the view and rendering. Each sampled response gets a
+# Server-Timing header and the timings are added to per-route histograms,
+# served in the Prometheus text format by GET /api/_metrics.
+# Histograms are kept per process, scrape every worker process separately.
+
+import bisect
+import contextvars
+import hmac
+import random
+import threading
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+# Timings of the request being handled, None when it isn't sampled
+# Context variables follow the request into sync_to_async threads
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.view_started = None
+        self.view_time = None
+        self.render_started = None
+        self.render_time = None
+        self.total_time = None
+        # Dashboard sections run queries from several threads
+        self.lock = threading.Lock()
+
+    def add_query(self, duration):
+        with self.lock:
+            self.queries += 1
+            self.db_time += duration
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper adding the query to the timings of the current request
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(time.perf_counter() - start)
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+# Connections are per thread, wrap every one as it's opened
+connection_created.connect(install_query_recorder)
+
+class TimedSerializerMixin:
+    """
+    Serializer mixin adding the time spent serializing and validating to the
+    request timings; nested serializers are counted once, in their parent
+    """
+
+    def _timed(self, method, *args):
+        metrics = _current.get()
+        if metrics is None or metrics.serializer_depth:
+            return method(*args)
+        metrics.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            metrics.serializer_time += time.perf_counter() - start
+            metrics.serializer_depth -= 1
+
+    def to_representation(self, instance):
+        return self._timed(super().to_representation, instance)
+
+    def run_validation(self, *args):
+        return self._timed(super().run_validation, *args)
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+class MetricsRegistry:
+    """
+    Per (route, method) histograms of the sampled requests
+    """
+    HISTOGRAMS = {
+        'silsp_request_duration_seconds': ('Time to handle the request', SECONDS_BUCKETS),
+        'silsp_view_duration_seconds': ('Time spent in the view', SECONDS_BUCKETS),
+        'silsp_db_duration_seconds': ('Time spent running SQL queries', SECONDS_BUCKETS),
+        'silsp_serializer_duration_seconds': ('Time spent in serializers', SECONDS_BUCKETS),
+        'silsp_db_queries': ('SQL queries per request', QUERY_BUCKETS),
+    }
+
+    COUNTERS = {
+        'silsp_analytics_cache_total': 'Analytics and report response cache lookups by result',
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.responses = {}
+        self.counters = {}
+
+    def increment(self, name, **labels):
+        """
+        Add one to a counter, counted for every request (not only the sampled ones)
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+    def observe(self, route, method, status, values):
+        labels = (route, method)
+        with self.lock:
+            for name, value in values.items():
+                histogram = self.histograms.get((name, labels))
+                if histogram is None:
+                    histogram = self.histograms[(name, labels)] = Histogram(self.HISTOGRAMS[name][1])
+                histogram.observe(value)
+            key = labels + (str(status),)
+            self.responses[key] = self.responses.get(key, 0) + 1
+
+    def render(self):
+        """
+        The metrics in the Prometheus text exposition format
+        """
+        lines = [
+            '# HELP silsp_responses_total Sampled responses by route, method and status',
+            '# TYPE silsp_responses_total counter',
+        ]
+        with self.lock:
+            for (route, method, status), count in sorted(self.responses.items()):
+                lines.append(f'silsp_responses_total{{route="{route}",method="{method}",status="{status}"}} {count}')
+            for name, description in self.COUNTERS.items():
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} counter')
+                for (counter_name, labels), count in sorted(self.counters.items()):
+                    if counter_name == name:
+                        label_text = ','.join(f'{label}="{value}"' for label, value in labels)
+                        lines.append(f'{name}{{{label_text}}} {count}')
+            for name, (description, buckets) in self.HISTOGRAMS.items():
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} histogram')
+                for (histogram_name, (route, method)), histogram in sorted(self.histograms.items()):
+                    if histogram_name != name:
+                        continue
+                    labels = f'route="{route}",method="{method}"'
+                    cumulative = 0
+                    for bound, count in zip(buckets + ('+Inf',), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_sum{{{labels}}} {histogram.total:.6f}')
+                    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+registry = MetricsRegistry()
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+class PerformanceMetricsMiddleware:
+    """
+    Times PERFORMANCE_METRICS_SAMPLE_RATE of the requests (0 turns it off,
+    then the only cost is the rate check and a context variable read per query)
+    Sync and async capable, so under ASGI async views and the change feed
+    aren't adapted to sync because of it
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = self.start(request)
+        if metrics is None:
+            return self.get_response(request)
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = self.start(request)
+        if metrics is None:
+            return await self.get_response(request)
+        # Set around the await, sync_to_async threads of the request copy the context
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def start(self, request):
+        """
+        Timings of the request, None when it isn't sampled
+        """
+        sample_rate = getattr(settings, 'PERFORMANCE_METRICS_SAMPLE_RATE', 0)
+        if not sample_rate or (sample_rate < 1 and random.random() >= sample_rate) or request.path == METRICS_PATH:
+            return None
+        metrics = RequestMetrics()
+        # Also read by the benchmark runner (silsp/benchmark.py)
+        request.performance_metrics = metrics
+        # The connection of this thread may predate the connection_created hook
+        install_query_recorder(connection)
+        return metrics
+
+    def finish(self, request, response, metrics):
+        total = metrics.total_time = time.perf_counter() - metrics.started
+        if metrics.view_time is None and metrics.view_started is not None:
+            metrics.view_time = (metrics.render_started or time.perf_counter()) - metrics.view_started
+        self.add_server_timing(response, metrics, total)
+        registry.observe(route_name(request), request.method, response.status_code, {
+            'silsp_request_duration_seconds': total,
+            'silsp_view_duration_seconds': metrics.view_time or 0.0,
+            'silsp_db_duration_seconds': metrics.db_time,
+            'silsp_serializer_duration_seconds': metrics.serializer_time,
+            'silsp_db_queries': metrics.queries,
+        })
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns, time both apart
+        metrics = _current.get()
+        if metrics is not None and metrics.view_started is not None:
+            metrics.render_started = time.perf_counter()
+            metrics.view_time = metrics.render_started - metrics.view_started
+
+            def rendered(response):
+                metrics.render_time = time.perf_counter() - metrics.render_started
+            response.add_post_render_callback(rendered)
+        return response
+
+    @staticmethod
+    def add_server_timing(response, metrics, total):
+        entries = [
+            f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries"',
+            f'serializer;dur={metrics.serializer_time * 1000:.1f}',
+        ]
+        if metrics.view_time is not None:
+            entries.append(f'view;dur={metrics.view_time * 1000:.1f}')
+        if metrics.render_time is not None:
+            entries.append(f'render;dur={metrics.render_time * 1000:.1f}')
+        entries.append(f'total;dur={total * 1000:.1f}')
+        response['Server-Timing'] = ', '.join(entries)
+
+METRICS_PATH = '/api/_metrics'
+
+def metrics_view(request):
+    """
+    GET /api/_metrics
+    Prometheus scrape endpoint, needs `Authorization: Bearer <METRICS_TOKEN>`
+    (or, with METRICS_ALLOW_LOCALHOST, a request from localhost)
+    """
+    expected = getattr(settings, 'METRICS_TOKEN', '')
+    header = request.headers.get('Authorization', '')
+    authorized = bool(expected) and hmac.compare_digest(header.encode(), f'Bearer {expected}'.encode())
+    local = (
+        getattr(settings, 'METRICS_ALLOW_LOCALHOST', False) and request.META.get('REMOTE_ADDR') in ('127.0.0.1', '::1')
+    )
+    if not (authorized or local):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,178 @@
+# Mixins shared by the viewsets of all apps
+
+import csv
+import io
+from django.db import transaction
+from django.db.models import Prefetch
+from rest_framework.decorators import action
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.response import Response
+
+class OptimizedQuerysetMixin:
+    """
+    Viewset mixin applying select_related/prefetch_related to the queryset,
+    so list endpoints run a constant number of queries whatever the number of rows
+    Relations and columns of fields dropped by a SparseFieldsMixin serializer
+    are neither joined, prefetched nor loaded
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    def get_selected_fields(self):
+        serializer_class = self.get_serializer_class()
+        if not hasattr(serializer_class, 'selected_fields'):
+            return None
+        return serializer_class.selected_fields(self.request, getattr(self, 'action', None))
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        selected = self.get_selected_fields()
+
+        def wanted(lookup):
+            if isinstance(lookup, Prefetch):
+                lookup = lookup.prefetch_through
+            return selected is None or lookup.split('__')[0] in selected
+
+        select_related = [lookup for lookup in self.select_related_fields if wanted(lookup)]
+        prefetch_related = [lookup for lookup in self.prefetch_related_fields if wanted(lookup)]
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+
+        if selected is not None:
+            # Skip the columns of dropped fields, except those the paginator orders on
+            concrete = {field.name for field in queryset.model._meta.concrete_fields}
+            ordering = {name.lstrip('-') for name in getattr(self.pagination_class, 'ordering', ()) or ()}
+            serializer_fields = self.get_serializer_class().Meta.fields
+            deferred = [
+                name for name in serializer_fields
+                if name in concrete and name not in selected and name not in ordering
+                and name != queryset.model._meta.pk.name
+            ]
+            if deferred:
+                queryset = queryset.defer(*deferred)
+        return queryset
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin selecting the fields of GET responses with
+    ?fields=a,b (only these) and ?omit=c (all but these)
+    Meta.list_fields, when declared, is the default of the list action
+    when neither parameter is given
+    """
+
+    @staticmethod
+    def parse_field_names(value, param, all_fields):
+        names = {name.strip() for name in value.split(',') if name.strip()}
+        unknown = sorted(names - set(all_fields))
+        if unknown:
+            raise ValidationError({
+                param: f'Unknown fields: {", ".join(unknown)}. Use any of: {", ".join(all_fields)}.'
+            })
+        return names
+
+    @classmethod
+    def selected_fields(cls, request, action=None):
+        """
+        Names of the fields to serialize for this request, or None for all of them
+        Raises ValidationError for names the serializer doesn't have
+        """
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return None
+
+        all_fields = list(cls.Meta.fields)
+        requested = request.query_params.get('fields')
+        omitted = request.query_params.get('omit')
+        list_fields = getattr(cls.Meta, 'list_fields', None)
+
+        if requested:
+            requested = cls.parse_field_names(requested, 'fields', all_fields)
+            selected = [name for name in all_fields if name in requested]
+        elif omitted:
+            selected = all_fields
+        elif action == 'list' and list_fields:
+            selected = list(list_fields)
+        else:
+            return None
+
+        if omitted:
+            omitted = cls.parse_field_names(omitted, 'omit', all_fields)
+            selected = [name for name in selected if name not in omitted]
+        return selected
+
+    def get_fields(self):
+        fields = super().get_fields()
+        view = self.context.get('view')
+        selected = self.selected_fields(self.context.get('request'), getattr(view, 'action', None))
+        if selected is None:
+            return fields
+        return {name: field for name, field in fields.items() if name in selected}
+
+class BulkImportMixin:
+    """
+    Viewset mixin adding POST <list url>/bulk/, importing a JSON array of
+    objects or a CSV upload (multipart field 'file') with a header row
+    Rows are validated with bulk_serializer_class and written in batches,
+    each batch in one transaction through perform_bulk_write
+    Invalid rows are skipped and reported with their 1-based row number
+    """
+    bulk_serializer_class = None
+    bulk_batch_size = 500
+
+    def get_bulk_rows(self, request):
+        upload = request.FILES.get('file')
+        if upload is not None:
+            try:
+                text = io.TextIOWrapper(upload.file, encoding='utf-8-sig')
+                return list(csv.DictReader(text))
+            except (UnicodeDecodeError, csv.Error) as e:
+                raise ParseError(f'Invalid CSV file: {e}')
+        if not isinstance(request.data, list):
+            raise ParseError('Expected a JSON array of objects or a CSV file upload.')
+        return request.data
+
+    def get_bulk_context(self, rows):
+        """
+        Serializer context of one batch, the place to preload what validation needs
+        """
+        return self.get_serializer_context()
+
+    def perform_bulk_write(self, rows):
+        """
+        Write the validated rows of one batch, returns (created, updated)
+        """
+        raise NotImplementedError
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        rows = self.get_bulk_rows(request)
+        created = updated = 0
+        errors = []
+
+        for start in range(0, len(rows), self.bulk_batch_size):
+            batch = rows[start:start + self.bulk_batch_size]
+            context = self.get_bulk_context(batch)
+            valid = []
+            for number, row in enumerate(batch, start=start + 1):
+                if not isinstance(row, dict):
+                    errors.append({'row': number, 'errors': {'non_field_errors': ['Expected an object.']}})
+                    continue
+                serializer = self.bulk_serializer_class(data=row, context=context)
+                if serializer.is_valid():
+                    valid.append(serializer.validated_data)
+                else:
+                    errors.append({'row': number, 'errors': serializer.errors})
+
+            if valid:
+                with transaction.atomic():
+                    batch_created, batch_updated = self.perform_bulk_write(valid)
+                created += batch_created
+                updated += batch_updated
+
+        return Response({
+            'received': len(rows),
+            'created': created,
+            'updated': updated,
+            'errors': errors,
+        })
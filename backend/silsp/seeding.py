@@ -0,0 +1,173 @@
+# Synthetic datasets for benchmarks, query budget tests and load tests
+# Rows are bulk inserted (no per-row signals), the derived analytics tables
+# are rebuilt once at the end
+
+import io
+import math
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+from analytics.cache import TRACKED_TABLES, bump_data_version
+from equipment.models import Equipment
+from tickets.models import Comment, Ticket, TicketStatusEvent
+from users.models import User
+
+# Scales of the benchmarks, by number of tickets
+SCALES = {'1k': 1_000, '10k': 10_000, '100k': 100_000}
+
+STATUS_WEIGHTS = {'resolved': 0.65, 'in_progress': 0.15, 'open': 0.20}
+# Issue categories reported for each equipment type, with their weights
+ISSUE_CATEGORIES = {
+    'pc': {'Hardware Issue': 0.35, 'Software Issue': 0.35, 'Network Issue': 0.15, 'Peripheral Issue': 0.15},
+    'printer': {'Paper Jam': 0.4, 'Toner/Ink': 0.3, 'Hardware Issue': 0.2, 'Network Issue': 0.1},
+    'projector': {'Lamp Failure': 0.4, 'Display Issue': 0.35, 'Hardware Issue': 0.25},
+    'router': {'Network Issue': 0.7, 'Hardware Issue': 0.2, 'Power Issue': 0.1},
+    'ups': {'Battery Failure': 0.6, 'Power Issue': 0.3, 'Hardware Issue': 0.1},
+}
+# Share of each type in a school's inventory
+TYPE_WEIGHTS = {'pc': 0.6, 'printer': 0.1, 'projector': 0.15, 'router': 0.05, 'ups': 0.1}
+LOCATIONS = ('Lab 1', 'Lab 2', 'Lab 3', 'Library', 'Staff Room', 'Office', 'Classroom')
+DEFAULT_PASSWORD = 'bench-password'
+
+def school_name(index):
+    return f'School {index + 1:03d}'
+
+def student_username(school, index):
+    return f'student{school + 1:03d}_{index + 1}'
+
+def technician_username(school):
+    return f'tech{school + 1:03d}'
+
+@contextmanager
+def keep_timestamps(*fields):
+    """
+    Let bulk_create store the given auto_now/auto_now_add values instead of now
+    """
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+def _weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+def seed_dataset(tickets, schools=10, equipment=None, students_per_school=5, comments_per_ticket=0.5,
+                 days=365, password=DEFAULT_PASSWORD, seed=0, batch_size=2000):
+    """
+    Insert a school district with `tickets` tickets:
+    a technician and students_per_school students per school, equipment of
+    every type (tickets // 4 by default, a few pieces fail much more often
+    than the rest), tickets of the last `days` days with realistic statuses,
+    categories and resolution times, their status events, and comments
+    Returns the number of rows created per model
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    equipment = equipment or max(tickets // 4, schools * len(TYPE_WEIGHTS))
+    # Hashing is slow, every seeded user shares one hash
+    password_hash = make_password(password)
+
+    with transaction.atomic():
+        technicians = User.objects.bulk_create([
+            User(username=technician_username(school), password=password_hash, role='technician',
+                 school=school_name(school))
+            for school in range(schools)
+        ], batch_size=batch_size)
+        students = User.objects.bulk_create([
+            User(username=student_username(school, index), password=password_hash, role='user',
+                 school=school_name(school))
+            for school in range(schools) for index in range(students_per_school)
+        ], batch_size=batch_size)
+
+        inventory = []
+        for index in range(equipment):
+            # Every school has every type, the rest follows TYPE_WEIGHTS
+            school = index % schools
+            equipment_type = (
+                list(TYPE_WEIGHTS)[index // schools] if index < schools * len(TYPE_WEIGHTS)
+                else _weighted(rng, TYPE_WEIGHTS)
+            )
+            inventory.append(Equipment(
+                type=equipment_type, serial_number=f'BENCH-{equipment_type.upper()}-{index + 1:07d}',
+                location=rng.choice(LOCATIONS), school=school_name(school), is_working=rng.random() > 0.08,
+            ))
+        inventory = Equipment.objects.bulk_create(inventory, batch_size=batch_size)
+        # Heavy tailed failure rates
+        failure_weights = list(accumulate(rng.paretovariate(1.5) for _ in inventory))
+        reporters = {school_name(school): [] for school in range(schools)}
+        for user in technicians + students:
+            reporters[user.school].append(user)
+        technician_of = {user.school: user for user in technicians}
+
+        rows = []
+        for _ in range(tickets):
+            item = rng.choices(inventory, cum_weights=failure_weights)[0]
+            created_at = now - timedelta(seconds=rng.uniform(0, days * 86400))
+            status = _weighted(rng, STATUS_WEIGHTS)
+            # Turnaround: a few hours to a few weeks, around two days
+            turnaround = timedelta(seconds=min(rng.lognormvariate(math.log(2 * 86400), 1.0), 60 * 86400))
+            resolved_at = min(created_at + turnaround, now) if status == 'resolved' else None
+            rows.append(Ticket(
+                equipment=item, issue_category=_weighted(rng, ISSUE_CATEGORIES[item.type]),
+                description=f'{item.type} in {item.location} needs attention', status=status,
+                created_by=rng.choice(reporters[item.school]),
+                assigned_to=technician_of[item.school] if status != 'open' else None,
+                created_at=created_at, updated_at=resolved_at or created_at, resolved_at=resolved_at,
+            ))
+        with keep_timestamps(Ticket._meta.get_field('created_at'), Ticket._meta.get_field('updated_at')):
+            rows = Ticket.objects.bulk_create(rows, batch_size=batch_size)
+
+        events = []
+        comments = []
+        for ticket in rows:
+            events.append(TicketStatusEvent(
+                ticket=ticket, from_status='', to_status='open', changed_by=ticket.created_by,
+                changed_at=ticket.created_at,
+            ))
+            if ticket.status != 'open':
+                events.append(TicketStatusEvent(
+                    ticket=ticket, from_status='open', to_status=ticket.status, changed_by=ticket.assigned_to,
+                    changed_at=ticket.resolved_at or ticket.created_at + timedelta(hours=rng.uniform(1, 48)),
+                ))
+            # Poisson distributed number of comments
+            for _ in range(_poisson(rng, comments_per_ticket)):
+                comments.append(Comment(
+                    ticket=ticket, user=rng.choice((ticket.created_by, technician_of[ticket.equipment.school])),
+                    text='Any update on this?' if rng.random() < 0.5 else 'Checked, waiting for parts.',
+                    timestamp=min(ticket.created_at + timedelta(hours=rng.uniform(0, 72)), now),
+                ))
+        TicketStatusEvent.objects.bulk_create(events, batch_size=batch_size)
+        with keep_timestamps(Comment._meta.get_field('timestamp')):
+            Comment.objects.bulk_create(comments, batch_size=batch_size)
+
+        # Derived analytics tables, as the signals would have kept them
+        output = io.StringIO()
+        call_command('rebuild_ticket_rollups', stdout=output)
+        call_command('rebuild_turnaround_sketches', stdout=output)
+        call_command('rebuild_equipment_health', stdout=output)
+        bump_data_version(*TRACKED_TABLES)
+
+    return {
+        'users': len(technicians) + len(students),
+        'equipment': len(inventory),
+        'tickets': len(rows),
+        'status_events': len(events),
+        'comments': len(comments),
+    }
+
+def _poisson(rng, mean):
+    # Knuth's method, fine for small means
+    limit, count, product = math.exp(-mean), 0, rng.random()
+    while product > limit:
+        count += 1
+        product *= rng.random()
+    return count
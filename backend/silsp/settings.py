@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -47,6 +48,8 @@ INSTALLED_APPS = [
     ]
 
 MIDDLEWARE = [
+    # Outermost so its request time covers the other middleware
+    'silsp.metrics.PerformanceMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -56,6 +59,14 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
+# Share of the requests timed by PerformanceMetricsMiddleware (0 to 1, 0 turns it off)
+# Timed responses get a Server-Timing header and are counted in GET /api/_metrics
+PERFORMANCE_METRICS_SAMPLE_RATE = float(os.environ.get('SILSP_METRICS_SAMPLE_RATE', 0))
+# Bearer token of the Prometheus scraper, /api/_metrics is refused without one
+METRICS_TOKEN = os.environ.get('SILSP_METRICS_TOKEN', '')
+# Serve /api/_metrics to localhost without the token (development only: behind
+# a reverse proxy on the same host every request comes from localhost)
+METRICS_ALLOW_LOCALHOST = os.environ.get('SILSP_METRICS_ALLOW_LOCALHOST') == '1'
 CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -89,6 +100,10 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'silsp.wsgi.application'
+ASGI_APPLICATION = 'silsp.asgi.application'
+
+# Pub/sub behind the change feed, the local broker needs no external service
+EVENT_BROKER = 'tickets.events.LocalBroker'
 
 
 # Database
@@ -101,6 +116,88 @@ DATABASES = {
     }
 }
 
+# Production SQLite mode, enabled with SILSP_SQLITE_TUNED=1:
+#   WAL journal       - readers no longer block the writer and vice versa
+#   timeout           - wait up to 20s for the write lock instead of failing
+#                       with 'database is locked' (sqlite3's busy timeout)
+#   IMMEDIATE         - transactions take the write lock up front, so the busy
+#                       timeout applies (a read lock upgraded mid-transaction fails at once)
+#   synchronous=NORMAL, mmap and a larger page cache for faster reads and commits
+#   persistent connections so the pragmas are paid once per connection
+# Run `manage.py sqlite_maintenance --interval 3600` next to the server to keep
+# the planner statistics fresh and the file compact.
+if os.environ.get('SILSP_SQLITE_TUNED') == '1':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA mmap_size=268435456;'
+                'PRAGMA cache_size=-65536;'
+                'PRAGMA temp_store=MEMORY;'
+            ),
+        },
+    })
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Analytics/report results are cached in the 'analytics' cache, keyed on the
+# data version (see analytics/cache.py). Pick the backend with SILSP_CACHE_BACKEND:
+#   locmem (default) - per process memory
+#   file             - shared by all workers on this host
+#   db               - shared through the database (run `manage.py createcachetable`)
+
+ANALYTICS_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'silsp-analytics',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'analytics',
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'analytics_cache',
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'analytics': {
+        **ANALYTICS_CACHE_BACKENDS[os.environ.get('SILSP_CACHE_BACKEND', 'locmem')],
+        # Entries also expire so time based scores (days since last issue) stay fresh
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            # Size bound: a third of the entries are evicted when full
+            'MAX_ENTRIES': 1000,
+            'CULL_FREQUENCY': 3,
+        },
+    },
+}
+
+ANALYTICS_CACHE_ALIAS = 'analytics'
+
+# Seconds the shared analytics snapshot (analytics/snapshot.py) is reused across requests
+ANALYTICS_SNAPSHOT_TTL = 60
+
+# Background analytics jobs (?async=1), run by `manage.py analytics_worker`
+# Seconds finished job results are kept, and after which a running job is
+# considered lost (worker died) and retried
+ANALYTICS_JOB_RESULT_TTL = 3600
+ANALYTICS_JOB_TIMEOUT = 600
+
+# Worker processes computing district-wide health/predictions/schedules one
+# school at a time (analytics/parallel.py), 0 computes everything in the request
+ANALYTICS_PARALLEL_WORKERS = int(os.environ.get('SILSP_ANALYTICS_WORKERS', 0))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -147,7 +244,8 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWTAuthentication reading the user from the token claims
+        'users.authentication.ClaimsJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -157,6 +255,13 @@ REST_FRAMEWORK = {
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=25),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
+    # Tokens carry the role and school of the user
+    'TOKEN_OBTAIN_SERIALIZER': 'users.serializers.ClaimsTokenObtainPairSerializer',
 }
 
+# Users authenticated from token claims are re-read from the database after
+# this many seconds (role changes and deactivation take effect by then)
+AUTH_USER_CACHE_TTL = int(os.environ.get('SILSP_AUTH_USER_CACHE_TTL', 60))
+AUTH_USER_CACHE_SIZE = 4096
+
 
@@ -0,0 +1,56 @@
+# Maintenance of the SQLite database file, run next to the server:
+#   PRAGMA optimize (or ANALYZE) - keeps the planner statistics fresh
+#   incremental_vacuum           - reclaims a bounded number of free pages per run,
+#                                  once the file uses incremental auto vacuum
+#   wal_checkpoint(TRUNCATE)     - keeps the WAL file from growing between checkpoints
+# Used by `manage.py sqlite_maintenance`
+
+import time
+from dataclasses import dataclass
+from django.db import connection
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+@dataclass
+class MaintenanceResult:
+    free_pages: int
+    reclaimed: int
+    checkpointed: bool
+    seconds: float
+
+def pragma(cursor, statement):
+    cursor.execute(f'PRAGMA {statement}')
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def enable_incremental_auto_vacuum():
+    """
+    Switch the database to incremental auto vacuum, returns False when it already is
+    The mode only takes effect after a VACUUM, which rewrites the file and can't
+    run in a transaction
+    """
+    with connection.cursor() as cursor:
+        if pragma(cursor, 'auto_vacuum') == AUTO_VACUUM_INCREMENTAL:
+            return False
+        cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        cursor.execute('VACUUM')
+    return True
+
+def run_maintenance(analyze=False, vacuum_pages=1000):
+    started = time.monotonic()
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE' if analyze else 'PRAGMA optimize')
+
+        free_pages = pragma(cursor, 'freelist_count')
+        reclaimed = 0
+        if pragma(cursor, 'auto_vacuum') == AUTO_VACUUM_INCREMENTAL and free_pages:
+            # execute() steps the pragma once, freeing a single page
+            cursor.executescript(f'PRAGMA incremental_vacuum({int(vacuum_pages)})')
+            reclaimed = free_pages - pragma(cursor, 'freelist_count')
+
+        checkpointed = pragma(cursor, 'journal_mode') == 'wal'
+        if checkpointed:
+            cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            cursor.fetchall()
+
+    return MaintenanceResult(free_pages, reclaimed, checkpointed, time.monotonic() - started)
@@ -0,0 +1,303 @@
+import asyncio
+import io
+import re
+import threading
+from collections import Counter
+from unittest.mock import patch
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer
+from django.db import connection, transaction
+from django.test import LiveServerTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.testcases import LiveServerThread
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from analytics import dashboard_views
+from equipment.models import Equipment
+from silsp.benchmark import bench_requests, clear_caches, uncovered_routes
+from silsp.loadtest import LoadConfig, loadtest_users, run_load
+from silsp.metrics import MetricsRegistry
+from silsp.seeding import DEFAULT_PASSWORD, school_name, seed_dataset, technician_username
+from silsp.sqlite import pragma
+from tickets.models import Ticket
+from users.authentication import user_cache
+from users.models import User
+from users.serializers import ClaimsTokenObtainPairSerializer
+
+# Most queries a request may run, by benchmark request name (default: DEFAULT_BUDGET)
+DEFAULT_BUDGET = 4
+QUERY_BUDGETS = {
+    'preventive maintenance': 6,
+    'preventive maintenance (school)': 6,
+    'equipment health': 5,
+    'equipment health (school)': 5,
+    'issue patterns': 9,
+    'issue patterns (school)': 9,
+    'maintenance schedule': 5,
+    'maintenance schedule (school)': 5,
+    'maintenance budget': 6,
+    'maintenance budget (school)': 6,
+}
+# Budgeted requests, writes are left out
+BUDGETED_TAGS = {'list', 'detail', 'report', 'analytics'}
+
+def normalize(sql):
+    # The same statement with other parameters, e.g. once per row
+    return re.sub(r"\b\d+\b|'[^']*'", '?', sql)
+
+class QueryBudgetTests(TestCase):
+    """
+    Every list, detail, report and analytics endpoint runs a bounded number
+    of queries, the same whatever the number of tickets (no N+1 queries)
+    """
+    SIZES = (20, 120)
+
+    def measure(self, tickets):
+        """
+        {request name: (status, captured queries)} on a dataset of `tickets` tickets
+        """
+        results = {}
+        # Rolled back afterwards, so each size starts from an empty database
+        with transaction.atomic():
+            seed_dataset(tickets, schools=2, students_per_school=2, seed=tickets)
+            user_cache.clear()
+            technician = User.objects.get(username=technician_username(0))
+            client = APIClient()
+            token = ClaimsTokenObtainPairSerializer.get_token(technician).access_token
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+            for request in bench_requests():
+                if not BUDGETED_TAGS & set(request.tags):
+                    continue
+                clear_caches()
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(request.path)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                results[request.name] = (response.status_code, [query['sql'] for query in queries])
+            transaction.set_rollback(True)
+        return results
+
+    def format_queries(self, queries, limit=25):
+        repeated = Counter(normalize(sql) for sql in queries)
+        lines = [f'{index}. {sql}' for index, sql in enumerate(queries[:limit], start=1)]
+        if len(queries) > limit:
+            lines.append(f'... and {len(queries) - limit} more')
+        statement, count = repeated.most_common(1)[0] if queries else ('', 0)
+        if count > 1:
+            lines.append(f'\nRun {count} times with different parameters:\n{statement}')
+        return '\n'.join(lines)
+
+    def test_query_budgets(self):
+        small, large = (self.measure(size) for size in self.SIZES)
+        self.assertTrue(small)
+        for name, (status, queries) in large.items():
+            with self.subTest(request=name):
+                small_status, small_queries = small[name]
+                self.assertEqual(status, 200, name)
+                budget = QUERY_BUDGETS.get(name, DEFAULT_BUDGET)
+                self.assertLessEqual(
+                    len(queries), budget,
+                    f'{name} ran {len(queries)} queries, over its budget of {budget}:\n{self.format_queries(queries)}'
+                )
+                self.assertEqual(
+                    len(queries), len(small_queries),
+                    f'{name} ran {len(small_queries)} queries with {self.SIZES[0]} tickets but {len(queries)} '
+                    f'with {self.SIZES[1]}:\n{self.format_queries(queries)}'
+                )
+
+    def test_every_route_covered(self):
+        # New endpoints must be added to silsp.benchmark.bench_requests
+        seed_dataset(5, schools=1, students_per_school=1)
+        self.assertEqual(uncovered_routes(), [])
+
+class SerializedWSGIServer(ThreadedWSGIServer):
+    # The live server threads share the in-memory test database connection,
+    # handle one request at a time (connections are still concurrent)
+    lock = threading.Lock()
+
+    def set_app(self, application):
+        def serialized(environ, start_response):
+            with self.lock:
+                return application(environ, start_response)
+        super().set_app(serialized)
+
+class SerializedLiveServerThread(LiveServerThread):
+    server_class = SerializedWSGIServer
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoadTestTests(LiveServerTestCase):
+    """
+    The load generator drives a real server over HTTP
+    """
+    server_thread_class = SerializedLiveServerThread
+
+    def test_run_load(self):
+        seed_dataset(20, schools=1, students_per_school=1)
+        school = school_name(0)
+        results = run_load(LoadConfig(
+            url=self.live_server_url, users=loadtest_users(2, 1, [school], DEFAULT_PASSWORD),
+            duration=2, ramp_up=0, think_time=0.2, poll_interval=0.5,
+            equipment={school: list(Equipment.objects.values_list('id', flat=True))},
+            ticket_ids=list(Ticket.objects.values_list('id', flat=True)),
+        ))
+        self.assertEqual(results['actions']['login']['statuses'], {'200': 3})
+        self.assertEqual(results['actions']['register']['statuses'], {'201': 3})
+        self.assertGreater(results['actions']['equipment poll']['requests'], 3)
+        self.assertEqual(results['total']['errors'], 0, results)
+
+class PerformanceMetricsTests(TestCase):
+    """
+    Sampled requests get a Server-Timing header and are counted in the registry
+    """
+
+    def setUp(self):
+        seed_dataset(10, schools=1, students_per_school=1)
+        user = User.objects.get(username=technician_username(0))
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        self.token = str(ClaimsTokenObtainPairSerializer.get_token(user).access_token)
+
+    @override_settings(PERFORMANCE_METRICS_SAMPLE_RATE=1)
+    def test_server_timing(self):
+        self.assertFalse(settings.DEBUG)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/equipment/')
+        metrics = response.wsgi_request.performance_metrics
+        # Counted by the execute wrapper, DEBUG query logging is off
+        self.assertEqual(metrics.queries, len(queries))
+        self.assertGreater(metrics.serializer_time, 0)
+        timing = response['Server-Timing']
+        self.assertRegex(timing, rf'^db;dur=[\d.]+;desc="{len(queries)} queries", serializer;dur=[\d.]+, ')
+        self.assertRegex(timing, r'view;dur=[\d.]+, render;dur=[\d.]+, total;dur=[\d.]+$')
+
+    @override_settings(PERFORMANCE_METRICS_SAMPLE_RATE=0)
+    def test_sampling_off(self):
+        response = self.client.get('/api/equipment/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response)
+        self.assertFalse(hasattr(response.wsgi_request, 'performance_metrics'))
+
+    @override_settings(PERFORMANCE_METRICS_SAMPLE_RATE=1)
+    async def test_asgi(self):
+        response = await self.async_client.get('/api/equipment/', headers={'Authorization': f'Bearer {self.token}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="[1-9]\d* queries", ')
+
+        # The async dashboard is awaited by the request's own task: a sync
+        # middleware would adapt the chain, running the view through
+        # sync_to_async/async_to_sync in a task of its own
+        tasks = []
+
+        def parse_sections(value):
+            tasks.append(asyncio.current_task())
+            return parse(value)
+
+        parse = dashboard_views.parse_sections
+        with patch('analytics.dashboard_views.parse_sections', parse_sections):
+            response = await self.async_client.get(
+                '/api/dashboard/', {'sections': 'bogus'}, headers={'Authorization': f'Bearer {self.token}'}
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('total;dur=', response['Server-Timing'])
+        self.assertEqual(tasks, [asyncio.current_task()])
+
+    def test_prometheus_format(self):
+        registry = MetricsRegistry()
+        for queries in (1, 3, 600):
+            registry.observe('ticket-list', 'GET', 200, {'silsp_db_queries': queries})
+        lines = registry.render().splitlines()
+        self.assertIn('silsp_responses_total{route="ticket-list",method="GET",status="200"} 3', lines)
+        self.assertIn('# TYPE silsp_db_queries histogram', lines)
+        buckets = [line for line in lines if line.startswith('silsp_db_queries_bucket')]
+        self.assertEqual(buckets[0], 'silsp_db_queries_bucket{route="ticket-list",method="GET",le="0"} 0')
+        self.assertIn('silsp_db_queries_bucket{route="ticket-list",method="GET",le="5"} 2', buckets)
+        self.assertEqual(buckets[-1], 'silsp_db_queries_bucket{route="ticket-list",method="GET",le="+Inf"} 3')
+        self.assertIn('silsp_db_queries_sum{route="ticket-list",method="GET"} 604.000000', lines)
+        self.assertIn('silsp_db_queries_count{route="ticket-list",method="GET"} 3', lines)
+
+    def test_metrics_endpoint_access(self):
+        client = APIClient()
+        with override_settings(METRICS_TOKEN=''):
+            self.assertEqual(client.get('/api/_metrics').status_code, 403)
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(client.get('/api/_metrics').status_code, 403)
+            response = client.get('/api/_metrics', HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        with override_settings(METRICS_TOKEN='', METRICS_ALLOW_LOCALHOST=True):
+            self.assertEqual(client.get('/api/_metrics').status_code, 200)
+
+class SQLiteMaintenanceTests(TransactionTestCase):
+    """
+    manage.py sqlite_maintenance on the test database, VACUUM can't run in a transaction
+    """
+
+    def setUp(self):
+        self.set_auto_vacuum('NONE')
+        self.add_free_pages()
+
+    def tearDown(self):
+        self.set_auto_vacuum('NONE')
+
+    def set_auto_vacuum(self, mode):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA auto_vacuum={mode}')
+            cursor.execute('VACUUM')
+
+    def add_free_pages(self):
+        # Left behind by a dropped table
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE scratch (data BLOB)')
+            for _ in range(50):
+                cursor.execute('INSERT INTO scratch VALUES (randomblob(4000))')
+            cursor.execute('DROP TABLE scratch')
+
+    def pragma(self, statement):
+        with connection.cursor() as cursor:
+            return pragma(cursor, statement)
+
+    def maintenance(self, *args):
+        stdout = io.StringIO()
+        call_command('sqlite_maintenance', *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_run(self):
+        # Without auto vacuum the free pages are reported but kept
+        free_pages = self.pragma('freelist_count')
+        self.assertGreaterEqual(free_pages, 50)
+        output = self.maintenance()
+        self.assertRegex(output, rf'SQLite maintenance done in [\d.]+s, {free_pages} free pages, 0 reclaimed')
+        self.assertEqual(self.pragma('freelist_count'), free_pages)
+
+        # With it at most --vacuum-pages are reclaimed per run
+        self.set_auto_vacuum('INCREMENTAL')
+        self.add_free_pages()
+        free_pages = self.pragma('freelist_count')
+        self.assertIn(f'{free_pages} free pages, 10 reclaimed', self.maintenance('--vacuum-pages', '10'))
+        self.assertEqual(self.pragma('freelist_count'), free_pages - 10)
+        self.assertIn(f'{free_pages - 10} free pages, {free_pages - 10} reclaimed', self.maintenance())
+        self.assertEqual(self.pragma('freelist_count'), 0)
+
+    def test_analyze(self):
+        User.objects.create_user('tech', password='secret', role='technician', school='North')
+        self.maintenance('--analyze')
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM sqlite_stat1 WHERE tbl = %s', [User._meta.db_table])
+            self.assertGreater(cursor.fetchone()[0], 0)
+
+    def test_enable_auto_vacuum(self):
+        output = self.maintenance('--enable-auto-vacuum')
+        self.assertIn('Enabled incremental auto vacuum', output)
+        self.assertEqual(self.pragma('auto_vacuum'), 2)
+        # The VACUUM switching the mode also dropped the free pages
+        self.assertIn('0 free pages, 0 reclaimed', output)
+
+        output = self.maintenance('--enable-auto-vacuum')
+        self.assertNotIn('Enabled', output)
+        self.assertEqual(self.pragma('auto_vacuum'), 2)
+
+    def test_other_database(self):
+        with patch.object(connection, 'vendor', 'postgresql'):
+            with self.assertRaisesMessage(CommandError, 'only applies to SQLite'):
+                self.maintenance()
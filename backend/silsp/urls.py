@@ -29,8 +29,12 @@ from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
+from silsp.metrics import metrics_view
+from tickets.stream_views import change_feed
+from tickets.export_views import TicketExportView, EquipmentExportView
 from tickets.report_views import MostFrequentIssuesReport, AverageTurnaroundTimeReport, EquipmentStatusReport
-from analytics.views import EquipmentFailurePatternsView, SchoolIssueAnalyticsView, PreventiveMaintenanceView, EquipmentHealthView, IssuePatternsView, PreventiveMaintenanceScheduleView, MaintenanceBudgetView
+from analytics.dashboard_views import dashboard
+from analytics.views import EquipmentFailurePatternsView, SchoolIssueAnalyticsView, PreventiveMaintenanceView, EquipmentHealthView, IssuePatternsView, PreventiveMaintenanceScheduleView, MaintenanceBudgetView, AnalyticsJobView
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet, basename='user')
@@ -44,10 +48,19 @@ urlpatterns = [
     path('api-auth/', include('rest_framework.urls')),  # DRF login/logout
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),         # <-- Add this
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),        # <-- And this
+    # Prometheus metrics of the sampled requests
+    path('api/_metrics', metrics_view, name='metrics'),
+    # Change feed (server-sent events, ASGI only)
+    path('api/events/', change_feed, name='change_feed'),
+    # Streaming exports
+    path('api/exports/tickets.<str:output>', TicketExportView.as_view(), name='export_tickets'),
+    path('api/exports/equipment.<str:output>', EquipmentExportView.as_view(), name='export_equipment'),
     # Reporting endpoints
     path('api/reports/frequent-issues/', MostFrequentIssuesReport.as_view(), name='report_frequent_issues'),
     path('api/reports/turnaround-time/', AverageTurnaroundTimeReport.as_view(), name='report_turnaround_time'),
     path('api/reports/equipment-status/', EquipmentStatusReport.as_view(), name='report_equipment_status'),
+    # Analytics and report sections in one response
+    path('api/dashboard/', dashboard, name='dashboard'),
     # Analytics endpoints
     path('api/analytics/equipment-failure-patterns/', EquipmentFailurePatternsView.as_view(), name='equipment_failure_patterns'),
     path('api/analytics/school-issues/', SchoolIssueAnalyticsView.as_view(), name='school_issues_analytics'),
@@ -56,4 +69,5 @@ urlpatterns = [
     path('api/analytics/issue-patterns/', IssuePatternsView.as_view(), name='issue_patterns'),
     path('api/analytics/maintenance-schedule/', PreventiveMaintenanceScheduleView.as_view(), name='maintenance_schedule'),
     path('api/analytics/maintenance-budget/', MaintenanceBudgetView.as_view(), name='maintenance_budget'),
+    path('api/analytics/jobs/<uuid:job_id>/', AnalyticsJobView.as_view(), name='analytics_job'),
 ]
\ No newline at end of file
@@ -0,0 +1,124 @@
+# In-process pub/sub for the change feed (see stream_views.py)
+# Events are published from model save hooks (see signals.py) and pushed
+# to every connected client; a bounded history lets clients resume from
+# their last event id after a reconnect
+
+import asyncio
+import threading
+from collections import deque
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+class Subscription:
+    """
+    Queue of events for one connected client
+    """
+
+    def __init__(self, broker, loop, max_pending):
+        self.broker = broker
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.overflowed = False
+
+    def deliver(self, event):
+        # Runs in the subscriber's event loop
+        if self.overflowed:
+            # The client reloads its data when it gets the reset, which covers this event
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too slow to keep up: tell the client to reload instead of growing forever
+            self.overflowed = True
+            self.queue.get_nowait()
+            self.queue.put_nowait(self.broker.reset_event())
+
+    async def get(self):
+        event = await self.queue.get()
+        if event['event'] == 'reset':
+            # Deliver the events published after the reset again
+            self.overflowed = False
+        return event
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.broker.unsubscribe(self)
+
+class LocalBroker:
+    """
+    Broker living in the current process, no external service needed
+    Every worker process has its own broker and event ids
+    """
+
+    def __init__(self, history=1000, max_pending=500):
+        self._lock = threading.Lock()
+        self._history = deque(maxlen=history)
+        self._last_id = 0
+        self._subscribers = set()
+        self.max_pending = max_pending
+
+    def reset_event(self):
+        # Sent when the client's events can't be replayed, it must reload its data
+        return {'id': self._last_id, 'event': 'reset', 'data': {}}
+
+    def publish(self, event_type, data):
+        """
+        Publish an event to every subscriber, may be called from any thread
+        """
+        with self._lock:
+            self._last_id += 1
+            event = {'id': self._last_id, 'event': event_type, 'data': data}
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # The subscriber's loop is closed
+                self.unsubscribe(subscription)
+        return event
+
+    def subscribe(self, last_event_id=None):
+        """
+        Subscribe the running event loop; events after last_event_id are replayed
+        """
+        subscription = Subscription(self, asyncio.get_running_loop(), self.max_pending)
+        with self._lock:
+            self._subscribers.add(subscription)
+            if last_event_id is not None:
+                oldest = self._history[0]['id'] if self._history else self._last_id + 1
+                if last_event_id > self._last_id or last_event_id < oldest - 1:
+                    # Ids from another process/restart or older than the history
+                    missed = [self.reset_event()]
+                else:
+                    missed = [event for event in self._history if event['id'] > last_event_id]
+                    if len(missed) > self.max_pending:
+                        # More than the queue holds, the client must reload instead
+                        missed = [self.reset_event()]
+                for event in missed:
+                    subscription.queue.put_nowait(event)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+_broker = None
+_broker_lock = threading.Lock()
+
+def get_broker():
+    """
+    The process wide broker, an instance of settings.EVENT_BROKER
+    """
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(getattr(settings, 'EVENT_BROKER', 'tickets.events.LocalBroker'))()
+        return _broker
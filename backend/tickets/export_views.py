@@ -0,0 +1,94 @@
+import csv
+import json
+from datetime import datetime
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+from analytics.filters import AnalyticsFilters
+
+# Streaming exports of the full ticket and equipment tables
+# Rows are read with a chunked iterator and written as they come, so memory
+# stays constant whatever the table size and the first byte goes out at once
+
+CHUNK_SIZE = 2000
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+class Echo:
+    """
+    File-like object handing back what csv.writer writes
+    """
+    def write(self, value):
+        return value
+
+def cell(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def stream_rows(columns, rows, output):
+    if output == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(columns)
+        lines = []
+        for row in rows:
+            lines.append(writer.writerow([cell(value) for value in row]))
+            if len(lines) >= CHUNK_SIZE:
+                yield ''.join(lines)
+                lines = []
+    else:
+        lines = []
+        for row in rows:
+            lines.append(json.dumps(dict(zip(columns, map(cell, row))), cls=DjangoJSONEncoder) + '\n')
+            if len(lines) >= CHUNK_SIZE:
+                yield ''.join(lines)
+                lines = []
+    if lines:
+        yield ''.join(lines)
+
+def export_response(name, columns, rows, output):
+    if output not in CONTENT_TYPES:
+        raise ValidationError({'output': f'Unsupported export format, use one of: {", ".join(CONTENT_TYPES)}.'})
+    response = StreamingHttpResponse(stream_rows(columns, rows, output), content_type=CONTENT_TYPES[output])
+    response['Content-Disposition'] = f'attachment; filename="{name}.{output}"'
+    return response
+
+class ExportView(APIView):
+    """
+    The format comes from the URL suffix and rows are streamed without a
+    renderer, so any Accept header is served (errors are rendered as JSON)
+    """
+    permission_classes = [IsAuthenticated]
+
+    def perform_content_negotiation(self, request, force=False):
+        # Accept: text/csv would otherwise be answered with 406 Not Acceptable
+        return super().perform_content_negotiation(request, force=True)
+
+class TicketExportView(ExportView):
+    """
+    GET /api/exports/tickets.csv (or .ndjson)?since=&until=&school=&type=
+    """
+    columns = [
+        'id', 'created_at', 'updated_at', 'resolved_at', 'status', 'issue_category', 'description',
+        'equipment_id', 'equipment__type', 'equipment__serial_number', 'equipment__location',
+        'equipment__school', 'created_by__username', 'assigned_to__username',
+    ]
+
+    def get(self, request, output):
+        tickets = AnalyticsFilters.from_request(request).tickets().order_by('created_at', 'id')
+        rows = tickets.values_list(*self.columns).iterator(chunk_size=CHUNK_SIZE)
+        columns = [column.replace('__', '_') for column in self.columns]
+        return export_response('tickets', columns, rows, output)
+
+class EquipmentExportView(ExportView):
+    """
+    GET /api/exports/equipment.csv (or .ndjson)?school=&type=
+    """
+    columns = ['id', 'type', 'serial_number', 'location', 'school', 'is_working']
+
+    def get(self, request, output):
+        equipment = AnalyticsFilters.from_request(request).equipment().order_by('id')
+        rows = equipment.values_list(*self.columns).iterator(chunk_size=CHUNK_SIZE)
+        return export_response('equipment', self.columns, rows, output)
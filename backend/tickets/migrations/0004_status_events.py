@@ -0,0 +1,44 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:25
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_resolved_at(apps, schema_editor):
+    # The last update is the best record of when existing tickets were resolved
+    Ticket = apps.get_model('tickets', 'Ticket')
+    Ticket.objects.filter(status='resolved').update(resolved_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0003_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='resolved_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='TicketStatusEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(blank=True, choices=[('open', 'Open'), ('in_progress', 'In Progress'), ('resolved', 'Resolved')], max_length=20)),
+                ('to_status', models.CharField(choices=[('open', 'Open'), ('in_progress', 'In Progress'), ('resolved', 'Resolved')], max_length=20)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ticket_status_events', to=settings.AUTH_USER_MODEL)),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_events', to='tickets.ticket')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ticket', 'changed_at'], name='status_event_ticket_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_resolved_at, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from users.models import User
 from equipment.models import Equipment
 
@@ -18,9 +19,110 @@ class Ticket(models.Model):
     assigned_to = models.ForeignKey(User, related_name='assigned_tickets', on_delete=models.SET_NULL, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # When the ticket was last moved to resolved, cleared when it's reopened
+    resolved_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Per equipment ticket history in a time window (health scores, predictions)
+            models.Index(fields=['equipment', 'created_at'], name='ticket_equipment_created_idx'),
+            # Time window scans across all equipment (issue patterns, trends)
+            # and the (created_at, id) keyset of the cursor pagination
+            models.Index(fields=['created_at', 'id'], name='ticket_created_id_idx'),
+            # Resolved tickets (turnaround, resolution rate)
+            models.Index(fields=['status', 'created_at'], name='ticket_status_created_idx'),
+            # Grouping by category (most frequent issues)
+            models.Index(fields=['issue_category'], name='ticket_category_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded values so save hooks can see what changed
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    # Stored values compared by the save hooks (status log, analytics rollups and sketches)
+    TRACKED_FIELDS = ('status', 'resolved_at', 'created_at', 'equipment_id', 'issue_category')
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        # The reloaded values are the new baseline (also when a deferred field is loaded)
+        names = {self._meta.get_field(name).attname for name in fields} if fields else None
+        self._loaded_values = {
+            **getattr(self, '_loaded_values', {}),
+            **{
+                field.attname: self.__dict__[field.attname]
+                for field in self._meta.concrete_fields
+                if field.attname in self.__dict__ and (names is None or field.attname in names)
+            },
+        }
+
+    def save(self, *args, **kwargs):
+        loaded = getattr(self, '_loaded_values', {})
+        adding = self._state.adding
+        if not adding:
+            missing = [name for name in self.TRACKED_FIELDS if name not in loaded]
+            if missing:
+                # Loaded with only()/defer() (sparse fields): read what the hooks compare with
+                stored = type(self)._base_manager.filter(pk=self.pk).values(*missing).first()
+                loaded = self._loaded_values = {**loaded, **(stored or {})}
+        previous_status = loaded.get('status') if not adding else None
+        status_changed = adding or ('status' in loaded and previous_status != self.status)
+        if status_changed:
+            if self.status == 'resolved':
+                self.resolved_at = timezone.now()
+            elif previous_status == 'resolved':
+                self.resolved_at = None
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'resolved_at'}
+
+        # Atomic so the status log and the post_save hooks (analytics rollups) commit with the ticket
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if status_changed:
+                TicketStatusEvent.objects.create(
+                    ticket=self,
+                    from_status=previous_status or '',
+                    to_status=self.status,
+                    # Set by the views for updates, see TicketViewSet.perform_update
+                    changed_by=getattr(self, '_changed_by', None) or (self.created_by if adding else None),
+                )
+        # The saved values are the new baseline for the next save hooks
+        self._loaded_values = {
+            field.attname: self.__dict__[field.attname]
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+        }
+
+class TicketStatusEvent(models.Model):
+    """
+    One status change of a ticket, written by Ticket.save
+    from_status is empty for the creation of the ticket
+    """
+    ticket = models.ForeignKey(Ticket, related_name='status_events', on_delete=models.CASCADE)
+    from_status = models.CharField(max_length=20, choices=Ticket.STATUS_CHOICES, blank=True)
+    to_status = models.CharField(max_length=20, choices=Ticket.STATUS_CHOICES)
+    changed_by = models.ForeignKey(User, related_name='ticket_status_events', on_delete=models.SET_NULL, null=True, blank=True)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # History of one ticket in order
+            models.Index(fields=['ticket', 'changed_at'], name='status_event_ticket_idx'),
+        ]
+
+    def __str__(self):
+        return f"Ticket {self.ticket_id}: {self.from_status or 'new'} -> {self.to_status}"
 
 class Comment(models.Model):
     ticket = models.ForeignKey(Ticket, related_name='comments', on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     text = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # (timestamp, id) keyset of the cursor pagination
+            models.Index(fields=['timestamp', 'id'], name='comment_timestamp_id_idx'),
+        ]
@@ -0,0 +1,97 @@
+from django.core.exceptions import ValidationError
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, _reverse_ordering
+from rest_framework.utils.urls import remove_query_param
+
+class TicketCursorPagination(CursorPagination):
+    """
+    Keyset pagination over tickets, newest first
+    Opt in with ?page_size=N; without it the whole list is returned as before
+    The cursor holds the full (created_at, id) position of the last row, so every
+    page is a range scan on the (created_at, id) index: deep pages cost the same
+    as the first one, and rows sharing a timestamp or created while paging never
+    shift, skip or duplicate an item (DRF's cursor only keys on created_at and
+    falls back to an offset for ties)
+    """
+    ordering = ('-created_at', '-id')
+    page_size = None
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor.reverse)
+        position = self.cursor.position if self.cursor else None
+
+        queryset = queryset.order_by(*(_reverse_ordering(self.ordering) if reverse else self.ordering))
+        if position is not None:
+            queryset = self.filter_after(queryset, position, reverse)
+
+        # One extra row tells whether a following page exists
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = position is not None, has_following
+        else:
+            self.has_next, self.has_previous = has_following, position is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def filter_after(self, queryset, position, reverse):
+        """
+        Rows strictly past the (value, id) position in the direction of the query
+        Written as value <=/>= bound minus the tied ids, which SQLite serves as a
+        single range on the composite index
+        """
+        field, tie = (name.lstrip('-') for name in self.ordering[:2])
+        value, _, pk = position.rpartition('|')
+        try:
+            value = queryset.model._meta.get_field(field).to_python(value)
+            pk = queryset.model._meta.get_field(tie).to_python(pk)
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+        if value is None or pk is None:
+            raise NotFound(self.invalid_cursor_message)
+
+        # Descending ordering walked forward, or ascending walked backward
+        if self.ordering[0].startswith('-') != reverse:
+            return queryset.filter(**{f'{field}__lte': value}).exclude(**{field: value, f'{tie}__gte': pk})
+        return queryset.filter(**{f'{field}__gte': value}).exclude(**{field: value, f'{tie}__lte': pk})
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            # An empty backward page: nothing is newer than the cursor, start over
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        position = self._get_position_from_instance(self.page[-1], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        # An empty forward page steps back to the last page
+        position = self._get_position_from_instance(self.page[0], self.ordering) if self.page else None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def _get_position_from_instance(self, instance, ordering):
+        names = [name.lstrip('-') for name in ordering[:2]]
+        if isinstance(instance, dict):
+            values = [instance[name] for name in names]
+        else:
+            values = [getattr(instance, name) for name in names]
+        return '|'.join(str(value) for value in values)
+
+class CommentCursorPagination(TicketCursorPagination):
+    ordering = ('-timestamp', '-id')
@@ -1,37 +1,48 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .models import Ticket
-from equipment.models import Equipment
-from django.db.models import Count, Avg, F, ExpressionWrapper, DurationField
+from django.db.models import Count
 from django.utils import timezone
+from analytics.cache import cached_response
+from analytics.filters import AnalyticsFilters
+from analytics.rollups import ticket_counts
+from analytics.turnaround import turnaround_summary
+
+# The report data, shared with the combined dashboard endpoint
+
+def most_frequent_issues(filters):
+    return sorted(
+        (
+            {'issue_category': row['issue_category'], 'count': row['total']}
+            for row in ticket_counts('issue_category', filters=filters)
+        ),
+        key=lambda row: -row['count'],
+    )
+
+def equipment_status(filters):
+    return list(
+        filters.equipment()
+        .values('is_working')
+        .annotate(count=Count('id'))
+        .order_by('-count')
+    )
 
 class MostFrequentIssuesReport(APIView):
     permission_classes = [IsAuthenticated]
+    @cached_response()
     def get(self, request):
-        data = (
-            Ticket.objects.values('issue_category')
-            .annotate(count=Count('id'))
-            .order_by('-count')
-        )
-        return Response(data)
+        return Response(most_frequent_issues(AnalyticsFilters.from_request(request)))
 
 class AverageTurnaroundTimeReport(APIView):
     permission_classes = [IsAuthenticated]
+    @cached_response()
     def get(self, request):
-        # Only consider resolved tickets
-        resolved_tickets = Ticket.objects.filter(status='resolved', created_at__isnull=False, updated_at__isnull=False)
-        avg_turnaround = resolved_tickets.annotate(
-            turnaround=ExpressionWrapper(F('updated_at') - F('created_at'), output_field=DurationField())
-        ).aggregate(avg_turnaround=Avg('turnaround'))['avg_turnaround']
-        return Response({'average_turnaround_time': avg_turnaround})
+        # Resolved tickets only, from creation to resolution (resolved_at)
+        # Mean and percentiles come from the turnaround sketches
+        return Response(turnaround_summary(AnalyticsFilters.from_request(request)))
 
 class EquipmentStatusReport(APIView):
     permission_classes = [IsAuthenticated]
+    @cached_response()
     def get(self, request):
-        data = (
-            Equipment.objects.values('is_working')
-            .annotate(count=Count('id'))
-            .order_by('-count')
-        )
-        return Response(data) 
\ No newline at end of file
+        return Response(equipment_status(AnalyticsFilters.from_request(request))) 
\ No newline at end of file
@@ -1,15 +1,17 @@
 from rest_framework import serializers
 from .models import Ticket, Comment
 from equipment.models import Equipment
+from silsp.metrics import TimedSerializerMixin
+from silsp.mixins import SparseFieldsMixin
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
 
     class Meta:
         model = Comment
         fields = ['id', 'user', 'ticket', 'text', 'timestamp']
 
-class TicketSerializer(serializers.ModelSerializer):
+class TicketSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     comments = CommentSerializer(many=True, read_only=True)
     created_by = serializers.StringRelatedField(read_only=True)
     assigned_to = serializers.StringRelatedField(read_only=True)
@@ -19,9 +21,11 @@ class TicketSerializer(serializers.ModelSerializer):
         model = Ticket
         fields = [
             'id', 'equipment', 'issue_category', 'description', 'status',
-            'created_by', 'assigned_to', 'created_at', 'updated_at', 'comments'
+            'created_by', 'assigned_to', 'created_at', 'updated_at', 'resolved_at', 'comments'
         ]
-        read_only_fields = ['created_by', 'assigned_to', 'created_at', 'updated_at']
+        read_only_fields = ['created_by', 'assigned_to', 'created_at', 'updated_at', 'resolved_at']
+        # Compact default of the list endpoint, comments are requested with ?fields=
+        list_fields = ['id', 'equipment', 'issue_category', 'status', 'created_at']
 
     def validate_equipment(self, value):
         if not value:
@@ -36,4 +40,20 @@ class TicketSerializer(serializers.ModelSerializer):
     def validate_description(self, value):
         if not value or not value.strip():
             raise serializers.ValidationError("Description is required.")
-        return value.strip() 
\ No newline at end of file
+        return value.strip() 
+
+class TicketBulkSerializer(TicketSerializer):
+    """
+    Validates one row of a bulk import
+    Equipment is looked up once per batch (context['equipment']) instead of once per row
+    """
+    equipment = serializers.IntegerField()
+
+    class Meta(TicketSerializer.Meta):
+        fields = ['equipment', 'issue_category', 'description', 'status']
+
+    def validate_equipment(self, value):
+        equipment = self.context['equipment'].get(value)
+        if equipment is None:
+            raise serializers.ValidationError(f'Invalid pk "{value}" - object does not exist.')
+        return equipment
@@ -0,0 +1,58 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from equipment.models import Equipment
+from .models import Ticket, Comment
+from .events import get_broker
+
+# Publish change feed events once the write is committed
+
+def publish_on_commit(event_type, data):
+    transaction.on_commit(lambda: get_broker().publish(event_type, data))
+
+def publish_bulk_change(event_type, count):
+    """
+    One event for a bulk import instead of one per row, clients reload their data
+    """
+    publish_on_commit(event_type, {'action': 'bulk', 'count': count})
+
+@receiver(post_save, sender=Equipment)
+def equipment_saved(sender, instance, created, **kwargs):
+    publish_on_commit('equipment', {
+        'id': instance.id,
+        'action': 'created' if created else 'updated',
+        'type': instance.type,
+        'serial_number': instance.serial_number,
+        'location': instance.location,
+        'school': instance.school,
+        'is_working': instance.is_working,
+    })
+
+@receiver(post_delete, sender=Equipment)
+def equipment_deleted(sender, instance, **kwargs):
+    publish_on_commit('equipment', {'id': instance.id, 'action': 'deleted'})
+
+@receiver(post_save, sender=Ticket)
+def ticket_saved(sender, instance, created, **kwargs):
+    # Only new tickets and status changes are pushed
+    previous = getattr(instance, '_loaded_values', {}).get('status')
+    if not created and previous == instance.status:
+        return
+    publish_on_commit('ticket_status', {
+        'id': instance.id,
+        'equipment': instance.equipment_id,
+        'status': instance.status,
+        'previous_status': None if created else previous,
+    })
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if not created:
+        return
+    publish_on_commit('comment', {
+        'id': instance.id,
+        'ticket': instance.ticket_id,
+        'user': str(instance.user),
+        'text': instance.text,
+        'timestamp': instance.timestamp.isoformat(),
+    })
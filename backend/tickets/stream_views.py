@@ -0,0 +1,80 @@
+import asyncio
+import json
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from users.authentication import ClaimsJWTAuthentication
+from .events import get_broker
+
+# Server-sent events change feed for equipment, ticket status and comments
+# Needs an ASGI server (silsp/asgi.py), idle connections only hold a queue
+
+TOPICS = {'equipment', 'ticket_status', 'comment'}
+HEARTBEAT_SECONDS = 15
+
+async def authenticate(request, query_token=True):
+    """
+    Authenticate the JWT access token from the Authorization header or,
+    since EventSource can't send headers, from the ?token= parameter
+    (query_token=False for plain fetches, which can send the header)
+    """
+    authentication = ClaimsJWTAuthentication()
+    header = authentication.get_header(request)
+    if header:
+        raw_token = authentication.get_raw_token(header)
+    else:
+        raw_token = request.GET.get('token') if query_token else None
+    if not raw_token:
+        return None
+    try:
+        validated_token = authentication.get_validated_token(raw_token)
+        return await sync_to_async(authentication.get_user)(validated_token)
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        # Also unknown or inactive users
+        return None
+
+def format_event(event):
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+async def event_stream(subscription, topics):
+    async with subscription:
+        # Ask clients to reconnect quickly after a dropped connection
+        yield 'retry: 3000\n\n'
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            if event['event'] == 'reset' or event['event'] in topics:
+                yield format_event(event)
+
+async def change_feed(request):
+    """
+    GET /api/events/?topics=equipment,comment
+    Streams change events; reconnecting clients resume from Last-Event-ID
+    """
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would be held for the whole life of the connection
+        return JsonResponse({'detail': 'The change feed is only served through the ASGI application.'}, status=501)
+
+    user = await authenticate(request)
+    if user is None or not user.is_authenticated:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    topics = TOPICS
+    if request.GET.get('topics'):
+        topics = {topic.strip() for topic in request.GET['topics'].split(',')} & TOPICS
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    subscription = get_broker().subscribe(last_event_id)
+    response = StreamingHttpResponse(event_stream(subscription, topics), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,3 +1,593 @@
+import asyncio
+import csv
+import io
+import json
+import re
+from datetime import timedelta
+from unittest.mock import patch
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from django.utils import timezone
+from django.utils.dateparse import parse_duration
+from equipment.models import Equipment
+from users.models import User
+from users.serializers import ClaimsTokenObtainPairSerializer
+from .events import LocalBroker, get_broker
+from .models import Comment, Ticket, TicketStatusEvent
+from analytics.filters import AnalyticsFilters
+from analytics.models import DailyTicketRollup
+from analytics.rollups import rebuild_rollups
+from analytics.utils import equipment_ticket_features
 
-# Create your tests here.
+class QueryPlanTests(TestCase):
+    """
+    The analytics and report queries must be served from indexes,
+    never from a full scan of the ticket or equipment tables
+    """
+
+    def assertNoFullTableScan(self, queryset):
+        plan = queryset.explain()
+        for line in plan.splitlines():
+            for table in (Ticket._meta.db_table, Equipment._meta.db_table):
+                if f'SCAN {table}' in line and 'INDEX' not in line:
+                    self.fail(f"Full table scan of {table}:\n{plan}\n\nSQL: {queryset.query}")
+        return plan
+
+    def assertSearches(self, queryset, model, index):
+        """
+        The filtered rows of the model's table must be looked up in the index,
+        scanning the whole index (SCAN ... USING INDEX) doesn't count
+        """
+        plan = self.assertNoFullTableScan(queryset)
+        table = model._meta.db_table
+        if not re.search(rf'SEARCH {table} USING (COVERING )?INDEX {index} \(', plan):
+            self.fail(f"{table} is not searched with {index}:\n{plan}\n\nSQL: {queryset.query}")
+
+    def test_ticket_history_of_equipment(self):
+        since = timezone.now() - timedelta(days=180)
+        self.assertSearches(
+            Ticket.objects.filter(equipment_id=1, created_at__gte=since), Ticket, 'ticket_equipment_created_idx'
+        )
+
+    def test_equipment_ticket_features(self):
+        self.assertSearches(equipment_ticket_features(Equipment.objects.all()), Ticket, 'ticket_equipment_created_idx')
+
+    def test_issue_categories_in_window(self):
+        # Grouping of top_issue_categories over the district
+        now = timezone.now()
+        self.assertSearches(
+            Ticket.objects.filter(created_at__gte=now - timedelta(days=90), created_at__lte=now)
+            .values('equipment_id', 'issue_category')
+            .annotate(count=Count('id'))
+            .order_by('equipment_id', '-count', 'issue_category'),
+            Ticket, 'ticket_created_id_idx',
+        )
+        # and over the equipment of a school/type
+        self.assertSearches(
+            Ticket.objects.filter(equipment__in=Equipment.objects.filter(school='North'), created_at__gte=now)
+            .values('equipment_id', 'issue_category')
+            .annotate(count=Count('id')),
+            Ticket, 'ticket_equipment_created_idx',
+        )
+
+    def test_trends(self):
+        since = timezone.now() - timedelta(days=180)
+        self.assertSearches(
+            Ticket.objects.filter(created_at__gte=since)
+            .values(period=TruncMonth('created_at'))
+            .annotate(issue_count=Count('id')),
+            Ticket, 'ticket_created_id_idx',
+        )
+
+    def test_filtered_window(self):
+        filters = AnalyticsFilters(
+            since=timezone.now() - timedelta(days=30), until=timezone.now(), school='North', equipment_type='pc'
+        )
+        tickets = filters.tickets().values('issue_category').annotate(count=Count('id'))
+        self.assertSearches(tickets, Equipment, 'equipment_school_type_idx')
+        self.assertSearches(tickets, Ticket, 'ticket_equipment_created_idx')
+        self.assertSearches(filters.equipment(), Equipment, 'equipment_school_type_idx')
+
+    def test_resolved_turnaround(self):
+        # Turnaround of the resolved tickets in a window (turnaround_summary)
+        for filters in (
+            AnalyticsFilters(since=timezone.now() - timedelta(days=30), until=timezone.now()),
+            AnalyticsFilters(since=timezone.now() - timedelta(days=30), school='North'),
+        ):
+            with self.subTest(school=filters.school):
+                self.assertSearches(
+                    filters.tickets(Ticket.objects.filter(resolved_at__isnull=False))
+                    .values_list('created_at', 'resolved_at'),
+                    Ticket, 'ticket_equipment_created_idx' if filters.school else 'ticket_created_id_idx',
+                )
+
+    def test_most_frequent_issues(self):
+        self.assertNoFullTableScan(Ticket.objects.values('issue_category').annotate(count=Count('id')))
+
+    def test_grouped_by_equipment_attributes(self):
+        since = timezone.now() - timedelta(days=180)
+        for field in ('equipment__type', 'equipment__school', 'equipment__location'):
+            with self.subTest(field=field):
+                self.assertSearches(
+                    Ticket.objects.filter(created_at__gte=since).values(field).annotate(count=Count('id')),
+                    Ticket, 'ticket_equipment_created_idx',
+                )
+                self.assertNoFullTableScan(Ticket.objects.values(field).annotate(count=Count('id')))
+
+    def test_ticket_cursor_page(self):
+        position = timezone.now() - timedelta(days=30)
+        self.assertSearches(
+            Ticket.objects.filter(created_at__lte=position).exclude(created_at=position, id__gte=500)
+            .order_by('-created_at', '-id')[:50],
+            Ticket, 'ticket_created_id_idx',
+        )
+
+    def test_equipment_groupings(self):
+        for field in ('school', 'location', 'type', 'is_working'):
+            with self.subTest(field=field):
+                self.assertNoFullTableScan(Equipment.objects.values(field).annotate(count=Count('id')))
+
+class LocalBrokerTests(TestCase):
+    """
+    Subscribers get every event once, or a reset when they can't
+    """
+
+    def test_overflow_resets_then_resumes(self):
+        async def scenario():
+            broker = LocalBroker(history=10, max_pending=3)
+            subscription = broker.subscribe()
+            for number in range(5):
+                broker.publish('equipment', {'number': number})
+            # Deliveries are scheduled on the loop
+            await asyncio.sleep(0)
+            received = [(await subscription.get())['event'] for _ in range(3)]
+            broker.publish('equipment', {'number': 5})
+            await asyncio.sleep(0)
+            received.append((await asyncio.wait_for(subscription.get(), 1))['data'])
+            return received
+        self.assertEqual(asyncio.run(scenario()), ['equipment', 'equipment', 'reset', {'number': 5}])
+
+    def test_replay(self):
+        async def scenario():
+            broker = LocalBroker(history=10, max_pending=5)
+            for number in range(8):
+                broker.publish('comment', {'number': number})
+            replayed = broker.subscribe(last_event_id=6)
+            # Older than the history
+            too_old = broker.subscribe(last_event_id=0)
+            # More missed events than the queue holds
+            too_many = broker.subscribe(last_event_id=1)
+            # From another process or before a restart
+            unknown = broker.subscribe(last_event_id=100)
+            return [
+                [event['id'] for event in replayed.queue._queue],
+                [[event['event'] for event in subscription.queue._queue] for subscription in (too_old, too_many, unknown)],
+            ]
+        replayed, resets = asyncio.run(scenario())
+        self.assertEqual(replayed, [7, 8])
+        self.assertEqual(resets, [['reset'], ['reset'], ['reset']])
+
+class ChangeFeedTests(TestCase):
+    """
+    GET /api/events/ streams the changes of the requested topics
+    """
+
+    def setUp(self):
+        user = User.objects.create_user('tech', password='secret', role='technician', school='North')
+        self.token = str(ClaimsTokenObtainPairSerializer.get_token(user).access_token)
+
+    async def read_events(self, response, count):
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b'retry: 3000\n\n')
+        return [(await asyncio.wait_for(anext(chunks), 5)).decode() for _ in range(count)]
+
+    async def test_stream(self):
+        response = await self.async_client.get('/api/events/', {'topics': 'comment', 'token': self.token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        broker = get_broker()
+        broker.publish('equipment', {'id': 1})
+        event = broker.publish('comment', {'id': 2})
+        self.assertEqual(
+            await self.read_events(response, 1),
+            [f'id: {event["id"]}\nevent: comment\ndata: {{"id": 2}}\n\n'],
+        )
+
+    async def test_resume_from_last_event_id(self):
+        broker = get_broker()
+        first = broker.publish('comment', {'id': 1})
+        broker.publish('comment', {'id': 2})
+        response = await self.async_client.get(
+            '/api/events/', {'token': self.token}, headers={'Last-Event-ID': str(first['id'])}
+        )
+        [event] = await self.read_events(response, 1)
+        self.assertIn('data: {"id": 2}', event)
+
+    async def test_unauthenticated(self):
+        response = await self.async_client.get('/api/events/', {'token': 'invalid'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_wsgi_not_supported(self):
+        response = self.client.get('/api/events/', {'token': self.token})
+        self.assertEqual(response.status_code, 501)
+
+class TicketBulkImportTests(TestCase):
+    """
+    POST /api/tickets/bulk/ creates tickets from JSON or CSV, technicians only
+    """
+
+    def setUp(self):
+        self.technician = User.objects.create_user('tech', password='secret', role='technician', school='North')
+        self.student = User.objects.create_user('student', password='secret', role='user', school='North')
+        self.equipment = Equipment.objects.create(type='pc', serial_number='PC-1', location='Lab', school='North')
+        self.client = APIClient()
+        self.client.force_authenticate(self.technician)
+
+    def test_json_import(self):
+        response = self.client.post('/api/tickets/bulk/', [
+            {'equipment': self.equipment.id, 'issue_category': 'Power', 'description': 'No power', 'status': 'open'},
+            {'equipment': self.equipment.id, 'issue_category': 'Network', 'description': 'Offline', 'status': 'resolved'},
+            {'equipment': 999, 'issue_category': 'Power', 'description': '', 'status': 'open'},
+            {'equipment': self.equipment.id, 'issue_category': 'Power', 'description': '', 'status': 'lost'},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['updated']), (2, 0))
+        self.assertEqual([error['row'] for error in response.data['errors']], [3, 4])
+        self.assertIn('equipment', response.data['errors'][0]['errors'])
+        self.assertIn('status', response.data['errors'][1]['errors'])
+        tickets = Ticket.objects.order_by('id')
+        self.assertEqual([ticket.created_by for ticket in tickets], [self.technician] * 2)
+        self.assertIsNotNone(tickets[1].resolved_at)
+        self.assertEqual(TicketStatusEvent.objects.count(), 2)
+
+    def test_csv_import(self):
+        upload = SimpleUploadedFile('tickets.csv', (
+            'equipment,issue_category,description,status\n'
+            f'{self.equipment.id},Power,No power,open\n'
+            f'{self.equipment.id},Display,Flickers,in_progress\n'
+        ).encode(), content_type='text/csv')
+        response = self.client.post('/api/tickets/bulk/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['received'], response.data['created']), (2, 2))
+        self.assertEqual(
+            sorted(Ticket.objects.values_list('issue_category', 'status')),
+            [('Display', 'in_progress'), ('Power', 'open')],
+        )
+
+    def test_technicians_only(self):
+        self.client.force_authenticate(self.student)
+        response = self.client.post('/api/tickets/bulk/', [
+            {'equipment': self.equipment.id, 'issue_category': 'Power', 'description': '', 'status': 'open'},
+        ], format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Ticket.objects.exists())
+
+class ExportTests(TestCase):
+    """
+    GET /api/exports/<table>.csv|.ndjson streams every (filtered) row
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('tech', password='secret', role='technician', school='North')
+        self.pc = Equipment.objects.create(type='pc', serial_number='PC-1', location='Lab', school='North')
+        self.printer = Equipment.objects.create(type='printer', serial_number='PR-1', location='Office', school='South')
+        self.tickets = [
+            Ticket.objects.create(equipment=equipment, created_by=self.user, issue_category='Power',
+                                  description='No power, "again"', status=status)
+            for equipment, status in ((self.pc, 'resolved'), (self.pc, 'open'), (self.printer, 'open'))
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def csv_rows(self, response):
+        self.assertTrue(response.streaming)
+        return list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+
+    def ndjson_rows(self, response):
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_tickets_csv(self):
+        response = self.client.get('/api/exports/tickets.csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="tickets.csv"')
+        rows = self.csv_rows(response)
+        self.assertEqual([int(row['id']) for row in rows], [ticket.id for ticket in self.tickets])
+        first = rows[0]
+        self.assertEqual(first['description'], 'No power, "again"')
+        self.assertEqual(first['resolved_at'], self.tickets[0].resolved_at.isoformat())
+        self.assertEqual(rows[1]['resolved_at'], '')
+        self.assertEqual((first['equipment_school'], first['created_by_username']), ('North', 'tech'))
+
+    def test_tickets_ndjson_filtered(self):
+        response = self.client.get('/api/exports/tickets.ndjson', {'school': 'South'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        [row] = self.ndjson_rows(response)
+        self.assertEqual((row['id'], row['equipment_type'], row['resolved_at']), (self.tickets[2].id, 'printer', None))
+        since = (timezone.now() + timedelta(days=1)).date().isoformat()
+        self.assertEqual(self.ndjson_rows(self.client.get('/api/exports/tickets.ndjson', {'since': since})), [])
+
+    def test_equipment(self):
+        rows = self.ndjson_rows(self.client.get('/api/exports/equipment.ndjson', {'type': 'printer'}))
+        self.assertEqual(rows, [{
+            'id': self.printer.id, 'type': 'printer', 'serial_number': 'PR-1', 'location': 'Office',
+            'school': 'South', 'is_working': True,
+        }])
+        rows = self.csv_rows(self.client.get('/api/exports/equipment.csv'))
+        self.assertEqual([row['serial_number'] for row in rows], ['PC-1', 'PR-1'])
+
+    def test_accept_header(self):
+        for accept, url in (('text/csv', '/api/exports/tickets.csv'),
+                            ('application/x-ndjson', '/api/exports/equipment.ndjson')):
+            with self.subTest(accept=accept):
+                response = self.client.get(url, HTTP_ACCEPT=accept)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Content-Type'], accept)
+        # Errors are still rendered, as JSON
+        response = self.client.get('/api/exports/tickets.csv', {'type': 'toaster'}, HTTP_ACCEPT='text/csv')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('type', response.json())
+
+    def test_errors(self):
+        response = self.client.get('/api/exports/tickets.xml')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('output', response.json())
+        self.assertEqual(self.client.get('/api/exports/tickets.csv', {'since': 'yesterday'}).status_code, 400)
+        self.assertEqual(APIClient().get('/api/exports/equipment.csv').status_code, 401)
+
+    def test_streamed_in_chunks(self):
+        with patch('tickets.export_views.CHUNK_SIZE', 2):
+            response = self.client.get('/api/exports/tickets.ndjson')
+            chunks = list(response.streaming_content)
+        # Two rows, then the last one
+        self.assertEqual([chunk.count(b'\n') for chunk in chunks], [2, 1])
+
+class TicketStatusTests(TestCase):
+    """
+    Every status change is logged once and keeps resolved_at and the
+    turnaround report up to date
+    """
+
+    def setUp(self):
+        self.student = User.objects.create_user('student', password='secret', role='user', school='North')
+        self.technician = User.objects.create_user('tech', password='secret', role='technician', school='North')
+        self.equipment = Equipment.objects.create(type='pc', serial_number='PC-1', location='Lab', school='North')
+        self.client = APIClient()
+        self.client.force_authenticate(self.technician)
+
+    def create_ticket(self):
+        return Ticket.objects.create(equipment=self.equipment, created_by=self.student, issue_category='Power',
+                                     description='No power')
+
+    def events(self, ticket):
+        return list(ticket.status_events.order_by('id').values_list('from_status', 'to_status', 'changed_by'))
+
+    def test_transitions(self):
+        ticket = self.create_ticket()
+        self.assertIsNone(ticket.resolved_at)
+        for status in ('in_progress', 'resolved'):
+            response = self.client.patch(f'/api/tickets/{ticket.id}/', {'status': status}, format='json')
+            self.assertEqual(response.status_code, 200)
+        ticket.refresh_from_db()
+        resolved_at = ticket.resolved_at
+        self.assertIsNotNone(resolved_at)
+
+        # Saving other fields doesn't log anything nor move resolved_at
+        ticket.description = 'No power at all'
+        ticket.save()
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.resolved_at, resolved_at)
+
+        self.client.patch(f'/api/tickets/{ticket.id}/', {'status': 'open'}, format='json')
+        ticket.refresh_from_db()
+        self.assertIsNone(ticket.resolved_at)
+        self.assertEqual(self.events(ticket), [
+            ('', 'open', self.student.id),
+            ('open', 'in_progress', self.technician.id),
+            ('in_progress', 'resolved', self.technician.id),
+            ('resolved', 'open', self.technician.id),
+        ])
+
+    def test_deferred_status(self):
+        ticket = self.create_ticket()
+        # The status is set without being read (which would load it)
+        for queryset, status in (
+            (Ticket.objects.only('id', 'description'), 'resolved'),
+            (Ticket.objects.defer('status', 'resolved_at'), 'open'),
+        ):
+            ticket = queryset.get(pk=ticket.pk)
+            ticket.status = status
+            ticket.save()
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.status, 'open')
+        self.assertIsNone(ticket.resolved_at)
+        self.assertEqual(self.events(ticket), [('', 'open', self.student.id), ('open', 'resolved', None),
+                                               ('resolved', 'open', None)])
+        # The rollups moved the ticket between statuses too
+        counts = dict(DailyTicketRollup.objects.exclude(count=0).values_list('status', 'count'))
+        rebuild_rollups()
+        self.assertEqual(counts, dict(DailyTicketRollup.objects.exclude(count=0).values_list('status', 'count')))
+
+    def test_turnaround_report(self):
+        start = timezone.now() - timedelta(days=2)
+        # Resolved after 1, 2, ... 10 hours
+        for hours in range(1, 11):
+            with patch('django.utils.timezone.now', return_value=start):
+                ticket = self.create_ticket()
+            with patch('django.utils.timezone.now', return_value=start + timedelta(hours=hours)):
+                ticket.status = 'resolved'
+                ticket.save()
+        self.create_ticket()
+
+        for params in ({}, {'since': start.date().isoformat()}):
+            with self.subTest(params=params):
+                data = self.client.get('/api/reports/turnaround-time/', params).json()
+                self.assertEqual(data['resolved_tickets'], 10)
+                self.assertAlmostEqual(parse_duration(data['average_turnaround_time']).total_seconds(), 5.5 * 3600,
+                                       delta=0.01 * 5.5 * 3600)
+                for name, hours in (('p50', 5), ('p90', 9), ('p99', 9)):
+                    seconds = parse_duration(data['percentiles'][name]).total_seconds()
+                    self.assertAlmostEqual(seconds, hours * 3600, delta=0.01 * hours * 3600)
+
+class CursorPaginationTests(TestCase):
+    """
+    ?page_size= opts into keyset pages on (created_at, id), following the links
+    visits every ticket once even across timestamp ties and concurrent inserts
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('tech', password='secret', role='technician', school='North')
+        self.equipment = Equipment.objects.create(type='pc', serial_number='PC-1', location='Lab', school='North')
+        now = timezone.now()
+        for i in range(7):
+            ticket = self.create_ticket(f'Ticket {i}')
+            # Tickets 2 to 5 share a timestamp, so only the id orders them
+            created_at = now - timedelta(hours=1) if 2 <= i <= 5 else now - timedelta(hours=10 - i)
+            Ticket.objects.filter(pk=ticket.pk).update(created_at=created_at)
+        self.expected = list(Ticket.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_ticket(self, description):
+        return Ticket.objects.create(equipment=self.equipment, created_by=self.user, issue_category='Power',
+                                     description=description)
+
+    def get(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def follow(self, page, link):
+        ids = [ticket['id'] for ticket in page['results']]
+        while page[link]:
+            page = self.get(page[link])
+            found = [ticket['id'] for ticket in page['results']]
+            ids = ids + found if link == 'next' else found + ids
+        return ids
+
+    def test_opt_in(self):
+        data = self.get('/api/tickets/')
+        self.assertIsInstance(data, list)
+        self.assertCountEqual([ticket['id'] for ticket in data], self.expected)
+
+        page = self.get('/api/tickets/', {'page_size': 2})
+        self.assertEqual(set(page), {'next', 'previous', 'results'})
+        self.assertEqual([ticket['id'] for ticket in page['results']], self.expected[:2])
+        self.assertIsNone(page['previous'])
+        self.assertIn('page_size=2', page['next'])
+
+        page = self.get('/api/tickets/', {'page_size': 1000})
+        self.assertEqual(len(page['results']), 7)
+        self.assertIsNone(page['next'])
+
+    def test_follow_next_and_previous(self):
+        for size in (1, 2, 3, 7):
+            with self.subTest(page_size=size):
+                page = self.get('/api/tickets/', {'page_size': size})
+                self.assertEqual(self.follow(page, 'next'), self.expected)
+
+        page = self.get('/api/tickets/', {'page_size': 2})
+        while page['next']:
+            page = self.get(page['next'])
+        self.assertEqual(self.follow(page, 'previous'), self.expected)
+
+    def test_stable_under_inserts(self):
+        page = self.get('/api/tickets/', {'page_size': 3})
+        ids = [ticket['id'] for ticket in page['results']]
+        # One insert lands before the pages already read, one after them
+        newer, older = self.create_ticket('Newer'), self.create_ticket('Older')
+        Ticket.objects.filter(pk=newer.pk).update(created_at=timezone.now() - timedelta(hours=1))
+        Ticket.objects.filter(pk=older.pk).update(created_at=timezone.now() - timedelta(hours=5))
+        ids += self.follow(self.get(page['next']), 'next')
+        self.assertEqual(ids, list(
+            Ticket.objects.exclude(pk=newer.pk).order_by('-created_at', '-id').values_list('id', flat=True)
+        ))
+
+    def test_invalid_cursor(self):
+        for cursor in ('bogus', 'cD1ub3QtYS1kYXRlfDE='):
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/api/tickets/', {'page_size': 2, 'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+
+    def test_comments(self):
+        ticket = Ticket.objects.get(pk=self.expected[0])
+        comments = [ticket.comments.create(user=self.user, text=f'Comment {i}') for i in range(5)]
+        Comment.objects.update(timestamp=timezone.now())
+        page = self.get('/api/comments/', {'page_size': 2})
+        self.assertEqual(self.follow(page, 'next'), [comment.id for comment in reversed(comments)])
+
+class SparseFieldsTests(TestCase):
+    """
+    ?fields= and ?omit= select the serialized fields, dropped fields are
+    neither loaded nor joined nor prefetched
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('tech', password='secret', role='technician', school='North')
+        equipment = Equipment.objects.create(type='pc', serial_number='PC-1', location='Lab', school='North')
+        self.ticket = Ticket.objects.create(equipment=equipment, created_by=self.user, issue_category='Power',
+                                            description='No power')
+        self.ticket.comments.create(user=self.user, text='On it')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data, [query['sql'] for query in queries]
+
+    def test_list_fields_default(self):
+        data, _ = self.get('/api/tickets/')
+        self.assertEqual(list(data[0]), ['id', 'equipment', 'issue_category', 'status', 'created_at'])
+        data, _ = self.get(f'/api/tickets/{self.ticket.id}/')
+        self.assertIn('comments', data)
+        self.assertEqual(data['description'], 'No power')
+
+    def test_fields_and_omit(self):
+        data, _ = self.get('/api/tickets/', fields='id,status,comments')
+        self.assertEqual(list(data[0]), ['id', 'status', 'comments'])
+        self.assertEqual(data[0]['comments'][0]['text'], 'On it')
+        data, _ = self.get(f'/api/tickets/{self.ticket.id}/', omit='comments,description')
+        self.assertEqual(list(data), [
+            'id', 'equipment', 'issue_category', 'status', 'created_by', 'assigned_to', 'created_at', 'updated_at',
+            'resolved_at',
+        ])
+        data, _ = self.get('/api/equipment/', fields='serial_number')
+        self.assertEqual(data, [{'serial_number': 'PC-1'}])
+
+    def test_unknown_fields(self):
+        for url, params in (
+            ('/api/tickets/', {'fields': 'id,bogus'}),
+            ('/api/tickets/', {'omit': 'bogus'}),
+            (f'/api/tickets/{self.ticket.id}/', {'fields': 'bogus'}),
+            ('/api/equipment/', {'fields': 'bogus'}),
+        ):
+            with self.subTest(url=url, params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 400)
+                [(param, message)] = response.data.items()
+                self.assertEqual(param, next(iter(params)))
+                self.assertIn('Unknown fields: bogus. Use any of: id, ', message)
+
+    def test_dropped_fields_not_queried(self):
+        comments = Comment._meta.db_table
+        users = User._meta.db_table
+        _, queries = self.get(f'/api/tickets/{self.ticket.id}/')
+        self.assertTrue(any(comments in sql for sql in queries))
+        self.assertTrue(any(users in sql for sql in queries))
+
+        _, queries = self.get(f'/api/tickets/{self.ticket.id}/', omit='comments')
+        self.assertFalse(any(comments in sql for sql in queries))
+        self.assertTrue(any(users in sql for sql in queries))
+
+        _, queries = self.get('/api/tickets/', fields='id,status')
+        [select] = [sql for sql in queries if 'FROM "tickets_ticket"' in sql]
+        for absent in ('"description"', users, comments):
+            self.assertNotIn(absent, select)
+        self.assertFalse(any(comments in sql for sql in queries))
@@ -1,8 +1,16 @@
 from django.shortcuts import render
 from rest_framework import viewsets, permissions
 from rest_framework.response import Response
-from .models import Ticket, Comment
-from .serializers import TicketSerializer, CommentSerializer
+from django.db.models import Prefetch
+from django.utils import timezone
+from silsp.mixins import OptimizedQuerysetMixin, BulkImportMixin
+from equipment.models import Equipment
+from .models import Ticket, TicketStatusEvent, Comment
+from .serializers import TicketSerializer, TicketBulkSerializer, CommentSerializer
+from .pagination import TicketCursorPagination, CommentCursorPagination
+from analytics.cache import conditional_get
+from analytics.signals import tickets_bulk_written
+from .signals import publish_bulk_change
 
 # Create your views here.
 
@@ -24,14 +32,64 @@ class IsTechnicianOrReadOnly(permissions.BasePermission):
         # Only allow technicians to update/delete
         return request.user and request.user.is_authenticated and getattr(request.user, 'role', None) == 'technician'
 
-class TicketViewSet(viewsets.ModelViewSet):
+class TicketViewSet(OptimizedQuerysetMixin, BulkImportMixin, viewsets.ModelViewSet):
     queryset = Ticket.objects.all()
+    bulk_serializer_class = TicketBulkSerializer
+    select_related_fields = ('created_by', 'assigned_to')
+    prefetch_related_fields = (
+        Prefetch('comments', queryset=Comment.objects.select_related('user')),
+    )
     serializer_class = TicketSerializer
     permission_classes = [IsTechnicianOrReadOnly]
+    pagination_class = TicketCursorPagination
+
+    # Tickets embed their comments, so both tables drive the validators
+    @conditional_get('ticket', 'comment')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get('ticket', 'comment')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
+    def perform_update(self, serializer):
+        # Recorded on the status change event
+        serializer.instance._changed_by = self.request.user
+        serializer.save()
+
+    def get_bulk_context(self, rows):
+        context = super().get_bulk_context(rows)
+        ids = set()
+        for row in rows:
+            try:
+                ids.add(int(row.get('equipment')))
+            except (AttributeError, TypeError, ValueError):
+                pass
+        context['equipment'] = Equipment.objects.in_bulk(ids)
+        return context
+
+    def perform_bulk_write(self, rows):
+        now = timezone.now()
+        tickets = Ticket.objects.bulk_create([
+            Ticket(
+                created_by=self.request.user,
+                resolved_at=now if row.get('status') == 'resolved' else None,
+                **row
+            )
+            for row in rows
+        ])
+        TicketStatusEvent.objects.bulk_create([
+            TicketStatusEvent(ticket=ticket, to_status=ticket.status, changed_by=self.request.user, changed_at=now)
+            for ticket in tickets
+        ])
+        # bulk_create skips the save hooks
+        tickets_bulk_written(tickets)
+        publish_bulk_change('ticket_status', len(tickets))
+        return len(tickets), 0
+
     def create(self, request, *args, **kwargs):
         try:
             print(f"Creating ticket with data: {request.data}")
@@ -54,10 +112,12 @@ class TicketViewSet(viewsets.ModelViewSet):
                 status=400
             )
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(OptimizedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Comment.objects.all()
+    select_related_fields = ('user',)
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CommentCursorPagination
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
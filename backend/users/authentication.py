@@ -0,0 +1,130 @@
+# JWT authentication without a user query per request
+# Access tokens carry the username, role and school of the user (see
+# ClaimsTokenObtainPairSerializer). Requests get a User built from those
+# values; the user row itself is only read again every AUTH_USER_CACHE_TTL
+# seconds. Role changes and deactivated accounts take effect at once in the
+# process that wrote them, and within AUTH_USER_CACHE_TTL in the others.
+
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from .models import User
+
+# User fields carried as claims, the others are loaded from the row on first access
+CLAIM_FIELDS = ('username', 'role', 'school')
+# Claim with the time the claims were read from the user row
+# (unlike iat it's copied over when an access token is refreshed)
+PROFILE_TIME_CLAIM = 'profile_at'
+
+class UserCache:
+    """
+    Bounded LRU of {user id: (checked at, field values)}, entries older than
+    the TTL are read from the database again
+    Users changed in this process are also remembered for a TTL apart from
+    the LRU, so evicting their entry never lets older claims be trusted again
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        # {user id: time of the last change}, oldest first
+        self.changes = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            if time.time() - entry[0] >= self.ttl:
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+            return entry[1]
+
+    def put(self, user_id, values, checked_at=None):
+        with self.lock:
+            self.entries[user_id] = (checked_at or time.time(), values)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def changed(self, user_id, values):
+        """
+        Store the values of a user row that was just written
+        """
+        now = time.time()
+        self.put(user_id, values, checked_at=now)
+        with self.lock:
+            self.changes.pop(user_id, None)
+            self.changes[user_id] = now
+            # Claims older than the TTL are never trusted anyway
+            while self.changes and now - next(iter(self.changes.values())) >= self.ttl:
+                self.changes.popitem(last=False)
+
+    def changed_since(self, user_id, timestamp):
+        with self.lock:
+            return self.changes.get(user_id, 0) >= timestamp
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.changes.clear()
+
+user_cache = UserCache(
+    getattr(settings, 'AUTH_USER_CACHE_SIZE', 4096),
+    getattr(settings, 'AUTH_USER_CACHE_TTL', 60),
+)
+
+def build_user(user_id, values):
+    """
+    User instance from the cached values, as if loaded with .only()
+    Other fields are deferred, and saving it only writes the known fields
+    """
+    values = {'id': user_id, **values}
+    # from_db takes the values in the order of the model fields
+    fields = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+    return User.from_db(DEFAULT_DB_ALIAS, fields, [values[name] for name in fields])
+
+def load_user_values(user_id):
+    return User.objects.filter(id=user_id).values('is_active', *CLAIM_FIELDS).first()
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication building request.user from the token claims and the
+    user cache instead of reading the user row on every request
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # Needs the password hash of the row
+            return super().get_user(validated_token)
+        try:
+            user_id = User._meta.pk.to_python(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        values = user_cache.get(user_id)
+        if values is None:
+            profile_at = validated_token.get(PROFILE_TIME_CLAIM)
+            if (profile_at is not None and time.time() - profile_at < user_cache.ttl
+                    and not user_cache.changed_since(user_id, profile_at)):
+                # The claims are as recent as a cache entry would be, and the
+                # user wasn't changed in this process since they were read
+                values = {'is_active': True, **{name: validated_token.get(name) for name in CLAIM_FIELDS}}
+                user_cache.put(user_id, values, checked_at=profile_at)
+            else:
+                values = load_user_values(user_id)
+                if values is None:
+                    raise AuthenticationFailed('User not found', code='user_not_found')
+                user_cache.put(user_id, values)
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not values['is_active']:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        return build_user(user_id, values)
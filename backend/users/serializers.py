@@ -1,7 +1,12 @@
+import time
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .authentication import CLAIM_FIELDS, PROFILE_TIME_CLAIM
 from .models import User
+from silsp.metrics import TimedSerializerMixin
+from silsp.mixins import SparseFieldsMixin
  
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'password', 'email', 'role', 'school']
@@ -16,4 +21,23 @@ class UserSerializer(serializers.ModelSerializer):
         )
         user.set_password(validated_data['password'])
         user.save()
-        return user 
\ No newline at end of file
+        return user
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Token pair carrying the username, role and school of the user
+    The login response includes them too, so clients don't fetch the user afterwards
+    """
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        for name in CLAIM_FIELDS:
+            token[name] = getattr(user, name)
+        token[PROFILE_TIME_CLAIM] = int(time.time())
+        return token
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        data['user'] = {'id': self.user.id, **{name: getattr(self.user, name) for name in CLAIM_FIELDS}}
+        return data
@@ -0,0 +1,21 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .authentication import CLAIM_FIELDS, user_cache
+from .models import User
+
+# Update the cached user of this process once the change is committed; the
+# claims of tokens issued before the change aren't trusted here any more.
+# Other processes pick the change up within AUTH_USER_CACHE_TTL
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    user_id = instance.pk
+    values = {'is_active': instance.is_active, **{name: getattr(instance, name) for name in CLAIM_FIELDS}}
+    transaction.on_commit(lambda: user_cache.changed(user_id, values))
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    user_id = instance.pk
+    values = {'is_active': False, **{name: None for name in CLAIM_FIELDS}}
+    transaction.on_commit(lambda: user_cache.changed(user_id, values))
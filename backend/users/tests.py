@@ -1,3 +1,74 @@
+from unittest.mock import patch
+from django.db import connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from .authentication import user_cache
+from .models import User
 
-# Create your tests here.
+class ClaimsAuthenticationTests(TestCase):
+    """
+    Requests authenticated with a fresh access token don't read the user row,
+    and user changes still apply to tokens issued before them
+    """
+
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user('tech', password='secret', role='technician', school='North')
+        self.client = APIClient()
+
+    def login(self):
+        response = self.client.post('/api/token/', {'username': 'tech', 'password': 'secret'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_login_includes_user(self):
+        data = self.login()
+        self.assertEqual(data['user'], {'id': self.user.id, 'username': 'tech', 'role': 'technician', 'school': 'North'})
+
+    def test_no_user_query(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.login()['access']}")
+        user_cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/reports/equipment-status/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query['sql'] for query in queries if User._meta.db_table in query['sql']])
+
+    def test_stale_claims_revalidated(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.login()['access']}")
+        user_cache.clear()
+        with patch.object(user_cache, 'ttl', 0):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get('/api/reports/equipment-status/')
+        self.assertTrue([query['sql'] for query in queries if User._meta.db_table in query['sql']])
+
+    def test_user_changes_apply(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.login()['access']}")
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.client.get('/api/reports/equipment-status/').status_code, 401)
+        # Still refused once the cache entry is evicted
+        user_cache.entries.clear()
+        self.assertEqual(self.client.get('/api/reports/equipment-status/').status_code, 401)
+
+    def test_rolled_back_change_ignored(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.login()['access']}")
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                self.user.is_active = False
+                self.user.save()
+                transaction.set_rollback(True)
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.client.get('/api/reports/equipment-status/').status_code, 200)
+
+    def test_role_change_in_other_process(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.login()['access']}")
+        # Written by another process: no signal here
+        User.objects.filter(id=self.user.id).update(role='user')
+        response = self.client.get('/api/reports/equipment-status/')
+        self.assertEqual(response.wsgi_request.user.role, 'technician')
+        # Read from the row once the claims are older than the TTL
+        with patch.object(user_cache, 'ttl', 0):
+            response = self.client.get('/api/reports/equipment-status/')
+        self.assertEqual(response.wsgi_request.user.role, 'user')
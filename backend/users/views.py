@@ -3,10 +3,11 @@ from rest_framework import viewsets
 from .models import User
 from .serializers import UserSerializer
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from silsp.mixins import OptimizedQuerysetMixin
 
 # Create your views here.
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(OptimizedQuerysetMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
 
@@ -9,18 +9,13 @@ function Analytics() {
 
   useEffect(() => {
     console.log('Analytics component mounted, fetching data...');
-    Promise.all([
-      api.get('api/analytics/equipment-failure-patterns/'),
-      api.get('api/analytics/school-issues/'),
-      api.get('api/analytics/maintenance-schedule/')
-    ])
-      .then(([patternsRes, schoolRes, scheduleRes]) => {
-        console.log('Equipment patterns response:', patternsRes.data);
-        console.log('School issues response:', schoolRes.data);
-        console.log('Maintenance schedule response:', scheduleRes.data);
-        setPatterns(patternsRes.data);
-        setSchoolIssues(schoolRes.data);
-        setMaintenanceSchedule(scheduleRes.data);
+    // One request for all sections, computed concurrently by the backend
+    api.get('api/dashboard/', { params: { sections: 'failure_patterns,school_issues,maintenance_schedule' } })
+      .then((res) => {
+        console.log('Dashboard response:', res.data);
+        setPatterns(res.data.failure_patterns || []);
+        setSchoolIssues(res.data.school_issues || []);
+        setMaintenanceSchedule(res.data.maintenance_schedule || {});
         setLoading(false);
       })
       .catch((error) => {
@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from 'react';
-import api from './api';
+import api, { subscribeToChanges } from './api';
 
 function EquipmentList() {
   const [equipment, setEquipment] = useState([]);
@@ -21,10 +21,23 @@ function EquipmentList() {
     fetchEquipment();
   }, []);
 
-  // Refresh equipment list every 5 seconds to catch updates
+  // Refresh the equipment list when the change feed reports an update,
+  // falling back to polling every 5 seconds when the feed is unavailable
   useEffect(() => {
-    const interval = setInterval(fetchEquipment, 5000);
-    return () => clearInterval(interval);
+    let interval = null;
+    const startPolling = () => {
+      if (!interval) {
+        interval = setInterval(fetchEquipment, 5000);
+      }
+    };
+    const source = subscribeToChanges(['equipment'], fetchEquipment, startPolling);
+    if (!source) {
+      startPolling();
+    }
+    return () => {
+      if (source) source.close();
+      if (interval) clearInterval(interval);
+    };
   }, []);
 
   if (loading) return <div>Loading...</div>;
@@ -1,6 +1,5 @@
 import React, { useState } from 'react';
 import api from './api';
-import { jwtDecode } from 'jwt-decode';
 
 function Login({ onLogin }) {
   const [username, setUsername] = useState('');
@@ -18,31 +17,15 @@ function Login({ onLogin }) {
       localStorage.setItem('access', response.data.access);
       localStorage.setItem('refresh', response.data.refresh);
 
-      // Decode the access token to get the user ID
-      const decoded = jwtDecode(response.data.access);
-      const userId = decoded.user_id || decoded.id || decoded.sub;
-
-      // Fetch user profile to get the role and school
-      api.get(`api/users/${userId}/`)
-        .then(res => {
-          const userRole = res.data.role;
-          const userSchool = res.data.school || '';
-          localStorage.setItem('role', userRole);
-          localStorage.setItem('school', userSchool);
-          // Update app state with user role
-          if (onLogin) onLogin(userRole);
-          setMessage('Login successful!');
-          setUsername('');
-          setPassword('');
-        })
-        .catch(err => {
-          console.error('Error fetching user profile:', err);
-          // Still proceed with login even if role fetch fails
-          if (onLogin) onLogin();
-          setMessage('Login successful!');
-          setUsername('');
-          setPassword('');
-        });
+      // The login response includes the role and school of the user
+      const user = response.data.user || {};
+      localStorage.setItem('role', user.role || '');
+      localStorage.setItem('school', user.school || '');
+      // Update app state with user role
+      if (onLogin) onLogin(user.role);
+      setMessage('Login successful!');
+      setUsername('');
+      setPassword('');
     })
     .catch(error => {
       setMessage('Login failed. Please check your credentials.');
@@ -9,15 +9,11 @@ function Reports() {
 
   useEffect(() => {
     setLoading(true);
-    Promise.all([
-      api.get('api/reports/frequent-issues/'),
-      api.get('api/reports/turnaround-time/'),
-      api.get('api/reports/equipment-status/'),
-    ])
-      .then(([issuesRes, turnaroundRes, equipmentRes]) => {
-        setFrequentIssues(issuesRes.data);
-        setTurnaround(turnaroundRes.data.average_turnaround_time);
-        setEquipmentStatus(equipmentRes.data);
+    api.get('api/dashboard/', { params: { sections: 'frequent_issues,turnaround_time,equipment_status' } })
+      .then(res => {
+        setFrequentIssues(res.data.frequent_issues || []);
+        setTurnaround(res.data.turnaround_time ? res.data.turnaround_time.average_turnaround_time : null);
+        setEquipmentStatus(res.data.equipment_status || []);
         setLoading(false);
       })
       .catch(error => {
@@ -13,33 +13,25 @@ function TicketForm({ onTicketCreated }) {
 
   // Fetch equipment list and user info on mount
   useEffect(() => {
-    // Get user info from localStorage
+    // The school of the user is a claim of the access token
     const access = localStorage.getItem('access');
     if (access) {
-      const decoded = jwtDecode(access);
-      const userId = decoded.user_id || decoded.id || decoded.sub;
-      
-      // Fetch user details to get their school
-      api.get(`api/users/${userId}/`)
-        .then(userResponse => {
-          const school = userResponse.data.school || '';
-          setUserSchool(school);
-          
-          // Fetch equipment and filter by user's school
-          api.get('api/equipment/')
-            .then(equipmentResponse => {
-              console.log('All equipment:', equipmentResponse.data);
-              console.log('User school:', school);
-              // Filter equipment by user's school, or show all if school is empty or null
-              const filtered = school && school !== 'None' && school !== '' ? 
-                equipmentResponse.data.filter(eq => eq.school === school) : 
-                equipmentResponse.data;
-              console.log('Filtered equipment:', filtered);
-              setFilteredEquipmentList(filtered);
-            })
-            .catch(error => console.error('Error fetching equipment:', error));
+      const school = jwtDecode(access).school || '';
+      setUserSchool(school);
+
+      // Fetch equipment and filter by user's school
+      api.get('api/equipment/')
+        .then(equipmentResponse => {
+          console.log('All equipment:', equipmentResponse.data);
+          console.log('User school:', school);
+          // Filter equipment by user's school, or show all if school is empty or null
+          const filtered = school && school !== 'None' && school !== '' ? 
+            equipmentResponse.data.filter(eq => eq.school === school) : 
+            equipmentResponse.data;
+          console.log('Filtered equipment:', filtered);
+          setFilteredEquipmentList(filtered);
         })
-        .catch(error => console.error('Error fetching user details:', error));
+        .catch(error => console.error('Error fetching equipment:', error));
     }
   }, []);
 
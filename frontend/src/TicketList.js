@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from 'react';
-import api from './api';
+import api, { subscribeToChanges } from './api';
 
 function TicketList() {
   const [tickets, setTickets] = useState([]);
@@ -7,8 +7,8 @@ function TicketList() {
   const [commentInputs, setCommentInputs] = useState({});
   const userRole = localStorage.getItem('role');
 
-  useEffect(() => {
-    api.get('api/tickets/')
+  const fetchTickets = () => {
+    api.get('api/tickets/?fields=id,issue_category,description,status,comments')
       .then(response => {
         setTickets(response.data);
         setLoading(false);
@@ -17,6 +17,45 @@ function TicketList() {
         console.error('Error fetching tickets:', error);
         setLoading(false);
       });
+  };
+
+  useEffect(() => {
+    fetchTickets();
+  }, []);
+
+  // Apply status changes and new comments pushed by the change feed,
+  // falling back to polling every 30 seconds when the feed is unavailable
+  useEffect(() => {
+    let interval = null;
+    const startPolling = () => {
+      if (!interval) {
+        interval = setInterval(fetchTickets, 30000);
+      }
+    };
+    const source = subscribeToChanges(['ticket_status', 'comment'], (topic, data) => {
+      if (topic === 'ticket_status' && data.action === 'bulk') {
+        fetchTickets();
+      } else if (topic === 'ticket_status') {
+        setTickets(tickets => tickets.map(ticket =>
+          ticket.id === data.id ? { ...ticket, status: data.status } : ticket
+        ));
+      } else if (topic === 'comment') {
+        setTickets(tickets => tickets.map(ticket =>
+          ticket.id === data.ticket && !(ticket.comments || []).some(comment => comment.id === data.id)
+            ? { ...ticket, comments: [...(ticket.comments || []), data] }
+            : ticket
+        ));
+      } else {
+        fetchTickets();
+      }
+    }, startPolling);
+    if (!source) {
+      startPolling();
+    }
+    return () => {
+      if (source) source.close();
+      if (interval) clearInterval(interval);
+    };
   }, []);
 
   const handleStatusChange = (ticketId, newStatus) => {
@@ -41,7 +80,7 @@ function TicketList() {
     api.post('api/comments/', { ticket: ticketId, text: commentText })
       .then(response => {
         setTickets(tickets => tickets.map(ticket =>
-          ticket.id === ticketId
+          ticket.id === ticketId && !(ticket.comments || []).some(comment => comment.id === response.data.id)
             ? { ...ticket, comments: [...(ticket.comments || []), response.data] }
             : ticket
         ));
@@ -15,6 +15,19 @@ api.interceptors.request.use(
   (error) => Promise.reject(error)
 );
 
+// Exchange the refresh token for a new access token, null without a refresh token
+async function refreshAccessToken() {
+  const refreshToken = localStorage.getItem('refresh');
+  if (!refreshToken) {
+    return null;
+  }
+  const response = await axios.post('http://127.0.0.1:8000/api/token/refresh/', {
+    refresh: refreshToken,
+  });
+  localStorage.setItem('access', response.data.access);
+  return response.data.access;
+}
+
 api.interceptors.response.use(
   (response) => response,
   async (error) => {
@@ -25,24 +38,81 @@ api.interceptors.response.use(
       !originalRequest._retry
     ) {
       originalRequest._retry = true;
-      const refreshToken = localStorage.getItem('refresh');
-      if (refreshToken) {
-        try {
-          const response = await axios.post('http://127.0.0.1:8000/api/token/refresh/', {
-            refresh: refreshToken,
-          });
-          localStorage.setItem('access', response.data.access);
-          originalRequest.headers['Authorization'] = `Bearer ${response.data.access}`;
+      try {
+        const accessToken = await refreshAccessToken();
+        if (accessToken) {
+          originalRequest.headers['Authorization'] = `Bearer ${accessToken}`;
           return api(originalRequest);
-        } catch (refreshError) {
-          localStorage.removeItem('access');
-          localStorage.removeItem('refresh');
-          window.location.href = '/';
         }
+      } catch (refreshError) {
+        localStorage.removeItem('access');
+        localStorage.removeItem('refresh');
+        window.location.href = '/';
       }
     }
     return Promise.reject(error);
   }
 );
 
+// Subscribe to the server-sent events change feed
+// Returns an object with close(), or null when the browser can't open an EventSource
+// The browser reconnects by itself after a network error, resuming from the
+// last event id. When it gives up (e.g. the access token in the URL expired)
+// the feed is reopened once with the current token; onError is only called
+// when that fails too, and the caller should fall back to polling
+export function subscribeToChanges(topics, onEvent, onError) {
+  if (!window.EventSource || !localStorage.getItem('access')) {
+    return null;
+  }
+  let source = null;
+  let lastEventId = null;
+  let retried = false;
+  let closed = false;
+
+  const open = (accessToken) => {
+    const params = new URLSearchParams({ topics: topics.join(','), token: accessToken });
+    if (lastEventId) {
+      // A new EventSource doesn't send Last-Event-ID
+      params.set('last_event_id', lastEventId);
+    }
+    source = new EventSource(`${api.defaults.baseURL}api/events/?${params}`);
+    source.onopen = () => {
+      retried = false;
+    };
+    [...topics, 'reset'].forEach(topic => {
+      source.addEventListener(topic, event => {
+        lastEventId = event.lastEventId || lastEventId;
+        onEvent(topic, JSON.parse(event.data));
+      });
+    });
+    source.onerror = async () => {
+      if (closed || source.readyState !== EventSource.CLOSED) {
+        return;
+      }
+      if (retried) {
+        onError();
+        return;
+      }
+      retried = true;
+      let accessToken = localStorage.getItem('access');
+      try {
+        accessToken = (await refreshAccessToken()) || accessToken;
+      } catch (refreshError) {
+        // Reopen with the stored token, onError follows if it's rejected
+      }
+      if (!closed) {
+        open(accessToken);
+      }
+    };
+  };
+
+  open(localStorage.getItem('access'));
+  return {
+    close: () => {
+      closed = true;
+      source.close();
+    },
+  };
+}
+
 export default api; 
\ No newline at end of file